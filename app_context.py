@@ -0,0 +1,85 @@
+# app_context.py
+# Recursos de pygame compartidos por el menú y el juego durante toda la vida del proceso: la ventana,
+# las fuentes, el mezclador con sus sonidos y los sprites ya construidos. Cambiar de pantalla no vuelve
+# a inicializar pygame ni a cargar nada, y al terminar una partida se vuelve al menú en el mismo proceso.
+import os
+import sys
+import threading
+
+import pygame
+
+import logs
+
+log = logs.get_logger("client.app")
+
+class AppContext:
+    """Dueño único de la ventana y de los recursos cargados; usar la instancia `app` de este módulo."""
+
+    def __init__(self):
+        self.screen = None
+        self._display_mode = None # (tamaño, flags) con que se abrió la ventana actual
+        self._fonts = {} # (nombre, tamaño) -> pygame.font.Font
+        self._font_paths = {} # nombre del sistema -> ruta; match_font recorre todas las fuentes instaladas
+        self.sounds = {} # nombre -> pygame.mixer.Sound, se llena en segundo plano
+        self._sounds_thread = None
+        self.sprites = {} # clave -> recurso construido una sola vez con cached()
+
+    def show(self, size, caption=None, flags=0):
+        """Retorna la ventana con el tamaño y flags pedidos; solo llama a set_mode si cambian."""
+        if not pygame.get_init():
+            pygame.init()
+        mode = (tuple(size), flags)
+        if self.screen is None or mode != self._display_mode:
+            self.screen = pygame.display.set_mode(size, flags)
+            self._display_mode = mode
+        if caption is not None:
+            pygame.display.set_caption(caption)
+        return self.screen
+
+    def font(self, name, size):
+        """Fuente cacheada: name=None es la fuente por defecto de pygame, si no un nombre del sistema ('arial')."""
+        key = (name, size)
+        font = self._fonts.get(key)
+        if font is None:
+            path = None
+            if name is not None:
+                if name not in self._font_paths:
+                    self._font_paths[name] = pygame.font.match_font(name)
+                path = self._font_paths[name]
+            font = self._fonts[key] = pygame.font.Font(path, size)
+        return font
+
+    def start_loading_sounds(self, sound_files):
+        """Inicializa el mezclador y carga {nombre: ruta} en un hilo, una sola vez por proceso."""
+        if self._sounds_thread is not None:
+            return
+        self._sounds_thread = threading.Thread(target=self._load_sounds, args=(dict(sound_files),), daemon=True)
+        self._sounds_thread.start()
+
+    def _load_sounds(self, sound_files):
+        try:
+            pygame.mixer.init()
+            for name, path in sound_files.items():
+                if os.path.exists(path):
+                    self.sounds[name] = pygame.mixer.Sound(path)
+        except Exception as e:
+            log.warning("Error cargando sonidos: %s", e)
+
+    def play_sound(self, name):
+        # Mientras no terminen de cargar, los sonidos simplemente no se reproducen
+        sound = self.sounds.get(name)
+        if sound:
+            sound.play()
+
+    def cached(self, key, build):
+        """Recurso construido la primera vez que se pide (build()) y reutilizado en las siguientes pantallas."""
+        if key not in self.sprites:
+            self.sprites[key] = build()
+        return self.sprites[key]
+
+    def quit(self):
+        """Cierra pygame y termina el proceso (el usuario cerró la ventana)."""
+        pygame.quit()
+        sys.exit()
+
+app = AppContext()
@@ -0,0 +1,115 @@
+# benchmarks/bench_accept.py
+# Tormenta de conexiones contra el bucle de aceptación del servidor en loopback:
+#   - consultas del lobby: conexiones que envían LIST_GAMES y esperan GAMES_LIST (latencia conexión -> respuesta),
+#   - jugadores lentos: conexiones que tardan --slow-delay en enviar su primer mensaje (CREATE_GAME),
+#     como un cliente en una red lenta; antes cada una frenaba todos los accept() hasta 200 ms.
+# Se informa la tasa de conexiones atendidas y los percentiles de latencia de cada tipo.
+#
+# Uso: python benchmarks/bench_accept.py [--connections 500] [--slow-fraction 0.2] [--server-dir RUTA]
+# Para comparar con una versión anterior: git worktree add /tmp/antes <commit> y --server-dir /tmp/antes.
+import argparse
+import random
+import socket
+import threading
+import time
+
+from bench_utils import LOOPBACK, percentile, read_proc_stats, start_server_process, stop_server_process, REPO_ROOT
+
+def _read_until_newline(sock):
+    data = b""
+    while b"\n" not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("Conexión cerrada antes de la respuesta")
+        data += chunk
+    return data
+
+def lobby_query(port, latencies, errors, lock):
+    t0 = time.perf_counter()
+    try:
+        with socket.create_connection((LOOPBACK, port), timeout=30.0) as sock:
+            sock.sendall(b"LIST_GAMES\n")
+            _read_until_newline(sock)
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+    except OSError:
+        with lock:
+            errors.append("lobby")
+
+def slow_player(port, slow_delay, latencies, errors, lock, index):
+    t0 = time.perf_counter()
+    try:
+        with socket.create_connection((LOOPBACK, port), timeout=30.0) as sock:
+            time.sleep(slow_delay)
+            sock.sendall(f"CREATE_GAME 2 lento_{index}\n".encode())
+            _read_until_newline(sock) # WELCOME
+        with lock:
+            latencies.append(time.perf_counter() - t0 - slow_delay)
+    except OSError:
+        with lock:
+            errors.append("slow")
+
+def run_storm(port, server_pid, num_connections, slow_fraction, slow_delay, concurrency, seed=3):
+    rng = random.Random(seed)
+    kinds = ["slow" if rng.random() < slow_fraction else "lobby" for _ in range(num_connections)]
+    lobby_latencies, slow_latencies, errors = [], [], []
+    lock = threading.Lock()
+    pending = list(enumerate(kinds))
+    pending_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with pending_lock:
+                if not pending:
+                    return
+                index, kind = pending.pop()
+            if kind == "lobby":
+                lobby_query(port, lobby_latencies, errors, lock)
+            else:
+                slow_player(port, slow_delay, slow_latencies, errors, lock, index)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+    stats = read_proc_stats(server_pid)
+
+    lobby_latencies.sort()
+    slow_latencies.sort()
+    return {
+        "connections": num_connections,
+        "errors": len(errors),
+        "wall_s": elapsed,
+        "lobby_queries_per_s": len(lobby_latencies) / elapsed,
+        "lobby_p50_ms": percentile(lobby_latencies, 50) * 1000,
+        "lobby_p95_ms": percentile(lobby_latencies, 95) * 1000,
+        "lobby_p99_ms": percentile(lobby_latencies, 99) * 1000,
+        "slow_player_id_p50_ms": percentile(slow_latencies, 50) * 1000,
+        "slow_player_id_p99_ms": percentile(slow_latencies, 99) * 1000,
+        "server_threads_after": stats["threads"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Tormenta de conexiones contra el bucle de aceptación")
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--slow-fraction", type=float, default=0.2, help="fracción de jugadores lentos")
+    parser.add_argument("--slow-delay", type=float, default=0.3, help="segundos hasta el primer mensaje de un jugador lento")
+    parser.add_argument("--concurrency", type=int, default=50, help="conexiones simultáneas desde el cliente")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--server-dir", default=REPO_ROOT, help="copia del repositorio cuyo server.py se mide")
+    parser.add_argument("--port", type=int, default=18200)
+    args = parser.parse_args()
+
+    proc = start_server_process(args.port, args.engine, server_dir=args.server_dir)
+    try:
+        result = run_storm(args.port, proc.pid, args.connections, args.slow_fraction, args.slow_delay, args.concurrency)
+    finally:
+        stop_server_process(proc)
+
+    print(f"server.py de {args.server_dir} (motor {args.engine})")
+    for key, value in result.items():
+        print(f"{key:28} {value:12.3f}" if isinstance(value, float) else f"{key:28} {value!s:>12}")
+
+if __name__ == "__main__":
+    main()
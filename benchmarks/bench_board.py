@@ -0,0 +1,77 @@
+# benchmarks/bench_board.py
+# Costo de los chequeos del cliente durante una partida: victoria tras cada UPDATE/OPPONENT_SHIP_SUNK
+# y barcos hundidos tras cada impacto recibido. Compara la lista de listas antigua (recorre las 100
+# casillas y las coordenadas de cada barco) con board.BitBoard (popcount y AND de máscaras).
+#
+# Uso: python benchmarks/bench_board.py [--games 2000]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_utils import random_layout  # noqa: E402
+from board import GRID_SIZE, TOTAL_SHIP_CELLS, BitBoard  # noqa: E402
+
+# --- Forma antigua: listas con 0/1/'H'/'M'/'S' ---
+def list_defeated(board):
+    hits = 0
+    for r in range(GRID_SIZE):
+        for c in range(GRID_SIZE):
+            if board[r][c] == 'H' or board[r][c] == 'S': hits += 1
+    return hits >= TOTAL_SHIP_CELLS
+
+def list_sunk_ships(board, ships, sunk):
+    for name, coords in ships:
+        if name not in sunk and all(board[r][c] == 'H' for r, c in coords):
+            sunk.add(name)
+
+def play_lists(layout, shots):
+    mine = [[0] * GRID_SIZE for _ in range(GRID_SIZE)]
+    theirs = [[0] * GRID_SIZE for _ in range(GRID_SIZE)]
+    for _, coords in layout:
+        for r, c in coords: mine[r][c] = 1
+    sunk = set()
+    for r, c in shots:
+        hit = mine[r][c] == 1
+        mine[r][c] = 'H' if hit else 'M'
+        if hit: list_sunk_ships(mine, layout, sunk)
+        theirs[r][c] = 'H' if hit else 'M'
+        if list_defeated(theirs): break
+
+def play_bitboards(layout, shots):
+    mine, theirs = BitBoard(), BitBoard()
+    for name, coords in layout:
+        mine.place_ship(name, coords)
+    sunk = set()
+    for r, c in shots:
+        hit = mine[r][c] == 1
+        mine[r][c] = 'H' if hit else 'M'
+        if hit:
+            for name in mine.ship_masks:
+                if name not in sunk and mine.is_ship_sunk(name): sunk.add(name)
+        theirs[r][c] = 'H' if hit else 'M'
+        if theirs.is_defeated(): break
+
+def main():
+    parser = argparse.ArgumentParser(description="Tablero de listas vs BitBoard en el cliente")
+    parser.add_argument("--games", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    games = []
+    for _ in range(args.games):
+        cells = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+        rng.shuffle(cells)
+        games.append(([(name, coords) for name, _, coords in random_layout(rng)], cells))
+
+    for label, play in (("listas", play_lists), ("BitBoard", play_bitboards)):
+        start = time.perf_counter()
+        for layout, shots in games:
+            play(layout, shots)
+        elapsed = time.perf_counter() - start
+        print(f"{label:10} {elapsed * 1e6 / args.games:10.1f} µs por partida")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+# benchmarks/bench_dispatch.py
+# Micro-benchmark del camino de cada mensaje de un jugador en el servidor: FrameDecoder.feed +
+# parse_message + process_game_command (locks de la partida, resolución del disparo,
+# notify_players_in_game y el encolado en la cola de salida). Corre en el mismo proceso, sin red:
+# las conexiones son falsas (--transport fake, solo cuentan bytes) o colas de salida reales sobre
+# socket.socketpair() con un hilo que vacía el otro extremo (--transport socketpair).
+#
+# Casos aislados (un tipo de mensaje por vez, en partidas 2J y 4J) y de contención (varios hilos
+# jugando partidas 2J y 4J completas a la vez). Por caso y comando se calcula el p50 en µs por
+# mensaje y su "puntaje": ese p50 dividido por el tiempo de una carga de calibración fija (bucle de
+# dict en Python puro) medida justo antes y después del caso, para que una CPU más lenta o con otra
+# frecuencia no parezca una regresión. Con --save-baseline los puntajes se escriben en
+# baseline_dispatch.json; con --check se comparan contra ese archivo y el script termina con error
+# si alguno empeoró más que --threshold.
+# El log del servidor se configura como en producción (logs.setup_logging, con su cola y su hilo
+# escritor) pero en WARNING: los INFO/DEBUG del despacho se descartan en el hilo que los emite.
+#
+# Uso: python benchmarks/bench_dispatch.py [--transport fake] [--ops 10000] [--check | --save-baseline]
+import argparse
+import gc
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import threading
+import time
+
+from bench_utils import percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import logs  # noqa: E402
+import outbound  # noqa: E402
+import server  # noqa: E402
+from board import GRID_SIZE, ship_coords  # noqa: E402
+from protocol import FrameDecoder, parse_message, serialize_board_layout  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_dispatch.json")
+DEFAULT_THRESHOLD = 0.30 # Empeoramiento relativo del puntaje tolerado antes de marcar una regresión
+CALIBRATION_REPEATS = 25
+CONTENTION_THREADS = (1, 4, 16)
+
+LAYOUT_PAYLOAD = serialize_board_layout([
+    ("Carrier", 'H', ship_coords(0, 0, 5, 'H')),
+    ("Battleship", 'V', ship_coords(2, 9, 4, 'V')),
+    ("Cruiser", 'H', ship_coords(4, 2, 3, 'H')),
+    ("Submarine", 'V', ship_coords(6, 0, 3, 'V')),
+    ("Destroyer", 'H', ship_coords(8, 5, 2, 'H')),
+])
+ALL_CELLS = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+# Rival al que dispara cada jugador en 4J (cualquier miembro del otro equipo sirve)
+TARGET_4P = {"P1": "P3", "P2": "P3", "P3": "P1", "P4": "P1"}
+
+class FakeConn:
+    """Conexión en memoria: solo cuenta lo que el servidor le envía."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    def sendall(self, data):
+        self.bytes_sent += len(data)
+
+    def close(self):
+        pass
+
+class SocketPairConn(outbound.ThreadedOutboundQueue):
+    """Cola de salida real sobre un extremo de un socketpair; un hilo lee y descarta el otro extremo."""
+
+    def __init__(self):
+        self._server_side, self._client_side = socket.socketpair()
+        super().__init__(self._server_side, label="bench")
+        self._drainer = threading.Thread(target=self._drain, daemon=True)
+        self._drainer.start()
+
+    def _drain(self):
+        while self._client_side.recv(65536):
+            pass
+
+    def close(self):
+        super().close()
+        self._drainer.join(5)
+        self._client_side.close()
+
+CONN_FACTORIES = {"fake": FakeConn, "socketpair": SocketPairConn}
+
+class BenchGame:
+    """Partida registrada en el servidor con los mismos pasos que un cliente real, lista para cronometrar mensajes."""
+
+    def __init__(self, mode, transport, resolve_shots=True):
+        self.mode = mode
+        self.conns, self.decoders = {}, {}
+        conn = CONN_FACTORIES[transport]()
+        self.state, _, game_id = server.register_player(conn, "bench", f"CREATE_GAME {mode} bench")
+        self._add("P1", conn)
+        for _ in range(mode - 1):
+            conn = CONN_FACTORIES[transport]()
+            _, player_id, _ = server.register_player(conn, "bench", f"JOIN_GAME {game_id} {mode} bench")
+            self._add(player_id, conn)
+        self.setup_players = ("P1", "P2") if mode == 2 else ("P1", "P3")
+        if mode == 4:
+            for captain in self.setup_players:
+                server.ensure_default_team_name(self.state, captain)
+        for player_id, conn in self.conns.items():
+            server.send_setup_signal(self.state, player_id, conn) # Como cada motor al ver la partida lista
+        if resolve_shots:
+            for player_id in self.setup_players:
+                self.dispatch(player_id, f"TEAM_BOARD_DATA {LAYOUT_PAYLOAD}\n".encode())
+
+    def _add(self, player_id, conn):
+        self.conns[player_id] = conn
+        self.decoders[player_id] = FrameDecoder()
+
+    def dispatch(self, player_id, line):
+        """Lo que hace el bucle de handle_client_connection con los bytes recibidos de un jugador."""
+        for frame in self.decoders[player_id].feed(line):
+            server.process_game_command(self.state, player_id, self.conns[player_id], parse_message(frame))
+
+    def start(self):
+        for player_id in self.setup_players:
+            self.dispatch(player_id, b"READY_SETUP\n")
+
+    def close(self):
+        for player_id, conn in self.conns.items():
+            server.cleanup_player(self.state["game_id"], player_id)
+            conn.close()
+
+class Recorder:
+    def __init__(self):
+        self.samples = {} # comando -> [ns]
+
+    def timed(self, command, game, player_id, line):
+        t0 = time.perf_counter_ns()
+        game.dispatch(player_id, line)
+        self.samples.setdefault(command, []).append(time.perf_counter_ns() - t0)
+
+def shot_line(mode, shooter, r, c):
+    if mode == 2:
+        return f"SHOT {r} {c}\n".encode()
+    return f"SHOT {TARGET_4P[shooter]} {r} {c}\n".encode()
+
+def play_resolved_game(mode, transport, recorder, max_ops):
+    """Partida completa con el servidor resolviendo: cada jugador (o equipo) barre el tablero rival en orden."""
+    game = BenchGame(mode, transport)
+    game.start()
+    pending_cells = {}
+    ops = 0
+    while game.state["game_active"] and ops < max_ops:
+        shooter = game.state["current_turn_player_id"]
+        cells = pending_cells.setdefault(server.get_fleet_owner(game.state, shooter), list(ALL_CELLS))
+        r, c = cells.pop()
+        recorder.timed("SHOT", game, shooter, shot_line(mode, shooter, r, c))
+        ops += 1
+    game.close()
+    return ops
+
+def run_shot_resolved(mode):
+    def run(transport, ops, recorder):
+        done = 0
+        while done < ops:
+            done += play_resolved_game(mode, transport, recorder, ops - done)
+    return run
+
+def run_shot_relay(mode):
+    """Clientes sin flota comprometida: SHOT se reenvía al objetivo y su RESULT (siempre agua) pasa el turno."""
+    def run(transport, ops, recorder):
+        game = BenchGame(mode, transport, resolve_shots=False)
+        game.start()
+        for i in range(ops // 2):
+            shooter = game.state["current_turn_player_id"]
+            target = ("P2" if shooter == "P1" else "P1") if mode == 2 else TARGET_4P[shooter]
+            r, c = ALL_CELLS[i % len(ALL_CELLS)]
+            recorder.timed("SHOT", game, shooter, shot_line(mode, shooter, r, c))
+            recorder.timed("RESULT", game, target, f"RESULT {r} {c} M\n".encode())
+        game.close()
+    return run
+
+def run_sunk_relay(mode):
+    def run(transport, ops, recorder):
+        game = BenchGame(mode, transport, resolve_shots=False)
+        game.start()
+        if mode == 4:
+            game.dispatch("P1", b"SHOT P3 0 0\n") # I_SUNK_MY_SHIP de P3 se reenvía al equipo del último tirador
+        sunk_player = "P2" if mode == 2 else "P3"
+        line = b"I_SUNK_MY_SHIP Cruiser 4 2 4 3 4 4\n"
+        for _ in range(ops):
+            recorder.timed("I_SUNK_MY_SHIP", game, sunk_player, line)
+        game.close()
+    return run
+
+def run_team_board_data(mode):
+    def run(transport, ops, recorder):
+        game = BenchGame(mode, transport, resolve_shots=False)
+        line = f"TEAM_BOARD_DATA {LAYOUT_PAYLOAD}\n".encode()
+        for _ in range(ops):
+            recorder.timed("TEAM_BOARD_DATA", game, "P1", line)
+        game.close()
+    return run
+
+def run_ready_setup(mode):
+    """El primer READY_SETUP solo marca al jugador; el segundo empieza la partida (START_GAME a todos)."""
+    def run(transport, ops, recorder):
+        for _ in range(max(1, ops // 2)):
+            game = BenchGame(mode, transport)
+            first, second = game.setup_players
+            recorder.timed("READY_SETUP", game, first, b"READY_SETUP\n")
+            recorder.timed("READY_SETUP+START", game, second, b"READY_SETUP\n")
+            game.close()
+    return run
+
+def run_broadcast(mode):
+    """notify_players_in_game a todos los jugadores, sin pasar por el parseo."""
+    def run(transport, ops, recorder):
+        game = BenchGame(mode, transport)
+        game.start()
+        samples = recorder.samples.setdefault("notify_players_in_game", [])
+        for _ in range(ops):
+            t0 = time.perf_counter_ns()
+            server.notify_players_in_game(game.state, b"TURN P1\n")
+            samples.append(time.perf_counter_ns() - t0)
+        game.close()
+    return run
+
+def run_contention(num_threads):
+    """num_threads hilos jugando a la vez partidas completas, alternando 2J y 4J."""
+    def run(transport, ops, recorder):
+        per_thread = ops // num_threads
+        recorders = [Recorder() for _ in range(num_threads)]
+
+        def worker(index):
+            done, mode = 0, 2 if index % 2 == 0 else 4
+            while done < per_thread:
+                done += play_resolved_game(mode, transport, recorders[index], per_thread - done)
+                mode = 6 - mode
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+        start = time.perf_counter()
+        for t in threads: t.start()
+        for t in threads: t.join()
+        recorder.wall_s = time.perf_counter() - start
+        for r in recorders:
+            recorder.samples.setdefault("SHOT", []).extend(r.samples.get("SHOT", []))
+    return run
+
+CASES = [
+    ("shot_2p", run_shot_resolved(2)),
+    ("shot_4p", run_shot_resolved(4)),
+    ("shot_relay_2p", run_shot_relay(2)),
+    ("shot_relay_4p", run_shot_relay(4)),
+    ("sunk_relay_2p", run_sunk_relay(2)),
+    ("sunk_relay_4p", run_sunk_relay(4)),
+    ("team_board_data_2p", run_team_board_data(2)),
+    ("ready_setup_2p", run_ready_setup(2)),
+    ("ready_setup_4p", run_ready_setup(4)),
+    ("broadcast_4p", run_broadcast(4)),
+] + [(f"contention_{n}t", run_contention(n)) for n in CONTENTION_THREADS]
+
+def calibration_workload():
+    counts = {}
+    for i in range(2000):
+        counts[i & 63] = counts.get(i & 63, 0) + i
+    return counts
+
+def calibrate():
+    """µs de la carga de calibración (mínimo de varias repeticiones)."""
+    best = None
+    for _ in range(CALIBRATION_REPEATS):
+        t0 = time.perf_counter_ns()
+        calibration_workload()
+        elapsed = time.perf_counter_ns() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best / 1000
+
+def run_case(run, transport, ops, rounds):
+    """Repite el caso `rounds` veces y se queda, por comando, con la ronda de menor puntaje (la menos perturbada)."""
+    best = {}
+    for _ in range(rounds):
+        recorder = Recorder()
+        gc.collect() # Que la basura de la ronda anterior no se recolecte en medio de esta
+        calibration_us = calibrate()
+        run(transport, ops, recorder)
+        calibration_us = min(calibration_us, calibrate())
+        for command, samples in recorder.samples.items():
+            samples.sort()
+            row = {"n": len(samples), "p50_us": percentile(samples, 50) / 1000, "p99_us": percentile(samples, 99) / 1000,
+                   "mean_us": statistics.fmean(samples) / 1000}
+            row["score"] = row["p50_us"] / calibration_us
+            if hasattr(recorder, "wall_s"):
+                row["msgs_per_s"] = len(samples) / recorder.wall_s
+            if command not in best or row["score"] < best[command]["score"]:
+                best[command] = row
+    return best
+
+def machine_info():
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "system": platform.system()}
+
+def load_baseline():
+    try:
+        with open(BASELINE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_regression(row, base, threshold):
+    return base is not None and row["score"] > base["score"] * (1 + threshold)
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark del despacho de mensajes del servidor")
+    parser.add_argument("--transport", choices=sorted(CONN_FACTORIES), default="fake")
+    parser.add_argument("--ops", type=int, default=10000, help="mensajes cronometrados por caso y ronda")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--cases", help="lista separada por comas (por defecto todos)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"guardar los resultados en {os.path.basename(BASELINE_PATH)}")
+    parser.add_argument("--check", action="store_true", help="comparar contra la línea base y fallar si hay regresiones")
+    parser.add_argument("--retries", type=int, default=2, help="veces que se vuelve a medir un caso que parece haber empeorado")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="empeoramiento relativo tolerado del p50")
+    args = parser.parse_args()
+    logs.setup_logging("WARNING")
+
+    selected = set(args.cases.split(",")) if args.cases else None
+    baseline = load_baseline()
+    reference = (baseline or {}).get(args.transport, {})
+    if baseline and baseline.get("machine") != machine_info():
+        print(f"AVISO: la línea base se midió en {baseline.get('machine')}; las comparaciones son orientativas.")
+
+    results, regressions = {}, []
+    print(f"transporte {args.transport}, {args.ops} mensajes x {args.rounds} rondas por caso")
+    print(f"{'caso/comando':40} {'n':>7} {'p50 µs':>9} {'p99 µs':>9} {'media µs':>9} {'puntaje':>8} {'base':>8} {'cambio':>8}")
+    for name, run in CASES:
+        if selected and name not in selected:
+            continue
+        rows = run_case(run, args.transport, args.ops, args.rounds)
+        for _ in range(args.retries if args.check else 0):
+            # Una regresión tiene que repetirse: un caso lento por ruido de la máquina se vuelve a medir
+            if not any(is_regression(row, reference.get(f"{name}/{command}"), args.threshold) for command, row in rows.items()):
+                break
+            for command, row in run_case(run, args.transport, args.ops, args.rounds).items():
+                if row["score"] < rows[command]["score"]:
+                    rows[command] = row
+        for command, row in rows.items():
+            key = f"{name}/{command}"
+            results[key] = {"p50_us": round(row["p50_us"], 2), "score": round(row["score"], 4)}
+            base = reference.get(key, {}).get("score")
+            change = f"{(row['score'] / base - 1):+8.0%}" if base else f"{'-':>8}"
+            extra = f"  {row['msgs_per_s']:.0f} msgs/s" if "msgs_per_s" in row else ""
+            print(f"{key:40} {row['n']:>7} {row['p50_us']:>9.2f} {row['p99_us']:>9.2f} {row['mean_us']:>9.2f} "
+                  f"{row['score']:>8.4f} {base if base else '-':>8} {change}{extra}")
+            if is_regression(row, reference.get(key), args.threshold):
+                regressions.append(key)
+
+    if args.save_baseline:
+        baseline = baseline or {}
+        baseline["machine"] = machine_info()
+        baseline.setdefault(args.transport, {}).update(results)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Línea base guardada en {BASELINE_PATH}")
+    if args.check and regressions:
+        print(f"REGRESIÓN (> {args.threshold:.0%} sobre la línea base): {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
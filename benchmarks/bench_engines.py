@@ -0,0 +1,119 @@
+# benchmarks/bench_engines.py
+# Compara los dos motores del servidor (hilos vs asyncio) en loopback:
+#   1. Lobbies ociosos: N conexiones CREATE_GAME abiertas a la vez (tiempo hasta WELCOME,
+#      hilos y memoria del servidor, CPU consumida mientras solo esperan).
+#   2. Partidas 2J: G partidas concurrentes intercambiando disparos (latencia SHOT -> UPDATE).
+#
+# Uso: python benchmarks/bench_engines.py [--idle 500] [--games 20] [--shots 50]
+import argparse
+import threading
+import time
+
+from bench_utils import (WELCOME_PREFIXES, LineClient, percentile, read_proc_stats, start_server_process,
+                         stop_server_process)
+
+def run_idle_lobbies(port, server_pid, num_connections, idle_seconds):
+    clients = []
+    start = time.perf_counter()
+    for i in range(num_connections):
+        client = LineClient(port, timeout=30.0)
+        client.send(f"CREATE_GAME 2 bench_{i}")
+        clients.append(client)
+    for client in clients:
+        client.wait_for(WELCOME_PREFIXES)
+    elapsed = time.perf_counter() - start
+
+    cpu_before = read_proc_stats(server_pid)["cpu_s"] or 0.0
+    time.sleep(idle_seconds)
+    stats = read_proc_stats(server_pid)
+    cpu_idle = (stats["cpu_s"] or 0.0) - cpu_before
+
+    for client in clients:
+        client.close()
+    return {
+        "connections": num_connections,
+        "connect_to_player_id_s": elapsed,
+        "server_threads": stats["threads"],
+        "server_rss_mb": (stats["rss_kb"] or 0) / 1024.0,
+        "idle_cpu_s": cpu_idle,
+    }
+
+def play_shots(port, shots_per_game, latencies, lock):
+    """Una partida 2J donde los disparos siempre fallan, para alternar el turno en cada tiro."""
+    p1 = LineClient(port)
+    p1.send("CREATE_GAME 2 bench_a")
+    game_id = p1.wait_for(WELCOME_PREFIXES).split()[2]
+    p2 = LineClient(port)
+    p2.send(f"JOIN_GAME {game_id} 2 bench_b")
+    for player in (p1, p2):
+        player.wait_for("SETUP_YOUR_BOARD")
+        player.send("READY_SETUP")
+    p1.wait_for("START_GAME")
+
+    shooter, target = p1, p2
+    local_latencies = []
+    for shot_index in range(shots_per_game):
+        r, c = divmod(shot_index % 100, 10)
+        t0 = time.perf_counter()
+        shooter.send(f"SHOT {r} {c}")
+        target.wait_for("SHOT")
+        target.send(f"RESULT {r} {c} M")
+        shooter.wait_for("UPDATE")
+        local_latencies.append(time.perf_counter() - t0)
+        target.wait_for("YOUR_TURN_AGAIN")
+        shooter, target = target, shooter
+
+    with lock:
+        latencies.extend(local_latencies)
+    p1.close()
+    p2.close()
+
+def run_games(port, num_games, shots_per_game):
+    latencies = []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=play_shots, args=(port, shots_per_game, latencies, lock))
+               for _ in range(num_games)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "games": num_games,
+        "shots": len(latencies),
+        "wall_s": elapsed,
+        "shot_update_p50_ms": percentile(latencies, 50) * 1000,
+        "shot_update_p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hilos vs asyncio del servidor")
+    parser.add_argument("--idle", type=int, default=500, help="conexiones de lobby ociosas")
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--games", type=int, default=20, help="partidas 2J concurrentes")
+    parser.add_argument("--shots", type=int, default=50, help="disparos por partida")
+    parser.add_argument("--port", type=int, default=18000)
+    args = parser.parse_args()
+
+    results = {}
+    for offset, engine in enumerate(("threads", "asyncio")):
+        port = args.port + offset
+        proc = start_server_process(port, engine)
+        try:
+            results[engine] = {
+                "idle": run_idle_lobbies(port, proc.pid, args.idle, args.idle_seconds),
+                "games": run_games(port, args.games, args.shots),
+            }
+        finally:
+            stop_server_process(proc)
+
+    print(f"{'métrica':32} {'threads':>12} {'asyncio':>12}")
+    for section in ("idle", "games"):
+        for key in results["threads"][section]:
+            a = results["threads"][section][key]
+            b = results["asyncio"][section][key]
+            fmt = (lambda v: f"{v:12.3f}") if isinstance(a, float) else (lambda v: f"{v!s:>12}")
+            print(f"{section + '.' + key:32} {fmt(a)} {fmt(b)}")
+
+if __name__ == "__main__":
+    main()
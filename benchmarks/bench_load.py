@@ -0,0 +1,252 @@
+# benchmarks/bench_load.py
+# Prueba de carga del servidor: mantiene N partidas simultáneas de bots (ClientSession de
+# sim_clients.py, el protocolo real por sockets) que crean o se unen a una partida, colocan la flota y
+# juegan hasta GAME_OVER; al terminar una partida, ese hueco empieza otra. N sigue un perfil de etapas
+# (concurrencia x segundos) para ver dónde se satura el servidor. Por etapa se reporta:
+#   - partidas terminadas por segundo, duración mediana de una partida y partidas fallidas (sin
+#     ganador, desconexión o timeout)
+#   - latencia SHOT -> UPDATE vista por el tirador (p50/p95/p99)
+#   - latencia de unión (p50/p99): desde que un invitado envía JOIN_GAME hasta que recibe su señal de
+#     configuración (SETUP_YOUR_BOARD, o TEAMS_INFO_FINAL si no es capitán en 4J); el último en unirse
+#     completa la partida, así que mide solo lo que tarda el servidor en recibirlo y dejarlo listo
+#   - CPU del servidor (% de un núcleo) y su número máximo de hilos, sumando los workers si se lanza
+#     con --server-args '--workers N'
+# Al final muestra además lo que midió el propio servidor (comando STATS): latencia de turno, espera
+# en el lobby y esperas por los locks de las partidas (con --workers N, las de un solo worker).
+# Todo corre contra un servidor local en loopback lanzado por el propio script.
+#
+# Uso: python benchmarks/bench_load.py [--profile ramp | --stages 10x15,40x15] [--four-player-fraction 0.25]
+#      [--engine threads] [--wire text|binary|mixed] [--repo DIR] [--server-output FILE]
+#      [--server-args '--log-level DEBUG']
+import argparse
+import os
+import random
+import threading
+import time
+
+from bench_utils import (LOOPBACK, REPO_ROOT, percentile, query_server_stats, read_server_stats,
+                         start_server_process, stop_server_process)
+from sim_clients import WIRE_CHOICES, BotSession, wants_binary_wire
+
+from client_session import connect_session, run_session # sim_clients ya agregó la raíz del repo al path
+
+# Etapas (partidas simultáneas, segundos) de cada perfil predefinido
+PROFILES = {
+    "steady": [(20, 30)],
+    "ramp": [(5, 10), (10, 10), (20, 10), (40, 10), (80, 10)],
+    "spike": [(10, 10), (80, 10), (10, 10)],
+}
+GAME_TIMEOUT_SECONDS = 30 # Sin mensajes del servidor en este tiempo, la partida cuenta como fallida
+SAMPLE_INTERVAL_SECONDS = 0.5
+SETUP_SIGNALS = ("SETUP_YOUR_BOARD", "TEAMS_INFO_FINAL") # Lo primero que recibe un jugador con la partida lista
+
+class LoadBot(BotSession):
+    """Bot de sim_clients que además mide la latencia de sus disparos."""
+
+    def __init__(self, game_mode, player_name, seed, binary_wire=False):
+        super().__init__(game_mode, player_name, seed, binary_wire)
+        self.assigned = threading.Event() # WELCOME recibido (el anfitrión ya conoce el game_id)
+        self.join_sent_at = None # Solo invitados: el anfitrión espera además a que se unan los demás
+        self.join_latency = None
+        self.shot_sent_at = None
+        self.shot_latencies = []
+
+    def start(self, action, game_id=None):
+        if action == "JOIN":
+            self.join_sent_at = time.perf_counter()
+        return super().start(action, game_id)
+
+    def shoot(self, r, c):
+        sent = super().shoot(r, c)
+        if sent:
+            self.shot_sent_at = time.perf_counter()
+        return sent
+
+    def handle_frame(self, message):
+        received_at = time.perf_counter()
+        parsed = super().handle_frame(message)
+        # El primer UPDATE después de mi SHOT es su resultado: en 4J el que dispara es uno solo por turno
+        if self.shot_sent_at is not None and parsed is not None and parsed.command == "UPDATE":
+            self.shot_latencies.append(received_at - self.shot_sent_at)
+            self.shot_sent_at = None
+        if self.player_id is not None:
+            self.assigned.set()
+        if self.join_sent_at is not None and parsed is not None and parsed.command in SETUP_SIGNALS:
+            self.join_latency = received_at - self.join_sent_at
+            self.join_sent_at = None
+        return parsed
+
+def play_game(port, players, seed, wire="text"):
+    """Juega una partida completa. Retorna (terminó con ganadores, latencias de disparo, latencias de unión, duración)."""
+    start = time.perf_counter()
+    sessions, sockets, threads = [], [], []
+
+    def connect(session, action, game_id=None):
+        sock = connect_session(session, LOOPBACK, port, action, game_id)
+        if sock is None:
+            return False
+        sock.settimeout(GAME_TIMEOUT_SECONDS)
+        sessions.append(session)
+        sockets.append(sock)
+        threads.append(threading.Thread(target=run_session, args=(session, sock), daemon=True))
+        threads[-1].start()
+        return True
+
+    host = LoadBot(players, f"load{seed}", seed * 10, wants_binary_wire(wire, 0))
+    ok = connect(host, "CREATE") and host.assigned.wait(GAME_TIMEOUT_SECONDS)
+    for i in range(1, players if ok else 0):
+        ok = connect(LoadBot(players, f"load{seed}_{i}", seed * 10 + i, wants_binary_wire(wire, i)), "JOIN", host.game_id)
+        if not ok:
+            break
+    for t in threads: t.join()
+    for sock in sockets: sock.close()
+
+    winners = sum(s.status_message.startswith("¡HAS GANADO") for s in sessions)
+    latencies = [latency for s in sessions for latency in s.shot_latencies]
+    join_latencies = [s.join_latency for s in sessions if s.join_latency is not None]
+    finished = ok and len(sessions) == players and winners == players // 2
+    return finished, latencies, join_latencies, time.perf_counter() - start
+
+class LoadRun:
+    """Huecos de partida que se encienden o apagan según la concurrencia de la etapa actual."""
+
+    def __init__(self, port, four_player_fraction, seed, wire="text"):
+        self.port = port
+        self.wire = wire
+        self.four_player_fraction = four_player_fraction
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.target = 0 # Huecos activos en la etapa actual
+        self.stage = 0
+        self.done = False
+        self.next_seed = 0
+        self.slots = []
+        self.stage_results = {} # etapa -> {"games", "failed", "latencies", "joins", "durations"}
+
+    def set_stage(self, stage, concurrency):
+        with self.lock:
+            self.stage = stage
+            self.target = concurrency
+            self.stage_results[stage] = {"games": 0, "failed": 0, "latencies": [], "joins": [], "durations": []}
+        while len(self.slots) < concurrency:
+            slot = threading.Thread(target=self._run_slot, args=(len(self.slots),), daemon=True)
+            self.slots.append(slot)
+            slot.start()
+
+    def _run_slot(self, index):
+        while True:
+            with self.lock:
+                if self.done:
+                    return
+                active = index < self.target
+                if active:
+                    seed = self.next_seed
+                    self.next_seed += 1
+                    players = 4 if self.rng.random() < self.four_player_fraction else 2
+            if not active: # Hueco sobrante de una etapa con más concurrencia: esperar a la próxima
+                time.sleep(0.05)
+                continue
+            ok, latencies, join_latencies, duration = play_game(self.port, players, seed, self.wire)
+            with self.lock: # La partida cuenta en la etapa en que terminó
+                if self.done: # Terminó después de la última etapa
+                    return
+                results = self.stage_results[self.stage]
+                results["games" if ok else "failed"] += 1
+                results["latencies"].extend(latencies)
+                results["joins"].extend(join_latencies)
+                if ok: results["durations"].append(duration)
+
+    def stop(self):
+        with self.lock:
+            self.done = True
+            self.target = 0
+        for slot in self.slots:
+            slot.join(GAME_TIMEOUT_SECONDS * 2)
+
+def sample_server(pid, samples, stop_event):
+    while not stop_event.is_set():
+        samples.append((time.perf_counter(), read_server_stats(pid)))
+        stop_event.wait(SAMPLE_INTERVAL_SECONDS)
+
+def stage_server_stats(samples, start, end):
+    window = [(t, s) for t, s in samples if start <= t <= end and s["cpu_s"] is not None]
+    if len(window) < 2:
+        return 0.0, 0
+    (t0, first), (t1, last) = window[0], window[-1]
+    cpu_pct = 100.0 * (last["cpu_s"] - first["cpu_s"]) / (t1 - t0) if t1 > t0 else 0.0
+    return cpu_pct, max(s["threads"] or 0 for _, s in window)
+
+def parse_stages(text):
+    """'10x15,40x15' -> [(10, 15.0), (40, 15.0)]"""
+    stages = []
+    for item in text.split(","):
+        concurrency, seconds = item.lower().split("x")
+        stages.append((int(concurrency), float(seconds)))
+    return stages
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga: partidas simultáneas de bots contra el servidor")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="ramp")
+    parser.add_argument("--stages", help="etapas propias 'partidasxsegundos,...' (reemplaza a --profile)")
+    parser.add_argument("--four-player-fraction", type=float, default=0.0, help="fracción de partidas 4J (0 a 1)")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--wire", choices=WIRE_CHOICES, default="text", help="formato del protocolo de los bots")
+    parser.add_argument("--port", type=int, default=18700)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repo", default=REPO_ROOT, help="copia del repositorio cuyo server.py se prueba")
+    parser.add_argument("--server-output", help="archivo donde escribir la salida del servidor (por defecto se descarta)")
+    parser.add_argument("--server-args", default="", help="argumentos extra para server.py, p. ej. '--log-level DEBUG'")
+    args = parser.parse_args()
+    stages = parse_stages(args.stages) if args.stages else PROFILES[args.profile]
+
+    proc = start_server_process(args.port, args.engine, args.server_args.split(), server_dir=args.repo,
+                                output_path=args.server_output)
+    samples, stop_sampling = [], threading.Event()
+    sampler = threading.Thread(target=sample_server, args=(proc.pid, samples, stop_sampling), daemon=True)
+    sampler.start()
+    run = LoadRun(args.port, args.four_player_fraction, args.seed, args.wire)
+    windows = []
+    server_stats = None
+    try:
+        for stage, (concurrency, seconds) in enumerate(stages):
+            start = time.perf_counter()
+            run.set_stage(stage, concurrency)
+            time.sleep(seconds)
+            windows.append((start, time.perf_counter()))
+        run.stop()
+        server_stats = query_server_stats(args.port)
+    finally:
+        stop_sampling.set()
+        sampler.join()
+        stop_server_process(proc)
+
+    print(f"servidor {args.engine} de {os.path.abspath(args.repo)}, {args.four_player_fraction:.0%} de partidas 4J, "
+          f"protocolo {args.wire}")
+    print(f"{'etapa':>5} {'partidas':>8} {'seg':>5} {'terminadas':>10} {'fallidas':>8} {'partidas/s':>10} "
+          f"{'s/partida':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'unión p50':>10} {'unión p99':>10} "
+          f"{'CPU %':>6} {'hilos':>6}")
+    total_failed = 0
+    for stage, ((concurrency, seconds), (start, end)) in enumerate(zip(stages, windows)):
+        results = run.stage_results[stage]
+        latencies = sorted(results["latencies"])
+        joins = sorted(results["joins"])
+        cpu_pct, threads = stage_server_stats(samples, start, end)
+        total_failed += results["failed"]
+        print(f"{stage:>5} {concurrency:>8} {seconds:>5.0f} {results['games']:>10} {results['failed']:>8} "
+              f"{results['games'] / (end - start):>10.1f} {percentile(sorted(results['durations']), 50):>9.2f} "
+              f"{percentile(latencies, 50) * 1000:>8.2f} "
+              f"{percentile(latencies, 95) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f} "
+              f"{percentile(joins, 50) * 1000:>10.2f} {percentile(joins, 99) * 1000:>10.2f} "
+              f"{cpu_pct:>6.0f} {threads:>6}")
+    if server_stats: # Vistas desde el servidor (STATS); una versión sin métricas no las tiene
+        for name, label in (("turn_latency", "latencia de turno SHOT -> TURN"), ("lobby_wait", "espera en el lobby")):
+            h = server_stats["histograms"][name]
+            print(f"servidor, {label}: {h['count']} muestras, p50 {h['p50_ms']} ms, p95 {h['p95_ms']} ms, "
+                  f"p99 {h['p99_ms']} ms, máx {h['max_ms']} ms")
+        for name, waits in sorted(server_stats["lock_wait"].items()):
+            print(f"servidor, esperas por {name}: {waits['waits']}, total {waits['total_ms']} ms, máx {waits['max_ms']} ms")
+    if total_failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
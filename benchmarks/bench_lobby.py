@@ -0,0 +1,157 @@
+# benchmarks/bench_lobby.py
+# Costo del lobby con muchos menús abiertos: B navegadores mirando la lista mientras hay G partidas
+# abiertas y se crean/cierran partidas a un ritmo fijo. Tres modos de navegador:
+#   poll      LIST_GAMES completo cada --interval s (comportamiento del menú antiguo),
+#   poll-v    LIST_GAMES <versión> cada --interval s (GAMES_LIST_UNCHANGED si no hubo cambios),
+#   subscribe una conexión SUBSCRIBE_GAMES con deltas GAME_ADDED/GAME_UPDATED/GAME_REMOVED.
+# Se mide la CPU del servidor, los bytes recibidos por los navegadores y cuánto tarda una partida
+# nueva en aparecer en su lista.
+#
+# Uso: python benchmarks/bench_lobby.py [--browsers 100] [--games 200] [--churn 5] [--seconds 10]
+import argparse
+import socket
+import threading
+import time
+
+from bench_utils import LOOPBACK, WELCOME_PREFIXES, LineClient, percentile, read_proc_stats, start_server_process, stop_server_process
+
+def _query(port, request):
+    with socket.create_connection((LOOPBACK, port), timeout=10.0) as sock:
+        sock.sendall(f"{request}\n".encode())
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return data
+
+class Browser(threading.Thread):
+    def __init__(self, port, mode, interval, created_at, seen_latencies, stop_event):
+        super().__init__(daemon=True)
+        self.port, self.mode, self.interval = port, mode, interval
+        self.created_at, self.seen_latencies, self.stop_event = created_at, seen_latencies, stop_event
+        self.bytes_received = 0
+        self.seen = set()
+
+    def _note_games(self, ids):
+        now = time.perf_counter()
+        for game_id in ids:
+            if game_id not in self.seen:
+                self.seen.add(game_id)
+                created = self.created_at.get(game_id)
+                if created is not None:
+                    self.seen_latencies.append(now - created)
+
+    def run(self):
+        if self.mode == "subscribe":
+            self._run_subscribe()
+        else:
+            self._run_poll()
+
+    def _run_poll(self):
+        version = 0
+        while not self.stop_event.is_set():
+            request = "LIST_GAMES" if self.mode == "poll" else f"LIST_GAMES {version}"
+            try:
+                data = _query(self.port, request)
+            except OSError:
+                continue
+            self.bytes_received += len(data)
+            line = data.decode().strip()
+            if line.startswith("GAMES_LIST_V"):
+                parts = line.split(" ", 2)
+                version = int(parts[1])
+                payload = parts[2] if len(parts) > 2 else ""
+                self._note_games(int(e.split("|")[1]) for e in payload.split(";") if e)
+            elif line.startswith("GAMES_LIST "):
+                self._note_games(int(e.split("|")[1]) for e in line[len("GAMES_LIST "):].split(";") if e)
+            self.stop_event.wait(self.interval)
+
+    def _run_subscribe(self):
+        client = LineClient(self.port, timeout=None)
+        client.send("SUBSCRIBE_GAMES")
+        client.sock.settimeout(0.5)
+        while not self.stop_event.is_set():
+            try:
+                chunk = client.sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                break
+            self.bytes_received += len(chunk)
+            client.buffer += chunk
+            while b"\n" in client.buffer:
+                line, client.buffer = client.buffer.split(b"\n", 1)
+                parts = line.decode().split(" ", 2)
+                if parts[0] == "GAME_ADDED":
+                    self._note_games([int(parts[2].split("|")[1])])
+                elif parts[0] == "GAMES_LIST_V" and len(parts) > 2:
+                    self._note_games(int(e.split("|")[1]) for e in parts[2].split(";") if e)
+        client.close()
+
+def run_mode(port, mode, args):
+    proc = start_server_process(port)
+    stop_event = threading.Event()
+    open_games = []
+    try:
+        for i in range(args.games):
+            client = LineClient(port)
+            client.send(f"CREATE_GAME 2 abierta_{i}")
+            client.wait_for(WELCOME_PREFIXES)
+            open_games.append(client)
+
+        created_at, latencies = {}, []
+        browsers = [Browser(port, mode, args.interval, created_at, latencies, stop_event) for _ in range(args.browsers)]
+        for b in browsers: b.start()
+        time.sleep(1.0) # Que todos tengan su primera lista antes de medir
+        for b in browsers: b.bytes_received = 0
+        cpu_before = read_proc_stats(proc.pid)["cpu_s"] or 0.0
+
+        # Churn: cada 1/churn s se crea una partida nueva y se cierra la más antigua
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            client = LineClient(port)
+            client.send("CREATE_GAME 2 nueva")
+            game_id = int(client.wait_for(WELCOME_PREFIXES).split()[2])
+            created_at[game_id] = time.perf_counter()
+            open_games.append(client)
+            open_games.pop(0).close()
+            time.sleep(1.0 / args.churn)
+        time.sleep(args.interval + 0.5) # Dejar que los navegadores vean los últimos cambios
+
+        cpu = (read_proc_stats(proc.pid)["cpu_s"] or 0.0) - cpu_before
+        stop_event.set()
+        for b in browsers: b.join(timeout=2)
+    finally:
+        for client in open_games:
+            client.close()
+        stop_server_process(proc)
+
+    latencies.sort()
+    return {
+        "server_cpu_s": cpu,
+        "bytes_to_browsers_kb": sum(b.bytes_received for b in browsers) / 1024.0,
+        "new_game_visible_p50_ms": percentile(latencies, 50) * 1000,
+        "new_game_visible_p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Lobby: consultas periódicas vs suscripción")
+    parser.add_argument("--browsers", type=int, default=100)
+    parser.add_argument("--games", type=int, default=200, help="partidas abiertas en el lobby")
+    parser.add_argument("--churn", type=float, default=5.0, help="partidas creadas (y cerradas) por segundo")
+    parser.add_argument("--interval", type=float, default=1.0, help="intervalo de consulta de los modos poll")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=18400)
+    args = parser.parse_args()
+
+    modes = ("poll", "poll-v", "subscribe")
+    results = {mode: run_mode(args.port + i, mode, args) for i, mode in enumerate(modes)}
+    print(f"{args.browsers} navegadores, {args.games} partidas abiertas, {args.churn}/s de cambios, {args.seconds} s")
+    print(f"{'métrica':28}" + "".join(f"{mode:>12}" for mode in modes))
+    for key in results["poll"]:
+        print(f"{key:28}" + "".join(f"{results[mode][key]:12.2f}" for mode in modes))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_protocol.py
+# Throughput del entramado de mensajes: las dos formas antiguas (servidor: recv + split('\n') por
+# bloque; cliente: string que crece con += decode()) frente a protocol.FrameDecoder + parse_message.
+# El flujo se corta en trozos de tamaño aleatorio para simular mensajes partidos y ráfagas juntas.
+#
+# Uso: python benchmarks/bench_protocol.py [--messages 200000] [--max-chunk 1024]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from protocol import FrameDecoder, ProtocolError, parse_message  # noqa: E402
+
+# (mensaje, peso): proporciones aproximadas de una partida real, dominada por disparos y turnos.
+SAMPLE_MESSAGES = [
+    ("SHOT 3 4", 20),
+    ("SHOT P3 7 1", 20),
+    ("RESULT 3 4 H", 20),
+    ("UPDATE P3 7 1 M", 20),
+    ("TURN P2", 20),
+    ("I_SUNK_MY_SHIP Cruiser 2 2 2 3 2 4", 2),
+    ("OPPONENT_SHIP_SUNK P3 Carrier 0 0 0 1 0 2 0 3 0 4", 2),
+    ("MSG El capitan del Equipo Ñandú (P1) ha terminado.", 4),
+    ("TEAM_BOARD_DATA 0 0 0 1 0 2 0 3 0 4|Carrier|H;2 0 3 0 4 0 5 0|Battleship|V;"
+     "6 6 6 7 6 8|Cruiser|H;8 1 8 2 8 3|Submarine|H;9 8 9 9|Destroyer|H", 1),
+]
+
+def build_stream(num_messages, seed=7):
+    rng = random.Random(seed)
+    messages = [m for m, _ in SAMPLE_MESSAGES]
+    weights = [w for _, w in SAMPLE_MESSAGES]
+    lines = rng.choices(messages, weights=weights, k=num_messages)
+    return lines, ("\n".join(lines) + "\n").encode()
+
+def chunk_stream(stream, max_chunk, seed=11):
+    rng = random.Random(seed)
+    chunks, pos = [], 0
+    while pos < len(stream):
+        size = rng.randint(1, max_chunk)
+        chunks.append(stream[pos:pos + size])
+        pos += size
+    return chunks
+
+def old_server_framing(chunks):
+    """Como el bucle antiguo de handle_client_connection: cada recv se procesa por separado."""
+    parsed, errors = 0, 0
+    for chunk in chunks:
+        try:
+            text = chunk.decode()
+        except UnicodeDecodeError:
+            errors += 1
+            continue
+        for single in text.split("\n"):
+            data = single.strip()
+            if data:
+                data.split()
+                parsed += 1
+    return parsed, errors
+
+def old_client_framing(chunks):
+    """Como el antiguo listen_for_server_messages: data_buffer += data_bytes.decode()."""
+    parsed, errors = 0, 0
+    buffer = ""
+    for chunk in chunks:
+        try:
+            buffer += chunk.decode()
+        except UnicodeDecodeError:
+            errors += 1
+            continue
+        while "\n" in buffer:
+            message, buffer = buffer.split("\n", 1)
+            message = message.strip()
+            if message:
+                message.split()
+                parsed += 1
+    return parsed, errors
+
+def new_framing_only(chunks):
+    """Solo el entramado (comparable a los antiguos, que tampoco parseaban más allá de split())."""
+    decoder = FrameDecoder()
+    parsed = 0
+    for chunk in chunks:
+        for frame in decoder.feed(chunk):
+            frame.split()
+            parsed += 1
+    return parsed, 0
+
+def new_framing(chunks):
+    decoder = FrameDecoder()
+    parsed, errors = 0, 0
+    for chunk in chunks:
+        for frame in decoder.feed(chunk):
+            try:
+                parse_message(frame)
+                parsed += 1
+            except ProtocolError:
+                errors += 1
+    return parsed, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del entramado del protocolo")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--max-chunk", type=int, default=1024)
+    args = parser.parse_args()
+
+    lines, stream = build_stream(args.messages)
+    chunks = chunk_stream(stream, args.max_chunk)
+    print(f"{len(lines)} mensajes, {len(stream)} bytes en {len(chunks)} trozos (1..{args.max_chunk} bytes)")
+    print(f"{'variante':24} {'msgs/s':>12} {'correctos':>10} {'errores':>8}")
+    for name, fn in (("servidor antiguo", old_server_framing),
+                     ("cliente antiguo", old_client_framing),
+                     ("FrameDecoder", new_framing_only),
+                     ("FrameDecoder+parse", new_framing)):
+        start = time.perf_counter()
+        parsed, errors = fn(chunks)
+        elapsed = time.perf_counter() - start
+        # Un mensaje partido entre dos recv cuenta como dos "mensajes" para el servidor antiguo,
+        # así que los correctos pueden superar el total aunque el contenido esté roto.
+        print(f"{name:24} {parsed / elapsed:12.0f} {parsed:10d} {errors:8d}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/bench_render.py
+# Tiempo de dibujo de los dos tableros por cuadro en un estado de final de partida (casi todos los
+# barcos hundidos), sin ventana (SDL_VIDEODRIVER=dummy). Compara el dibujo antiguo (200 rects de agua
+# y rejilla y un recorrido de las 100 casillas por tablero, con una superficie nueva por cada 'S', y
+# cada barco hundido copiado y oscurecido en cada cuadro) con client.draw_game_grid, que usa el fondo
+# prerenderizado, la capa de marcadores y las variantes de barco calculadas al cargar las imágenes.
+# También comprueba que el resultado sea idéntico píxel a píxel.
+#
+# Uso: python benchmarks/bench_render.py [--frames 300]
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pygame  # noqa: E402
+
+import client  # noqa: E402
+from board import GRID_SIZE, SHIPS_CONFIG, ship_coords  # noqa: E402
+from client_session import ClientSession  # noqa: E402
+
+def legacy_draw_game_grid(surface, offset_x, offset_y, board_matrix, is_my_board):
+    """Copia del dibujo anterior a las capas y a las variantes de barco precalculadas."""
+    CELL_SIZE = client.CELL_SIZE
+    for r_idx in range(GRID_SIZE):
+        for c_idx in range(GRID_SIZE):
+            cell_rect = pygame.Rect(offset_x + c_idx * CELL_SIZE, offset_y + r_idx * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+            pygame.draw.rect(surface, client.BLUE_WATER, cell_rect)
+            pygame.draw.rect(surface, client.BOARD_GRID_COLOR, cell_rect, 1)
+    if is_my_board:
+        for ship_detail in client.session.my_ships:
+            base_image = client.ship_images[ship_detail["name"]][ship_detail["orientation"]]
+            image_to_draw = client.create_darkened_image(base_image) if ship_detail["is_sunk"] else base_image
+            ref_r, ref_c = ship_detail["coords"][0]
+            surface.blit(image_to_draw, (offset_x + ref_c * CELL_SIZE, offset_y + ref_r * CELL_SIZE))
+    else:
+        for sunk_info in client.session.opponent_sunk_ships:
+            base_image = client.ship_images[sunk_info["name"]][sunk_info["orientation"]]
+            darkened = client.create_darkened_image(base_image, darkness_alpha=150)
+            min_r = min(r for r, c in sunk_info["coords"])
+            min_c = min(c for r, c in sunk_info["coords"])
+            surface.blit(darkened, (offset_x + min_c * CELL_SIZE, offset_y + min_r * CELL_SIZE))
+    for r_idx in range(GRID_SIZE):
+        for c_idx in range(GRID_SIZE):
+            cell_val = board_matrix[r_idx][c_idx]
+            cell_rect = pygame.Rect(offset_x + c_idx * CELL_SIZE, offset_y + r_idx * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+            if cell_val == 'H':
+                pygame.draw.line(surface, client.RED_HIT, (cell_rect.left + 5, cell_rect.top + 5), (cell_rect.right - 5, cell_rect.bottom - 5), 4)
+                pygame.draw.line(surface, client.RED_HIT, (cell_rect.left + 5, cell_rect.bottom - 5), (cell_rect.right - 5, cell_rect.top + 5), 4)
+            elif cell_val == 'M':
+                pygame.draw.circle(surface, client.YELLOW_MISS, cell_rect.center, CELL_SIZE // 4)
+            elif cell_val == 'S':
+                debug_fill_s = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
+                debug_fill_s.fill((0, 80, 0, 100))
+                surface.blit(debug_fill_s, cell_rect.topleft)
+                pygame.draw.line(surface, (255, 50, 50), (cell_rect.left + 5, cell_rect.top + 5), (cell_rect.right - 5, cell_rect.bottom - 5), 5)
+                pygame.draw.line(surface, (255, 50, 50), (cell_rect.left + 5, cell_rect.bottom - 5), (cell_rect.right - 5, cell_rect.top + 5), 5)
+
+def end_game_boards(rng):
+    """
+    Mi tablero con 4 de 5 barcos hundidos y el rival igual, con muchos disparos en ambos.
+    Los deja en una ClientSession nueva (client.session), con sus barcos colocados y hundidos.
+    """
+    client.session = session = ClientSession(2)
+    mine, theirs = session.my_board, session.opponent_board
+    layout = [(name, ship_coords(2 * i, 0, size, 'H')) for i, (name, size) in enumerate(SHIPS_CONFIG)]
+    for name, coords in layout:
+        mine.place_ship(name, coords)
+    cells = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+    for r, c in rng.sample(cells, 50):
+        mine[r][c] = 'H' if mine[r][c] == 1 else 'M'
+    for r, c in rng.sample(cells, 60):
+        theirs[r][c] = 'M'
+    for i, (name, coords) in enumerate(layout):
+        is_sunk = i < 4
+        if is_sunk:
+            for r, c in coords: mine[r][c] = 'H'
+            theirs.mark_sunk(coords)
+            session.opponent_sunk_ships.append({"name": name, "size": len(coords), "coords": coords, "orientation": 'H'})
+        session.my_ships.append({"name": name, "size": len(coords), "coords": coords, "orientation": 'H', "is_sunk": is_sunk})
+    return mine, theirs
+
+def time_frames(frames, draw):
+    start = time.perf_counter()
+    for _ in range(frames):
+        draw()
+    return (time.perf_counter() - start) / frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Dibujo de tableros: antiguo vs capas cacheadas")
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((client.SCREEN_WIDTH, client.SCREEN_HEIGHT))
+    client.build_board_sprites()
+    client.load_ship_images()
+    mine, theirs = end_game_boards(random.Random(1))
+    boards = ((client.BOARD_OFFSET_X_MY, mine, True), (client.BOARD_OFFSET_X_OPPONENT, theirs, False))
+
+    def draw_legacy():
+        for offset_x, board, is_mine in boards:
+            legacy_draw_game_grid(screen, offset_x, client.BOARD_OFFSET_Y, board, is_mine)
+
+    def draw_layers():
+        for offset_x, board, is_mine in boards:
+            client.draw_game_grid(screen, offset_x, client.BOARD_OFFSET_Y, board, is_mine)
+
+    screen.fill((0, 0, 0)); draw_legacy(); legacy_pixels = pygame.image.tobytes(screen, "RGB")
+    screen.fill((0, 0, 0)); draw_layers(); layer_pixels = pygame.image.tobytes(screen, "RGB")
+    print(f"misma imagen: {legacy_pixels == layer_pixels}")
+
+    legacy = time_frames(args.frames, draw_legacy)
+    layers = time_frames(args.frames, draw_layers)
+    print(f"antiguo   {legacy * 1000:8.3f} ms por cuadro")
+    print(f"actual    {layers * 1000:8.3f} ms por cuadro")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
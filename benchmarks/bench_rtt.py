@@ -0,0 +1,216 @@
+# benchmarks/bench_rtt.py
+# Ida y vuelta de un disparo con latencia de red artificial: los clientes hablan con el servidor a
+# través de un proxy en loopback que retrasa cada trozo --delay-ms en cada sentido. Por disparo mide,
+# desde que el tirador envía SHOT:
+#   - shot->update: hasta que el tirador recibe su UPDATE
+#   - shot->turno:  hasta que tiene también el mensaje de turno (YOUR_TURN_AGAIN / OPPONENT_TURN_MSG / TURN)
+# en 2J con el disparo reenviado al objetivo (relay, el objetivo contesta RESULT) y resuelto por el
+# servidor (server), y en 4J resuelto por el servidor. Con STATS reporta además las escrituras al
+# socket por mensaje recibido. Con --server-dir se mide otra copia del repositorio (p. ej. un
+# `git worktree` de una versión anterior) con los mismos clientes y el mismo proxy.
+#
+# Uso: python benchmarks/bench_rtt.py [--games 10] [--delay-ms 5] [--engine threads] [--server-dir DIR]
+import argparse
+import os
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+
+from bench_utils import (LOOPBACK, REPO_ROOT, WELCOME_PREFIXES, LineClient, percentile, query_server_stats,
+                         start_server_process, stop_server_process)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from board import GRID_SIZE, Fleet  # noqa: E402
+from protocol import serialize_board_layout  # noqa: E402
+from bench_shots import LAYOUT  # noqa: E402
+
+TURN_PREFIXES = ("YOUR_TURN_AGAIN", "OPPONENT_TURN_MSG", "TURN", "GAME_OVER")
+# Rival al que dispara cada jugador en 4J y capitanes que colocan la flota del equipo
+TARGET_4P = {"P1": "P3", "P2": "P3", "P3": "P1", "P4": "P1"}
+CAPTAINS_4P = ("P1", "P3")
+
+class DelayProxy:
+    """Proxy TCP en loopback que entrega cada trozo recibido `delay` segundos después, en cada sentido."""
+
+    def __init__(self, target_port, delay):
+        self.target_port = target_port
+        self.delay = delay
+        self.listener = socket.create_server((LOOPBACK, 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self.listener.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection((LOOPBACK, self.target_port))
+            for sock in (client, upstream):
+                # El proxy hace de red: no agrega esperas propias, solo el retraso fijo
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._pipe(client, upstream)
+            self._pipe(upstream, client)
+
+    def _pipe(self, src, dst):
+        chunks = queue.Queue()
+
+        def reader():
+            while True:
+                try:
+                    data = src.recv(65536)
+                except OSError:
+                    data = b""
+                chunks.put((time.monotonic() + self.delay, data))
+                if not data:
+                    return
+
+        def writer():
+            while True:
+                deliver_at, data = chunks.get()
+                wait = deliver_at - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    if not data:
+                        dst.shutdown(socket.SHUT_WR)
+                        return
+                    dst.sendall(data)
+                except OSError:
+                    return
+
+        threading.Thread(target=reader, daemon=True).start()
+        threading.Thread(target=writer, daemon=True).start()
+
+    def close(self):
+        self.listener.close()
+
+class Player(LineClient):
+    def __init__(self, port):
+        super().__init__(port, timeout=30.0)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Como client_session
+
+def play_game(port, scenario, seed, samples, lock):
+    rng = random.Random(seed)
+    mode = 4 if scenario == "4J server" else 2
+    relay = scenario == "2J relay"
+    players = {"P1": Player(port)}
+    players["P1"].send(f"CREATE_GAME {mode} rtt{seed}")
+    game_id = players["P1"].wait_for(WELCOME_PREFIXES).split()[2]
+    for i in range(2, mode + 1):
+        player = Player(port)
+        player.send(f"JOIN_GAME {game_id} {mode} rtt{seed}_{i}")
+        players[player.wait_for(WELCOME_PREFIXES).split()[1]] = player # El id depende del orden en que el servidor atiende cada JOIN
+    captains = CAPTAINS_4P if mode == 4 else ("P1", "P2")
+    payload = serialize_board_layout(LAYOUT)
+    if mode == 4:
+        for player_id in captains:
+            players[player_id].wait_for("REQUEST_TEAM_NAME")
+            players[player_id].send(f"TEAM_NAME_IS rtt{player_id}")
+    for player_id in captains:
+        players[player_id].wait_for("SETUP_YOUR_BOARD")
+        if not relay:
+            players[player_id].send(f"TEAM_BOARD_DATA {payload}")
+        players[player_id].send("READY_SETUP")
+    first_turn = [player.wait_for("START_GAME").split()[1] for player in players.values()][0]
+
+    # Cada flota recibe disparos a todas sus casillas en orden aleatorio; en relay el objetivo resuelve
+    # con su propia copia de la flota, como hace client.py
+    pending, fleets = {}, {}
+    for owner in captains:
+        cells = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+        rng.shuffle(cells)
+        pending[owner] = cells
+        fleets[owner] = Fleet.from_layout(LAYOUT)
+
+    to_update, to_turn = [], []
+    shooter_id = first_turn
+    while True:
+        target_id = TARGET_4P[shooter_id] if mode == 4 else ("P2" if shooter_id == "P1" else "P1")
+        shooter, target = players[shooter_id], players[target_id]
+        r, c = pending[target_id].pop()
+        t0 = time.perf_counter()
+        shooter.send(f"SHOT {target_id} {r} {c}" if mode == 4 else f"SHOT {r} {c}")
+        if relay:
+            target.wait_for("SHOT")
+            result, sunk_ship, destroyed = fleets[target_id].fire(r, c)
+            target.send(f"RESULT {r} {c} {result}")
+            if sunk_ship is not None:
+                coords = " ".join(f"{sr} {sc}" for sr, sc in sunk_ship.coords)
+                target.send(f"I_SUNK_MY_SHIP {sunk_ship.name} {coords}")
+        result = shooter.wait_for("UPDATE").split()[-1]
+        to_update.append(time.perf_counter() - t0)
+
+        if relay and destroyed:
+            shooter.wait_for("OPPONENT_SHIP_SUNK")
+            shooter.send("GAME_WON")
+        line = shooter.wait_for(TURN_PREFIXES)
+        if line.startswith("GAME_OVER"):
+            break
+        to_turn.append(time.perf_counter() - t0)
+        if mode == 4:
+            # UPDATE y TURN van a todos: los demás los consumen para no confundirlos con los del próximo disparo
+            for player_id, player in players.items():
+                if player_id != shooter_id:
+                    player.wait_for("TURN")
+            shooter_id = line.split()[1]
+        elif result == 'M':
+            shooter_id = target_id
+
+    with lock:
+        samples["update"].extend(to_update)
+        samples["turn"].extend(to_turn)
+    for player in players.values():
+        player.close()
+
+def run_scenario(port, scenario, args):
+    samples = {"update": [], "turn": []}
+    lock = threading.Lock()
+    proc = start_server_process(port, args.engine, server_dir=args.server_dir)
+    proxy = DelayProxy(port, args.delay_ms / 1000.0)
+    try:
+        threads = [threading.Thread(target=play_game, args=(proxy.port, scenario, seed, samples, lock))
+                   for seed in range(args.games)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        stats = query_server_stats(port)
+    finally:
+        proxy.close()
+        stop_server_process(proc)
+
+    update, turn = sorted(samples["update"]), sorted(samples["turn"])
+    writes = stats.get("writes") if stats else None
+    messages_in = sum(stats["messages_in"].values()) if stats else 0
+    return {
+        "shots": len(update),
+        "update_p50_ms": percentile(update, 50) * 1000,
+        "turn_p50_ms": percentile(turn, 50) * 1000,
+        "turn_p99_ms": percentile(turn, 99) * 1000,
+        "writes_per_msg": writes / messages_in if writes is not None and messages_in else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Ida y vuelta de un disparo con latencia de red artificial")
+    parser.add_argument("--games", type=int, default=10, help="partidas concurrentes por escenario")
+    parser.add_argument("--delay-ms", type=float, default=5.0, help="retraso del proxy en cada sentido")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--server-dir", default=REPO_ROOT, help="copia del repositorio cuyo server.py se mide")
+    parser.add_argument("--port", type=int, default=18700)
+    args = parser.parse_args()
+
+    scenarios = ("2J relay", "2J server", "4J server")
+    print(f"{args.games} partidas por escenario, motor {args.engine}, +{args.delay_ms:g} ms por sentido, "
+          f"servidor de {args.server_dir}")
+    print(f"{'escenario':10} {'disparos':>9} {'shot->update p50':>17} {'shot->turno p50':>16} "
+          f"{'shot->turno p99':>16} {'escrituras/msg':>15}")
+    for i, scenario in enumerate(scenarios):
+        result = run_scenario(args.port + i, scenario, args)
+        writes = "-" if result["writes_per_msg"] is None else f"{result['writes_per_msg']:.2f}"
+        print(f"{scenario:10} {result['shots']:>9} {result['update_p50_ms']:>14.2f} ms {result['turn_p50_ms']:>13.2f} ms "
+              f"{result['turn_p99_ms']:>13.2f} ms {writes:>15}")
+
+if __name__ == "__main__":
+    main()
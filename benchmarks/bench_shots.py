@@ -0,0 +1,152 @@
+# benchmarks/bench_shots.py
+# Partidas 2J completas, hasta el GAME_OVER, con las dos formas de resolver un disparo:
+#   relay   el servidor reenvía SHOT al objetivo, que contesta RESULT (+ I_SUNK_MY_SHIP), y el
+#           tirador anuncia GAME_WON cuando cree haber hundido todo (clientes sin TEAM_BOARD_DATA),
+#   server  cada jugador compromete su flota con TEAM_BOARD_DATA y el servidor resuelve el disparo
+#           sobre su máscara de bits, enviando UPDATE, hundimiento, turno y GAME_OVER de una vez.
+# Se mide la latencia SHOT -> UPDATE, la duración de cada partida y los bytes por partida.
+#
+# Uso: python benchmarks/bench_shots.py [--games 20] [--engine threads]
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from bench_utils import WELCOME_PREFIXES, LineClient, percentile, start_server_process, stop_server_process
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from board import GRID_SIZE, Fleet, ship_coords  # noqa: E402
+from protocol import serialize_board_layout  # noqa: E402
+
+# Misma flota para los dos jugadores: los barcos en filas pares, alternando orientación
+LAYOUT = [
+    ("Carrier", 'H', ship_coords(0, 0, 5, 'H')),
+    ("Battleship", 'V', ship_coords(2, 9, 4, 'V')),
+    ("Cruiser", 'H', ship_coords(4, 2, 3, 'H')),
+    ("Submarine", 'V', ship_coords(6, 0, 3, 'V')),
+    ("Destroyer", 'H', ship_coords(8, 5, 2, 'H')),
+]
+
+class CountingClient(LineClient):
+    """LineClient que cuenta los bytes enviados y recibidos."""
+
+    def __init__(self, port):
+        super().__init__(port)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def send(self, line):
+        self.bytes_sent += len(line) + 1
+        super().send(line)
+
+    def read_line(self):
+        line = super().read_line()
+        self.bytes_received += len(line.encode()) + 1
+        return line
+
+def play_game(port, mode, seed, results, lock):
+    rng = random.Random(seed)
+    p1 = CountingClient(port)
+    p1.send("CREATE_GAME 2 bench_a")
+    game_id = p1.wait_for(WELCOME_PREFIXES).split()[2]
+    p2 = CountingClient(port)
+    p2.send(f"JOIN_GAME {game_id} 2 bench_b")
+    payload = serialize_board_layout(LAYOUT)
+    for player in (p1, p2):
+        player.wait_for("SETUP_YOUR_BOARD")
+        if mode == "server":
+            player.send(f"TEAM_BOARD_DATA {payload}")
+        player.send("READY_SETUP")
+    for player in (p1, p2):
+        player.wait_for("START_GAME")
+
+    # Cada jugador dispara a todas las casillas en un orden aleatorio; en modo relay el objetivo
+    # resuelve con su propia copia de la flota, como hace client.py.
+    pending = {}
+    local_fleets = {}
+    for player in (p1, p2):
+        cells = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+        rng.shuffle(cells)
+        pending[player] = cells
+        local_fleets[player] = Fleet.from_layout(LAYOUT)
+
+    latencies = []
+    start = time.perf_counter()
+    shooter, target = p1, p2
+    while True:
+        r, c = pending[shooter].pop()
+        t0 = time.perf_counter()
+        shooter.send(f"SHOT {r} {c}")
+        if mode == "relay":
+            target.wait_for("SHOT")
+            result, sunk_ship, destroyed = local_fleets[target].fire(r, c)
+            target.send(f"RESULT {r} {c} {result}")
+            if sunk_ship is not None:
+                coords = " ".join(f"{sr} {sc}" for sr, sc in sunk_ship.coords)
+                target.send(f"I_SUNK_MY_SHIP {sunk_ship.name} {coords}")
+        result = shooter.wait_for("UPDATE").split()[3]
+        latencies.append(time.perf_counter() - t0)
+
+        if mode == "relay" and destroyed:
+            shooter.wait_for("OPPONENT_SHIP_SUNK")
+            shooter.send("GAME_WON")
+            line = shooter.wait_for("GAME_OVER")
+        else:
+            line = shooter.wait_for(("YOUR_TURN_AGAIN", "OPPONENT_TURN_MSG", "GAME_OVER"))
+        if line.startswith("GAME_OVER"):
+            target.wait_for("GAME_OVER")
+            break
+        if result == 'M':
+            shooter, target = target, shooter
+    duration = time.perf_counter() - start
+
+    with lock:
+        results["latencies"].extend(latencies)
+        results["durations"].append(duration)
+        results["bytes"].append(p1.bytes_sent + p1.bytes_received + p2.bytes_sent + p2.bytes_received)
+        results["shots"].append(len(latencies))
+    p1.close()
+    p2.close()
+
+def run_mode(port, mode, args):
+    results = {"latencies": [], "durations": [], "bytes": [], "shots": []}
+    lock = threading.Lock()
+    proc = start_server_process(port, args.engine)
+    try:
+        threads = [threading.Thread(target=play_game, args=(port, mode, seed, results, lock))
+                   for seed in range(args.games)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+    finally:
+        stop_server_process(proc)
+
+    latencies = sorted(results["latencies"])
+    durations = sorted(results["durations"])
+    games = len(durations) or 1
+    return {
+        "games": len(durations),
+        "shots_per_game": sum(results["shots"]) / games,
+        "shot_update_p50_ms": percentile(latencies, 50) * 1000,
+        "shot_update_p99_ms": percentile(latencies, 99) * 1000,
+        "game_p50_ms": percentile(durations, 50) * 1000,
+        "bytes_per_game": sum(results["bytes"]) / games,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Disparos reenviados al objetivo vs resueltos en el servidor")
+    parser.add_argument("--games", type=int, default=20, help="partidas 2J concurrentes")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--port", type=int, default=18500)
+    args = parser.parse_args()
+
+    modes = ("relay", "server")
+    results = {mode: run_mode(args.port + i, mode, args) for i, mode in enumerate(modes)}
+    print(f"{args.games} partidas 2J completas, motor {args.engine}")
+    print(f"{'métrica':22}" + "".join(f"{mode:>12}" for mode in modes))
+    for key in results["relay"]:
+        print(f"{key:22}" + "".join(f"{results[mode][key]:12.2f}" for mode in modes))
+
+if __name__ == "__main__":
+    main()
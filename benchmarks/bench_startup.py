@@ -0,0 +1,66 @@
+# benchmarks/bench_startup.py
+# Tiempo hasta que client.py es interactivo: desde que arranca el proceso hasta el primer cuadro
+# dibujado por el bucle principal del juego (primer display.flip), sin ventana ni audio reales
+# (SDL_VIDEODRIVER/SDL_AUDIODRIVER=dummy). Cada corrida es un proceso nuevo que lanza
+# game_main_loop(4, action="CREATE") (4J no pide nombre antes del bucle); el servidor no hace falta,
+# el cliente queda en la pantalla de conexión. También se reporta cuándo quedan listos los sonidos.
+#
+# Uso: python benchmarks/bench_startup.py [--runs 10] [--repo DIR]
+#      --repo permite medir otra copia del árbol (p. ej. un git worktree del commit anterior).
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+CHILD_CODE = r"""
+import os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+sys.argv = [sys.argv[0]]
+import pygame
+import client
+
+def sounds_ready():
+    # Los sonidos viven en app_context.app; en árboles anteriores, en globales de client
+    if hasattr(client, "app"): return "sunk" in client.app.sounds
+    return client.sunk_sound is not None
+
+def first_flip():
+    print(f"TTI {time.perf_counter() - t0:.6f}", flush=True)
+    deadline = time.perf_counter() + 5
+    while time.perf_counter() < deadline and not sounds_ready():
+        time.sleep(0.005)
+    print(f"SOUNDS {time.perf_counter() - t0:.6f}", flush=True)
+    os._exit(0)
+
+pygame.display.flip = first_flip
+pygame.display.update = lambda *a: first_flip()
+client.DEFAULT_SERVER_IP = "127.0.0.1"
+client.game_main_loop(4, action="CREATE")
+"""
+
+def run_once(repo):
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    out = subprocess.run([sys.executable, "-c", CHILD_CODE, repo], env=env, capture_output=True, text=True, timeout=30).stdout
+    # El hilo de conexión del cliente también imprime, así que las líneas pueden venir mezcladas
+    values = dict(re.findall(r"(TTI|SOUNDS) (\d+\.\d+)", out))
+    return float(values["TTI"]), float(values["SOUNDS"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo hasta el primer cuadro de client.py")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--repo", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args = parser.parse_args()
+
+    run_once(args.repo) # Calienta la caché de disco del SO (y genera la caché de sprites si falta)
+    samples = [run_once(args.repo) for _ in range(args.runs)]
+    tti = [s[0] * 1000 for s in samples]
+    sounds = [s[1] * 1000 for s in samples]
+    print(f"{args.runs} arranques de {args.repo}")
+    print(f"primer cuadro     p50 {statistics.median(tti):8.1f} ms   min {min(tti):8.1f} ms")
+    print(f"sonidos cargados  p50 {statistics.median(sounds):8.1f} ms   min {min(sounds):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
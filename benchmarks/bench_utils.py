@@ -0,0 +1,154 @@
+# benchmarks/bench_utils.py
+# Utilidades comunes de los benchmarks: arrancar el servidor en un subproceso sobre loopback,
+# leer sus estadísticas de /proc y hablar el protocolo de texto con sockets simples.
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from board import GRID_SIZE, SHIPS_CONFIG, ship_coords  # noqa: E402
+
+LOOPBACK = "127.0.0.1"
+# Primer mensaje tras CREATE_GAME / JOIN_GAME (id del jugador y de la partida en los campos 1 y 2).
+# PLAYER_ID es el de versiones anteriores del servidor, para poder medirlas con --server-dir / --repo.
+WELCOME_PREFIXES = ("WELCOME", "PLAYER_ID")
+
+def start_server_process(port, engine="threads", extra_args=(), server_dir=REPO_ROOT, output_path=None):
+    """
+    Lanza server.py en un subproceso escuchando en loopback y espera a que acepte conexiones.
+    server_dir permite medir otra copia del repositorio (p. ej. un `git worktree` de una versión anterior).
+    output_path: archivo donde se escribe la salida del servidor (por defecto se descarta).
+    """
+    cmd = [sys.executable, os.path.join(server_dir, "server.py"), "--engine", engine,
+           "--host", LOOPBACK, "--port", str(port), *extra_args]
+    output = open(output_path, "ab") if output_path else subprocess.DEVNULL
+    proc = subprocess.Popen(cmd, cwd=server_dir, stdout=output, stderr=subprocess.STDOUT)
+    if output_path:
+        output.close() # El hijo ya tiene su propia copia del descriptor
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((LOOPBACK, port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"El servidor ({engine}) no arrancó en el puerto {port}")
+
+def stop_server_process(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def read_proc_stats(pid):
+    """Hilos, memoria residente (KB) y tiempo de CPU (s) de un proceso. Solo Linux (/proc)."""
+    stats = {"threads": None, "rss_kb": None, "cpu_s": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    stats["threads"] = int(line.split()[1])
+                elif line.startswith("VmRSS:"):
+                    stats["rss_kb"] = int(line.split()[1])
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+            clock_ticks = os.sysconf("SC_CLK_TCK")
+            stats["cpu_s"] = (int(fields[11]) + int(fields[12])) / clock_ticks # utime + stime
+    except (OSError, ValueError, IndexError):
+        pass
+    return stats
+
+def child_pids(pid):
+    """Procesos hijos directos de pid (p. ej. los workers de server.py --workers N). Solo Linux (/proc)."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            pass
+    return children
+
+def read_server_stats(pid):
+    """read_proc_stats sumado sobre el proceso y sus hijos: con --workers N el trabajo está en los hijos."""
+    stats = read_proc_stats(pid)
+    for child in child_pids(pid):
+        child_stats = read_proc_stats(child)
+        for key, value in child_stats.items():
+            if stats[key] is not None and value is not None:
+                stats[key] += value
+    return stats
+
+def random_layout(rng):
+    """Flota válida al azar, como la que coloca un bot: [(nombre, orientación, coords)]."""
+    taken, layout = set(), []
+    for name, size in SHIPS_CONFIG:
+        while True:
+            orientation = rng.choice("HV")
+            coords = ship_coords(rng.randrange(GRID_SIZE), rng.randrange(GRID_SIZE), size, orientation)
+            if all(0 <= r < GRID_SIZE and 0 <= c < GRID_SIZE and (r, c) not in taken for r, c in coords):
+                taken.update(coords)
+                layout.append((name, orientation, coords))
+                break
+    return layout
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def query_server_stats(port, host=LOOPBACK):
+    """Métricas del servidor (comando STATS) como diccionario, o None si el servidor no lo admite."""
+    client = LineClient(port, host)
+    try:
+        client.send("STATS")
+        line = client.read_line()
+    except (OSError, ConnectionError):
+        return None
+    finally:
+        client.close()
+    if not line.startswith("STATS "):
+        return None
+    return json.loads(line[len("STATS "):])
+
+class LineClient:
+    """Cliente de texto mínimo: envía líneas y espera mensajes por prefijo, guardando el resto."""
+
+    def __init__(self, port, host=LOOPBACK, timeout=10.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.buffer = b""
+
+    def send(self, line):
+        self.sock.sendall(f"{line}\n".encode())
+
+    def read_line(self):
+        while b"\n" not in self.buffer:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("Conexión cerrada por el servidor")
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line.decode().strip()
+
+    def wait_for(self, prefix):
+        while True:
+            line = self.read_line()
+            if line.startswith(prefix):
+                return line
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
@@ -0,0 +1,154 @@
+# benchmarks/bench_wire.py
+# Formato de texto frente al binario (ver protocol.py): juega partidas completas en el mismo proceso
+# con la lógica real del servidor (register_player + process_game_command, el servidor resolviendo
+# los disparos) y colas de salida en memoria, una vez con todos los clientes en texto y otra con
+# todos en binario. Por formato y modo reporta:
+#   - bytes por partida del servidor a los clientes y de los clientes al servidor
+#   - tiempo de FrameDecoder.feed + parse_message por mensaje recibido, lo que hace cada cliente
+#     con lo que le llega (con el flujo partido en trozos aleatorios, como en bench_protocol.py)
+#
+# Uso: python benchmarks/bench_wire.py [--games 200] [--max-chunk 512]
+import argparse
+import os
+import random
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import outbound  # noqa: E402
+import server  # noqa: E402
+from bench_utils import random_layout  # noqa: E402
+from board import GRID_SIZE  # noqa: E402
+from protocol import BINARY_WIRE_FLAG, FrameDecoder, board_message, parse_message, shot_message  # noqa: E402
+
+# Rival al que dispara cada jugador en 4J (cualquier miembro del otro equipo sirve)
+TARGET_4P = {"P1": "P3", "P2": "P3", "P3": "P1", "P4": "P1"}
+
+class CaptureConn(outbound.OutboundQueue):
+    """Cola de salida en memoria: guarda lo que el cliente recibiría, envío por envío."""
+
+    def __init__(self):
+        super().__init__(label="bench", max_messages=1 << 20)
+        self.chunks = []
+
+    def _wake(self):
+        with self._lock:
+            batch = b"".join(self._take_items())
+        if batch:
+            self.chunks.append(batch)
+
+    def _abort(self):
+        pass
+
+    def close(self):
+        pass
+
+class WireGame:
+    """Una partida con todos sus clientes en el mismo formato; cuenta los bytes de cada sentido."""
+
+    def __init__(self, mode, binary, rng):
+        self.mode = mode
+        self.binary = binary
+        self.rng = rng
+        self.conns, self.readers = {}, {}
+        self.bytes_to_server = 0
+        flag = f" {BINARY_WIRE_FLAG}" if binary else ""
+        self.state, _, game_id = self._register(f"CREATE_GAME {mode} bench{flag}")
+        for _ in range(mode - 1):
+            self._register(f"JOIN_GAME {game_id} {mode} bench{flag}")
+
+    def _register(self, initial_msg):
+        conn = CaptureConn()
+        reader = types.SimpleNamespace(decoder=FrameDecoder()) # Lo único que usa start_binary_wire
+        registration = server.register_player(conn, "bench", initial_msg)
+        server.start_binary_wire(conn, reader, initial_msg)
+        player_id = registration[1]
+        self.conns[player_id], self.readers[player_id] = conn, reader
+        return registration
+
+    def send(self, player_id, message):
+        """Lo que envía el cliente y lo que hace el bucle del servidor con esos bytes."""
+        if isinstance(message, bytes) and getattr(message, "binary", None) and self.binary:
+            data = message.binary
+        else:
+            data = bytes(message)
+        self.bytes_to_server += len(data)
+        for frame in self.readers[player_id].decoder.feed(data):
+            server.process_game_command(self.state, player_id, self.conns[player_id], parse_message(frame))
+
+    def play(self):
+        captains = ("P1", "P2") if self.mode == 2 else ("P1", "P3")
+        for captain in captains:
+            if self.mode == 4:
+                server.ensure_default_team_name(self.state, captain)
+            self.send(captain, board_message("TEAM_BOARD_DATA", random_layout(self.rng)))
+        for captain in captains:
+            self.send(captain, b"READY_SETUP\n")
+        pending = {}
+        while self.state["game_active"]:
+            shooter = self.state["current_turn_player_id"]
+            cells = pending.get(server.get_fleet_owner(self.state, shooter))
+            if cells is None:
+                cells = pending[server.get_fleet_owner(self.state, shooter)] = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+                self.rng.shuffle(cells)
+            r, c = cells.pop()
+            self.send(shooter, shot_message(r, c) if self.mode == 2 else shot_message(r, c, TARGET_4P[shooter]))
+
+    def close(self):
+        for player_id in self.conns:
+            server.cleanup_player(self.state["game_id"], player_id)
+
+def chunk_stream(stream, max_chunk, rng):
+    chunks, pos = [], 0
+    while pos < len(stream):
+        size = rng.randint(1, max_chunk)
+        chunks.append(stream[pos:pos + size])
+        pos += size
+    return chunks
+
+def measure(mode, binary, games, max_chunk, seed):
+    rng = random.Random(seed)
+    streams, to_server = [], 0
+    for _ in range(games):
+        game = WireGame(mode, binary, rng)
+        game.play()
+        game.close()
+        to_server += game.bytes_to_server
+        streams.extend(b"".join(conn.chunks) for conn in game.conns.values())
+    to_clients = sum(len(stream) for stream in streams)
+
+    chunked = [chunk_stream(stream, max_chunk, rng) for stream in streams]
+    messages = 0
+    start = time.perf_counter()
+    for chunks in chunked:
+        decoder = FrameDecoder(allow_binary=binary)
+        for chunk in chunks:
+            for frame in decoder.feed(chunk):
+                parse_message(frame)
+                messages += 1
+    parse_s = time.perf_counter() - start
+    return to_clients / games, to_server / games, messages / games, 1e6 * parse_s / messages
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes por partida y tiempo de parseo: protocolo de texto frente al binario")
+    parser.add_argument("--games", type=int, default=200, help="partidas por formato y modo")
+    parser.add_argument("--max-chunk", type=int, default=512, help="tamaño máximo de cada trozo del flujo al parsear")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.games} partidas por formato y modo; parseo con trozos de 1..{args.max_chunk} bytes")
+    print(f"{'modo':>4} {'formato':>8} {'srv->cli B/partida':>19} {'cli->srv B/partida':>19} {'mensajes':>9} {'µs/mensaje':>11}")
+    for mode in (2, 4):
+        results = {}
+        for binary in (False, True):
+            results[binary] = measure(mode, binary, args.games, args.max_chunk, args.seed)
+            to_clients, to_server, messages, parse_us = results[binary]
+            print(f"{mode:>3}J {'binario' if binary else 'texto':>8} {to_clients:>19.0f} {to_server:>19.0f} "
+                  f"{messages:>9.0f} {parse_us:>11.2f}")
+        (text_out, text_in, _, text_us), (bin_out, bin_in, _, bin_us) = results[False], results[True]
+        print(f"{mode:>3}J binario/texto: srv->cli {bin_out / text_out:.0%}, cli->srv {bin_in / text_in:.0%}, "
+              f"parseo {bin_us / text_us:.0%}")
+
+if __name__ == "__main__":
+    main()
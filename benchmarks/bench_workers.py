@@ -0,0 +1,94 @@
+# benchmarks/bench_workers.py
+# Escalado de server.py --workers N: para cada N de --workers lanza el servidor y lo carga durante
+# --seconds con --concurrency partidas simultáneas de bots de bench_load.py, repartidas en
+# --client-procs procesos (los bots de un solo proceso no pasan de un núcleo por el GIL). Por N reporta:
+#   - partidas terminadas por segundo y aceleración respecto del primer N de la lista
+#   - latencia SHOT -> UPDATE (p50/p99) y de unión (p50/p99), como bench_load.py
+#   - CPU del servidor sumando todos sus procesos (% de un núcleo)
+# Para ver el escalado hace falta una máquina con núcleos para los N workers y además para los
+# clientes; con menos núcleos la cifra solo muestra lo que cuesta repartir (pasar conexiones y lobby).
+#
+# Uso: python benchmarks/bench_workers.py [--workers 1,2,4] [--concurrency 40] [--seconds 15]
+#      [--client-procs 4] [--four-player-fraction 0] [--engine threads] [--wire text]
+import argparse
+import multiprocessing
+import time
+
+from bench_load import LoadRun
+from bench_utils import percentile, read_server_stats, start_server_process, stop_server_process
+from sim_clients import WIRE_CHOICES
+
+def run_clients(port, concurrency, seconds, seed, four_player_fraction, wire, results):
+    """Proceso de clientes: concurrency partidas simultáneas durante seconds; deja lo medido en results."""
+    run = LoadRun(port, four_player_fraction, seed, wire)
+    run.set_stage(0, concurrency)
+    time.sleep(seconds)
+    run.stop()
+    results.put(run.stage_results[0])
+
+def measure(workers, args, port):
+    extra_args = ["--workers", str(workers)] if workers > 1 else []
+    proc = start_server_process(port, args.engine, extra_args)
+    context = multiprocessing.get_context("spawn") # Sin heredar hilos ni sockets de este proceso
+    results = context.Queue()
+    shares = [args.concurrency // args.client_procs + (i < args.concurrency % args.client_procs)
+              for i in range(args.client_procs)]
+    clients = [context.Process(target=run_clients, args=(port, share, args.seconds, args.seed + i,
+                                                         args.four_player_fraction, args.wire, results))
+               for i, share in enumerate(shares) if share]
+    try:
+        cpu_start, start = read_server_stats(proc.pid)["cpu_s"], time.perf_counter()
+        for client in clients: client.start()
+        totals = {"games": 0, "failed": 0, "latencies": [], "joins": []}
+        for _ in clients:
+            stage = results.get()
+            for key in totals:
+                totals[key] += stage[key]
+        cpu_end, end = read_server_stats(proc.pid)["cpu_s"], time.perf_counter()
+        for client in clients: client.join()
+    finally:
+        stop_server_process(proc)
+
+    latencies, joins = sorted(totals["latencies"]), sorted(totals["joins"])
+    return {
+        "games_per_s": totals["games"] / args.seconds,
+        "failed": totals["failed"],
+        "shot_p50_ms": percentile(latencies, 50) * 1000,
+        "shot_p99_ms": percentile(latencies, 99) * 1000,
+        "join_p50_ms": percentile(joins, 50) * 1000,
+        "join_p99_ms": percentile(joins, 99) * 1000,
+        "cpu_pct": 100.0 * (cpu_end - cpu_start) / (end - start) if cpu_start is not None and cpu_end is not None else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Partidas por segundo del servidor según su número de workers")
+    parser.add_argument("--workers", default="1,2,4", help="números de workers a medir, separados por coma")
+    parser.add_argument("--concurrency", type=int, default=40, help="partidas simultáneas en total")
+    parser.add_argument("--seconds", type=float, default=15.0, help="duración de cada medición")
+    parser.add_argument("--client-procs", type=int, default=4, help="procesos entre los que se reparten los bots")
+    parser.add_argument("--four-player-fraction", type=float, default=0.0, help="fracción de partidas 4J (0 a 1)")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--wire", choices=WIRE_CHOICES, default="text", help="formato del protocolo de los bots")
+    parser.add_argument("--port", type=int, default=18800)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    worker_counts = [int(n) for n in args.workers.split(",")]
+
+    print(f"{args.concurrency} partidas simultáneas en {args.client_procs} procesos de clientes, {args.seconds:g} s "
+          f"por medición, motor {args.engine}, {multiprocessing.cpu_count()} núcleos")
+    print(f"{'workers':>7} {'partidas/s':>10} {'aceleración':>11} {'fallidas':>8} {'disparo p50':>11} "
+          f"{'disparo p99':>11} {'unión p50':>10} {'unión p99':>10} {'CPU %':>6}")
+    baseline = None
+    failed = 0
+    for i, workers in enumerate(worker_counts):
+        result = measure(workers, args, args.port + i)
+        baseline = baseline or result["games_per_s"]
+        failed += result["failed"]
+        print(f"{workers:>7} {result['games_per_s']:>10.1f} {result['games_per_s'] / baseline:>10.2f}x "
+              f"{result['failed']:>8} {result['shot_p50_ms']:>8.2f} ms {result['shot_p99_ms']:>8.2f} ms "
+              f"{result['join_p50_ms']:>7.2f} ms {result['join_p99_ms']:>7.2f} ms {result['cpu_pct']:>6.0f}")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
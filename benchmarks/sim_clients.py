@@ -0,0 +1,116 @@
+# benchmarks/sim_clients.py
+# Muchos clientes simulados en un solo proceso y sin pygame: cada jugador es una ClientSession (la
+# misma lógica de protocolo que usa client.py) con un bot que coloca la flota al azar y dispara a
+# casillas aleatorias en su turno (los capitanes de 4J también eligen nombre de equipo). Juega partidas
+# completas contra el servidor y comprueba que en todas haya ganadores y perdedores. Sirve como prueba
+# de humo del protocolo del cliente en CI.
+#
+# Con --wire binary los bots piden el formato binario del protocolo; con --wire mixed, uno de cada dos.
+# Con --workers N el servidor corre en N procesos (ver shards.py): los JOIN_GAME que llegan a un worker
+# que no es el dueño de la partida prueban el paso de la conexión entre procesos.
+#
+# Uso: python benchmarks/sim_clients.py [--games 100] [--players 2] [--engine threads] [--wire text|binary|mixed]
+#      [--workers 1]
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from bench_utils import LOOPBACK, start_server_process, stop_server_process
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from board import GRID_SIZE  # noqa: E402
+from client_session import (  # noqa: E402
+    STATE_AWAITING_TEAM_NAME_INPUT, STATE_YOUR_TURN, ClientSession, connect_session, run_session,
+)
+
+TURN_COMMANDS = ("START_GAME", "YOUR_TURN_AGAIN", "TURN")
+WIRE_CHOICES = ("text", "binary", "mixed")
+
+def wants_binary_wire(wire, index):
+    """Si el jugador index de una partida pide el formato binario con la opción --wire dada."""
+    return wire == "binary" or (wire == "mixed" and index % 2 == 1)
+
+class BotSession(ClientSession):
+    """ClientSession que juega sola: coloca sus barcos al recibir SETUP_YOUR_BOARD y dispara en cada turno."""
+
+    def __init__(self, game_mode, player_name, seed, binary_wire=False):
+        super().__init__(game_mode, player_name, binary_wire=binary_wire)
+        self.rng = random.Random(seed)
+        self.targets = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+        self.rng.shuffle(self.targets)
+
+    def handle_frame(self, message):
+        parsed = super().handle_frame(message)
+        if self.state == STATE_AWAITING_TEAM_NAME_INPUT:
+            self.submit_team_name(f"equipo_{self.player_id}")
+        elif self.is_placing_ships():
+            self.place_fleet()
+        elif self.state == STATE_YOUR_TURN and parsed is not None and parsed.command in TURN_COMMANDS:
+            # En 4J el compañero también dispara: saltar las casillas que ya tienen resultado
+            while self.targets and not self.shoot(*self.targets.pop()):
+                pass
+        return parsed
+
+    def place_fleet(self):
+        while self.is_placing_ships():
+            if self.rng.random() < 0.5:
+                self.rotate_ship()
+            self.place_ship(self.rng.randrange(GRID_SIZE), self.rng.randrange(GRID_SIZE))
+
+def play_game(port, players, seed, results, lock, wire="text"):
+    host = BotSession(players, f"bot{seed}", seed * 10, wants_binary_wire(wire, 0))
+    sockets = [connect_session(host, LOOPBACK, port, "CREATE")]
+    threads = [threading.Thread(target=run_session, args=(host, sockets[0]))]
+    threads[0].start()
+    deadline = time.time() + 10
+    while host.game_id is None and time.time() < deadline:
+        time.sleep(0.005)
+    sessions = [host]
+    for i in range(1, players):
+        guest = BotSession(players, f"bot{seed}_{i}", seed * 10 + i, wants_binary_wire(wire, i))
+        sockets.append(connect_session(guest, LOOPBACK, port, "JOIN", host.game_id))
+        threads.append(threading.Thread(target=run_session, args=(guest, sockets[-1])))
+        threads[-1].start()
+        sessions.append(guest)
+    for t in threads: t.join()
+    for sock in sockets:
+        if sock is not None: sock.close()
+    with lock:
+        results.append([session.status_message for session in sessions])
+
+def main():
+    parser = argparse.ArgumentParser(description="Partidas 2J completas entre ClientSession simuladas, sin pygame")
+    parser.add_argument("--games", type=int, default=100, help="partidas concurrentes")
+    parser.add_argument("--players", type=int, choices=(2, 4), default=2, help="jugadores por partida")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--port", type=int, default=18600)
+    parser.add_argument("--wire", choices=WIRE_CHOICES, default="text", help="formato del protocolo de los bots")
+    parser.add_argument("--workers", type=int, default=1, help="procesos del servidor (server.py --workers)")
+    args = parser.parse_args()
+
+    proc = start_server_process(args.port, args.engine, ["--workers", str(args.workers)] if args.workers > 1 else ())
+    results, lock = [], threading.Lock()
+    try:
+        start = time.perf_counter()
+        threads = [threading.Thread(target=play_game, args=(args.port, args.players, seed, results, lock, args.wire)) for seed in range(args.games)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        stop_server_process(proc)
+
+    winners_per_game = args.players // 2
+    finished = sum(1 for statuses in results if sum(s.startswith("¡HAS GANADO") for s in statuses) == winners_per_game)
+    print(f"{args.games * args.players} clientes en un proceso (pygame cargado: {'pygame' in sys.modules}), motor {args.engine}, protocolo {args.wire}, "
+          f"{args.workers} worker(s)")
+    print(f"partidas {args.players}J con ganadores y perdedores: {finished}/{args.games} en {elapsed:.2f} s")
+    if finished != args.games:
+        for statuses in results:
+            print(statuses)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
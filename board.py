@@ -0,0 +1,200 @@
+# board.py
+# Tableros como máscaras de bits: la casilla (r, c) es el bit r * GRID_SIZE + c de un int de Python.
+# Fleet es la flota de un jugador (2J) o de un equipo (4J) tal como la comprometió su capitán en
+# TEAM_BOARD_DATA; el servidor resuelve cada SHOT sobre ella con unas pocas operaciones de bits,
+# sin preguntarle al cliente objetivo. BitBoard es el tablero equivalente del cliente.
+from collections import deque
+
+GRID_SIZE = 10
+SHIPS_CONFIG = [("Carrier", 5), ("Battleship", 4), ("Cruiser", 3), ("Submarine", 3), ("Destroyer", 2)]
+TOTAL_SHIP_CELLS = sum(size for _, size in SHIPS_CONFIG)
+
+class FleetError(ValueError):
+    """Disposición de barcos que no respeta las reglas (tamaños, límites, solapamientos)."""
+
+def cell_bit(r, c):
+    return 1 << (r * GRID_SIZE + c)
+
+def coords_mask(coords):
+    mask = 0
+    for r, c in coords:
+        mask |= cell_bit(r, c)
+    return mask
+
+def mask_coords(mask):
+    """Inverso de coords_mask: casillas de la máscara en orden de fila y columna."""
+    coords = []
+    while mask:
+        lowest = mask & -mask
+        coords.append(divmod(lowest.bit_length() - 1, GRID_SIZE))
+        mask ^= lowest
+    return coords
+
+def ship_coords(r, c, size, orientation):
+    """Casillas de un barco de `size` que empieza en (r, c) hacia la derecha ('H') o hacia abajo ('V')."""
+    if orientation == 'H':
+        return [(r, c + i) for i in range(size)]
+    return [(r + i, c) for i in range(size)]
+
+def in_bounds(r, c):
+    return 0 <= r < GRID_SIZE and 0 <= c < GRID_SIZE
+
+class FleetShip:
+    __slots__ = ("name", "orientation", "coords", "mask")
+
+    def __init__(self, name, orientation, coords):
+        self.name = name
+        self.orientation = orientation
+        self.coords = list(coords)
+        self.mask = coords_mask(coords)
+
+class Fleet:
+    """Flota comprometida al empezar la partida: barcos, impactos y fallos como máscaras."""
+
+    def __init__(self, ships):
+        self.ships = ships
+        self.ships_mask = 0
+        self._ship_at = {} # índice de casilla -> FleetShip, para encontrar el barco impactado en O(1)
+        for ship in ships:
+            self.ships_mask |= ship.mask
+            for r, c in ship.coords:
+                self._ship_at[r * GRID_SIZE + c] = ship
+        self.hits_mask = 0
+        self.misses_mask = 0
+
+    @classmethod
+    def from_layout(cls, layout, fleet_config=SHIPS_CONFIG):
+        """
+        layout: [(nombre, orientación, [(r, c), ...])] como lo entrega protocol.parse_board_layout.
+        Lanza FleetError si no es exactamente la flota de fleet_config, en línea recta, dentro del tablero y sin solaparse.
+        """
+        expected = dict(fleet_config)
+        if sorted(name for name, _, _ in layout) != sorted(expected):
+            raise FleetError(f"Flota incompleta o con barcos desconocidos: {[name for name, _, _ in layout]}")
+        ships, occupied = [], 0
+        for name, orientation, coords in layout:
+            if orientation not in ('H', 'V') or not coords:
+                raise FleetError(f"Orientación o casillas inválidas para {name}")
+            r0, c0 = coords[0]
+            if coords != ship_coords(r0, c0, expected[name], orientation):
+                raise FleetError(f"{name} no ocupa {expected[name]} casillas seguidas en {orientation}")
+            if not all(in_bounds(r, c) for r, c in coords):
+                raise FleetError(f"{name} se sale del tablero")
+            ship = FleetShip(name, orientation, coords)
+            if occupied & ship.mask:
+                raise FleetError(f"{name} se solapa con otro barco")
+            occupied |= ship.mask
+            ships.append(ship)
+        return cls(ships)
+
+    def was_shot(self, r, c):
+        return bool((self.hits_mask | self.misses_mask) & cell_bit(r, c))
+
+    def fire(self, r, c):
+        """
+        Resuelve un disparo a una casilla aún no disparada.
+        Retorna (resultado 'H'|'M', barco hundido por este disparo o None, flota destruida).
+        """
+        bit = cell_bit(r, c)
+        if not self.ships_mask & bit:
+            self.misses_mask |= bit
+            return 'M', None, False
+        self.hits_mask |= bit
+        ship = self._ship_at[r * GRID_SIZE + c]
+        sunk_ship = ship if self.hits_mask & ship.mask == ship.mask else None
+        return 'H', sunk_ship, self.hits_mask & self.ships_mask == self.ships_mask
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+class _BoardRow:
+    """Fila de un BitBoard: permite seguir usando board[r][c] para leer y asignar casillas."""
+    __slots__ = ("_board", "_r")
+
+    def __init__(self, board, r):
+        self._board = board
+        self._r = r
+
+    def __getitem__(self, c):
+        return self._board.cell(self._r, c)
+
+    def __setitem__(self, c, value):
+        self._board.set_cell(self._r, c, value)
+
+class BitBoard:
+    """
+    Tablero del cliente (el mío o el del rival) como máscaras: barcos, impactos, fallos, hundidos y
+    una por barco. Conserva la interfaz de la antigua lista de listas: board[r][c] devuelve 0, 1,
+    'H', 'M' o 'S' y acepta esos mismos valores, así el código de dibujo no cambia.
+    """
+
+    def __init__(self):
+        self.ships_mask = 0
+        self.hits_mask = 0
+        self.misses_mask = 0
+        self.sunk_mask = 0
+        self.ship_masks = {} # nombre -> máscara de sus casillas (solo en mi tablero)
+        # Casillas cambiadas desde la última vez que se dibujó; la escribe el hilo de red y la vacía
+        # el de dibujo (append/popleft de deque no necesitan lock)
+        self.changed_cells = deque()
+        self._rows = [_BoardRow(self, r) for r in range(GRID_SIZE)]
+
+    def __getitem__(self, r):
+        return self._rows[r]
+
+    def cell(self, r, c):
+        bit = cell_bit(r, c)
+        if self.sunk_mask & bit: return 'S'
+        if self.hits_mask & bit: return 'H'
+        if self.misses_mask & bit: return 'M'
+        if self.ships_mask & bit: return 1
+        return 0
+
+    def set_cell(self, r, c, value):
+        """Como asignar en la lista antigua, salvo que 'H'/'M'/'S' no borran el barco de la casilla."""
+        bit = cell_bit(r, c)
+        self.hits_mask &= ~bit
+        self.misses_mask &= ~bit
+        self.sunk_mask &= ~bit
+        if value == 0:
+            self.ships_mask &= ~bit
+        elif value == 1:
+            self.ships_mask |= bit
+        elif value == 'H':
+            self.hits_mask |= bit
+        elif value == 'M':
+            self.misses_mask |= bit
+        elif value == 'S':
+            self.sunk_mask |= bit
+        else:
+            raise ValueError(f"Valor de casilla desconocido: {value!r}")
+        self.changed_cells.append((r, c))
+
+    def can_place(self, coords):
+        return all(in_bounds(r, c) for r, c in coords) and not self.ships_mask & coords_mask(coords)
+
+    def place_ship(self, name, coords):
+        mask = coords_mask(coords)
+        self.ship_masks[name] = mask
+        self.ships_mask |= mask
+        self.changed_cells.extend(coords)
+
+    def mark_sunk(self, coords):
+        coords = [(r, c) for r, c in coords if in_bounds(r, c)]
+        self.sunk_mask |= coords_mask(coords)
+        self.changed_cells.extend(coords)
+
+    def take_changed_cells(self):
+        """Saca las casillas cambiadas pendientes (puede haber repetidas)."""
+        cells = []
+        while self.changed_cells:
+            cells.append(self.changed_cells.popleft())
+        return cells
+
+    def is_ship_sunk(self, name):
+        mask = self.ship_masks.get(name, 0)
+        return bool(mask) and self.hits_mask & mask == mask
+
+    def is_defeated(self, total_ship_cells=TOTAL_SHIP_CELLS):
+        """Tablero rival: todas las casillas de barco impactadas o hundidas."""
+        return popcount(self.hits_mask | self.sunk_mask) >= total_ship_cells
@@ -0,0 +1,464 @@
+# client_session.py
+# Estado de una partida del lado del cliente, sin pygame: la máquina de estados del protocolo, los
+# tableros, los barcos colocados y hundidos, los nombres y turnos. client.py es una vista sobre una
+# ClientSession (dibuja su estado y le pasa clics y teclas); sin ventana, muchas sesiones pueden
+# jugar en un mismo proceso para pruebas de carga (ver benchmarks/sim_clients.py).
+#
+# La sesión no conoce el transporte: escribe con send_line(línea o trama ya codificada) y recibe cada
+# línea (o trama binaria) del servidor en handle_frame(). connect_session() y run_session() la conectan
+# a un socket bloqueante. Con binary_wire=True pide el formato binario del protocolo (ver protocol.py) y,
+# si el servidor lo confirma, envía sus disparos, resultados y tablero en binario.
+# Avisa a la vista con on_event(evento): "hit", "miss" y "sunk" (sonidos) y "changed" tras cada mensaje.
+import socket
+
+import logs
+from board import GRID_SIZE, SHIPS_CONFIG, TOTAL_SHIP_CELLS, BitBoard, ship_coords
+from protocol import (BINARY_WIRE_FLAG, ProtocolError, SocketFrameReader, WireMessage, board_message, parse_message,
+                      result_message, shot_message, sunk_message)
+
+log = logs.get_logger("client")
+
+# Estados del juego
+STATE_CONNECTING = "CONNECTING"  # Estado inicial al conectar
+STATE_WAITING_FOR_PLAYER = "WAITING_FOR_PLAYER"  # Usado mientras se llena la partida
+STATE_AWAITING_TEAM_NAME_INPUT = "AWAITING_TEAM_NAME_INPUT" # Modo 4J, capitán: la vista pide el nombre del equipo
+STATE_WAITING_FOR_TEAM_INFO = "WAITING_FOR_TEAM_INFO" # Esperando TEAMS_INFO_FINAL
+STATE_SETUP_SHIPS = "SETUP_SHIPS"
+STATE_WAITING_OPPONENT_SETUP = "WAITING_OPPONENT_SETUP"
+STATE_YOUR_TURN = "YOUR_TURN"
+STATE_OPPONENT_TURN = "OPPONENT_TURN"
+STATE_GAME_OVER = "GAME_OVER"
+
+class ClientSession:
+    """
+    Una partida vista por un jugador. Los atributos públicos son el estado que dibuja la vista:
+    state, status_message, my_board / opponent_board (BitBoard), my_ships (dicts con name, size,
+    coords, orientation, is_sunk), opponent_sunk_ships, nombres de jugador/equipos y turno de colocación.
+    """
+
+    def __init__(self, game_mode, player_name="", send_line=None, on_event=None, binary_wire=False):
+        self.game_mode = game_mode
+        self.player_name = player_name # Solo en 2J
+        self.send_line = send_line # Callable(línea sin '\n' o bytes ya codificados); lo asigna connect_session()
+        self.on_event = on_event
+        self.request_binary_wire = binary_wire
+        self.binary_wire = False # True tras WIRE BIN: el servidor acepta y envía tramas binarias
+
+        self.state = STATE_CONNECTING
+        self.status_message = "Conectando al servidor..."
+        self.player_id = None
+        self.game_id = None
+
+        # Tableros como máscaras de bits (board.BitBoard); se siguen leyendo como board[r][c]
+        self.my_board = BitBoard()
+        self.opponent_board = BitBoard()
+        self.ships_to_place = list(SHIPS_CONFIG)
+        self.ship_placement_index = 0
+        self.ship_orientation = 'H'
+        self.my_ships = []
+        self.opponent_sunk_ships = []
+
+        self.team_id = None # Modo 4J: TeamA / TeamB, según WELCOME
+        self.my_team_name = None # Modo 4J
+        self.opponent_name = None # Nombre del oponente en 2J, del equipo oponente en 4J
+        self.opponents = [] # Modo 4J: [{"id": "P3", "name": "TeamB_name"}, {"id": "P4", "name": "TeamB_name"}]
+        self.is_captain = False # True si es P1 o P3 en modo 4J
+        self.is_team_board_slave = False # True si es P2 o P4 en modo 4J (recibe tablero del capitán)
+        self.server_resolves_shots = False # True tras SERVER_RESOLVES_SHOTS: el servidor resuelve disparos, hundimientos y victoria
+
+    # --- Envío ---
+
+    def _emit(self, event):
+        if self.on_event:
+            self.on_event(event)
+
+    def finish(self, status_message):
+        """Pasa a GAME_OVER con ese mensaje, salvo que la partida ya hubiera terminado."""
+        if self.state != STATE_GAME_OVER:
+            self.status_message = status_message
+            self.state = STATE_GAME_OVER
+
+    def send(self, message):
+        if self.send_line is None:
+            return
+        if isinstance(message, WireMessage):
+            message = message.binary if self.binary_wire and message.binary else bytes(message)
+        try:
+            self.send_line(message)
+        except OSError as e:
+            log.error("[%s] Error enviando mensaje: %s", self.player_id, e)
+            self.finish("Error de red al enviar.")
+        except Exception as e:
+            log.exception("[%s] Excepción general al enviar mensaje: %s", self.player_id, e)
+            self.finish("Error desconocido al enviar.")
+
+    def start(self, action, game_id=None):
+        """Envía CREATE_GAME o JOIN_GAME (ya conectado). Retorna False si la acción no es válida."""
+        if action == "CREATE":
+            first_message = f"CREATE_GAME {self.game_mode}"
+        elif action == "JOIN" and game_id is not None:
+            first_message = f"JOIN_GAME {game_id} {self.game_mode}" # Cliente envía el modo de la partida a la que se une
+        else:
+            self.finish("Error: Acción de conexión no especificada o ID de partida faltante.")
+            return False
+        if self.game_mode == 2 and self.player_name:
+            first_message += f" {self.player_name.replace(' ', '_')}"
+        if self.request_binary_wire:
+            first_message += f" {BINARY_WIRE_FLAG}"
+        self.send(first_message)
+        log.debug("Enviado al servidor: %s", first_message)
+        if self.state != STATE_GAME_OVER:
+            self.status_message = "Conectado. Esperando asignación..."
+        return True
+
+    # --- Acciones de la vista ---
+
+    def current_ship(self):
+        """(nombre, tamaño) del barco a colocar, o None si ya se colocaron todos."""
+        if self.ship_placement_index < len(self.ships_to_place):
+            return self.ships_to_place[self.ship_placement_index]
+        return None
+
+    def can_place_ship_at(self, r, c, ship_size=None, orientation=None):
+        """(se puede, coordenadas) del barco actual (o del tamaño/orientación dados) con su proa en (r, c)."""
+        if ship_size is None:
+            ship_size = self.current_ship()[1]
+        coords = ship_coords(r, c, ship_size, orientation or self.ship_orientation)
+        if not self.my_board.can_place(coords): return False, [] # Fuera del tablero o casilla ocupada (una sola AND de máscaras)
+        return True, coords
+
+    def is_placing_ships(self):
+        return self.state == STATE_SETUP_SHIPS and not self.is_team_board_slave and self.current_ship() is not None
+
+    def rotate_ship(self):
+        self.ship_orientation = 'V' if self.ship_orientation == 'H' else 'H'
+        ship = self.current_ship()
+        orientation_text = "Horizontal" if self.ship_orientation == 'H' else "Vertical"
+        self.status_message = f"Coloca: {ship[0] if ship else ''}. Orient: {orientation_text}. 'R' para rotar."
+
+    def place_ship(self, r, c):
+        """Coloca el barco actual con su proa en (r, c). Al colocar el último compromete la flota y envía READY_SETUP."""
+        ship_name, ship_size = self.current_ship()
+        can_place, coords = self.can_place_ship_at(r, c, ship_size)
+        if not can_place:
+            return False
+        self.my_board.place_ship(ship_name, coords)
+        self.my_ships.append({
+            "name": ship_name, "size": ship_size, "coords": list(coords),
+            "orientation": self.ship_orientation, "is_sunk": False,
+        })
+        self.ship_placement_index += 1
+        if self.current_ship() is None:
+            # Comprometer la flota con el servidor: cada jugador en 2J, el capitán (P1/P3) en 4J.
+            # El servidor la usa para resolver los disparos y, en 4J, la reenvía al compañero.
+            if self.game_mode == 2 or self.is_captain:
+                self.send(board_message("TEAM_BOARD_DATA", [(ship["name"], ship["orientation"], ship["coords"]) for ship in self.my_ships]))
+                log.debug("[%s] Enviado TEAM_BOARD_DATA.", self.player_id)
+            self.send("READY_SETUP")
+            self.state = STATE_WAITING_OPPONENT_SETUP
+            self.status_message = "Barcos colocados. Esperando al oponente..."
+        else:
+            self.status_message = f"Coloca: {self.current_ship()[0]}. 'R' para rotar."
+        return True
+
+    def shoot(self, r, c):
+        """Dispara a (r, c) del tablero enemigo si es mi turno y la casilla no fue disparada."""
+        if self.state != STATE_YOUR_TURN:
+            return False
+        if self.opponent_board[r][c] != 0: # Solo disparar a celdas no tocadas
+            self.status_message = "Ya disparaste en esa celda."
+            return False
+        if self.game_mode == 2:
+            self.send(shot_message(r, c))
+        elif self.game_mode == 4:
+            if self.opponents and self.opponents[0].get('id'):
+                # Disparar al primer oponente del equipo contrario por defecto
+                target_id = self.opponents[0]['id']
+                self.send(shot_message(r, c, target_id))
+                log.debug("[%s] SHOT enviado a %s en (%s,%s)", self.player_id, target_id, r, c)
+            else:
+                log.warning("[%s] No opponents_info para SHOT", self.player_id)
+        self.status_message = "Disparo enviado. Esperando resultado..."
+        return True
+
+    def submit_team_name(self, team_name):
+        """Respuesta del capitán a REQUEST_TEAM_NAME (cadena vacía si canceló)."""
+        if team_name:
+            self.send(f"TEAM_NAME_IS {team_name}")
+            self.status_message = f"Nombre de equipo '{team_name}' enviado. Esperando..."
+        else:
+            self.status_message = "Ingreso de nombre cancelado. Esperando acción del servidor..."
+        self.state = STATE_WAITING_FOR_TEAM_INFO
+
+    # --- Mensajes del servidor ---
+
+    def handle_frame(self, message):
+        """Procesa una línea (o trama binaria) recibida del servidor. Retorna el mensaje parseado, o None si era inválido."""
+        log.debug("[%s] Servidor dice: %r", self.player_id, message)
+        try:
+            parsed = parse_message(message)
+        except ProtocolError as e_proto:
+            log.warning("[%s] Error de protocolo: %s", self.player_id, e_proto)
+            return None
+        handler = getattr(self, f"_on_{parsed.command.lower()}", None)
+        if handler is not None:
+            handler(parsed)
+        self._emit("changed") # Cualquier mensaje procesado puede haber cambiado tableros o textos
+        return parsed
+
+    def _on_wire(self, parsed): # Confirmación del formato binario pedido en start()
+        self.binary_wire = self.request_binary_wire and parsed.args[:1] == ["BIN"]
+
+    def _on_msg(self, parsed):
+        self.status_message = ' '.join(parsed.parts[1:])
+
+    def _on_player_id(self, parsed): # Servidores anteriores a WELCOME
+        self.player_id = parsed.player_id
+        if parsed.game_id is not None: # Servidor envía game_id
+            self.game_id = parsed.game_id
+        self.status_message = f"ID asignado: {self.player_id}. Esperando..."
+        if self.game_mode == 4:
+            self.is_captain = self.player_id in ("P1", "P3")
+            self.is_team_board_slave = self.player_id in ("P2", "P4")
+
+    def _on_welcome(self, parsed): # Reemplaza a los PLAYER_ID de servidores anteriores
+        self.player_id = parsed.player_id
+        self.game_id = parsed.game_id
+        self.team_id = parsed.team_id
+        self.status_message = (f"ID asignado: {self.player_id}. Jugadores en la partida: "
+                               f"{parsed.connected_players}/{parsed.max_players}. Esperando...")
+        if self.game_mode == 4:
+            self.is_captain = self.player_id in ("P1", "P3")
+            self.is_team_board_slave = self.player_id in ("P2", "P4")
+
+    def _on_opponent_name(self, parsed): # Modo 2J
+        if self.game_mode == 2:
+            self.opponent_name = ' '.join(parsed.parts[1:])
+            self.status_message = f"Oponente: {self.opponent_name}. Esperando configuración..."
+
+    def _on_request_team_name(self, parsed): # Modo 4J, para capitanes
+        if self.game_mode == 4 and self.is_captain:
+            self.state = STATE_AWAITING_TEAM_NAME_INPUT
+            self.status_message = "Servidor solicita nombre de equipo. Ingresa en ventana."
+
+    def _on_teams_info_final(self, parsed): # Modo 4J
+        if self.game_mode == 4:
+            self.my_team_name = parsed.my_team_name
+            self.opponent_name = parsed.opponent_team_name
+            self.opponents = [{"id": opp_id, "name": self.opponent_name} for opp_id in parsed.opponent_ids]
+            self.status_message = f"Tu equipo: {self.my_team_name}. Oponente: {self.opponent_name}."
+            self.state = STATE_WAITING_FOR_PLAYER
+            log.debug("[%s] Nombres de equipo recibidos. Mío: '%s', Oponente: '%s'. Oponentes: %s",
+                      self.player_id, self.my_team_name, self.opponent_name, self.opponents)
+
+    def _on_setup_your_board(self, parsed):
+        self.server_resolves_shots = False
+        if not self.is_team_board_slave: # P2/P4 en 4J reciben el tablero del capitán
+            self.state = STATE_SETUP_SHIPS
+            self.ship_placement_index = 0
+            self.my_ships = []
+            self.my_board = BitBoard()
+            self.status_message = f"{self.player_id}: Coloca tus barcos. 'R' para rotar."
+        else:
+            self.status_message = "Esperando tablero del capitán de tu equipo..."
+
+    def _on_team_board(self, parsed): # Solo para P2/P4 en modo 4J
+        if not (self.game_mode == 4 and self.is_team_board_slave):
+            return
+        log.debug("[%s] Procesando TEAM_BOARD: %.100s", self.player_id, parsed.raw)
+        self.my_board = BitBoard()
+        self.my_ships = []
+        if not parsed.ships:
+            log.warning("[%s] TEAM_BOARD recibido con payload vacío.", self.player_id)
+        for name, orient, coords in parsed.ships:
+            if not coords or not all(0 <= r < GRID_SIZE and 0 <= c < GRID_SIZE for r, c in coords):
+                log.error("[%s] TEAM_BOARD con coordenadas inválidas para '%s'", self.player_id, name)
+                continue
+            self.my_board.place_ship(name, coords)
+            self.my_ships.append({
+                "name": name, "size": len(coords), "coords": list(coords),
+                "orientation": orient, "is_sunk": False,
+            })
+        self.state = STATE_WAITING_OPPONENT_SETUP
+        self.status_message = "Tablero de equipo recibido. Esperando al oponente..."
+
+    def _on_server_resolves_shots(self, parsed): # Llega justo antes de START_GAME
+        self.server_resolves_shots = True
+
+    def _on_start_game(self, parsed):
+        self._set_turn(parsed.player_id, f"Turno del oponente ({parsed.player_id}). Esperando...")
+
+    def _set_turn(self, turn_player_id, waiting_message):
+        if turn_player_id == self.player_id:
+            self.state = STATE_YOUR_TURN
+            self.status_message = "¡Tu turno! Dispara en el tablero enemigo."
+        else:
+            self.state = STATE_OPPONENT_TURN
+            self.status_message = waiting_message
+
+    def _on_shot(self, parsed): # Disparo recibido en mi tablero (el servidor espera mi RESULT)
+        r, c = parsed.row, parsed.col
+        result = 'M'
+        if self.my_board[r][c] == 1: # Es un barco no impactado
+            self.my_board[r][c] = 'H'
+            result = 'H'
+            self._emit("hit")
+            self._check_my_sunk_ships()
+        elif self.my_board[r][c] == 0: # Agua
+            self.my_board[r][c] = 'M'
+            self._emit("miss")
+        self.send(result_message("RESULT", r, c, result))
+
+    def _on_incoming_shot(self, parsed): # Disparo a mi tablero, ya resuelto por el servidor (modo 2J)
+        r, c = parsed.row, parsed.col
+        if parsed.result == 'H':
+            self.my_board[r][c] = 'H'
+            self._emit("hit")
+            self._check_my_sunk_ships()
+        else:
+            self.my_board[r][c] = 'M'
+            self._emit("miss")
+
+    def _on_update(self, parsed): # Resultado de un disparo
+        r, c, result = parsed.row, parsed.col, parsed.result
+        target_id = parsed.target_id # Solo en 4J: a quién se le actualiza el tablero
+        # En 2J el UPDATE siempre es del tablero rival; en 4J puede ser del tablero de mi equipo
+        if self.game_mode == 2 or any(opp['id'] == target_id for opp in self.opponents):
+            target_suffix = f" del oponente {target_id}" if self.game_mode == 4 else ""
+            if result == 'H':
+                if self.opponent_board[r][c] != 'S': self.opponent_board[r][c] = 'H'
+                self._emit("hit")
+                self.status_message = f"¡Impacto en ({r},{c}){target_suffix}!"
+            elif result == 'M':
+                if self.opponent_board[r][c] != 'S': self.opponent_board[r][c] = 'M'
+                self._emit("miss")
+                self.status_message = f"Agua en ({r},{c}){target_suffix}."
+            self._check_local_victory()
+        else: # Disparo al tablero de mi equipo
+            # Con el servidor resolviendo, el objetivo ya no recibe SHOT: el sonido va aquí
+            play_sound = self.server_resolves_shots and target_id == self.player_id
+            if self.my_board[r][c] == 1 and result == 'H':
+                self.my_board[r][c] = 'H'
+                if play_sound: self._emit("hit")
+                self._check_my_sunk_ships()
+            elif self.my_board[r][c] == 0 and result == 'M':
+                self.my_board[r][c] = 'M'
+                if play_sound: self._emit("miss")
+
+    def _on_opponent_ship_sunk(self, parsed):
+        ship_name = parsed.ship_name
+        coords = parsed.coords
+        if not coords: return
+        if self.game_mode == 4:
+            self.status_message = f"¡Hundiste el {ship_name} de {parsed.target_id}!"
+        else:
+            self.status_message = f"¡Hundiste el {ship_name} del oponente!"
+        self._emit("sunk")
+        ship_size = dict(SHIPS_CONFIG).get(ship_name, 0)
+        if ship_size == 0: log.warning("Tamaño desconocido para %s", ship_name)
+
+        orientation = None
+        if ship_size == 1: orientation = 'H'
+        elif len(coords) > 1:
+            r_same = all(c[0] == coords[0][0] for c in coords)
+            c_same = all(c[1] == coords[0][1] for c in coords)
+            if r_same and not c_same: orientation = 'H'
+            elif not r_same and c_same: orientation = 'V'
+
+        self.opponent_sunk_ships.append({"name": ship_name, "size": ship_size, "coords": coords, "orientation": orientation})
+        self.opponent_board.mark_sunk(coords)
+        self._check_local_victory()
+
+    def _on_your_turn_again(self, parsed): # Modo 2J
+        if self.game_mode == 2:
+            self.state = STATE_YOUR_TURN
+            if not self.status_message.startswith("¡Impacto") and not self.status_message.startswith("Agua"):
+                self.status_message = "¡Tu turno! Dispara."
+            else: self.status_message += " ¡Sigue tu turno!"
+
+    def _on_opponent_turn_msg(self, parsed): # Modo 2J
+        if self.game_mode == 2:
+            self.state = STATE_OPPONENT_TURN
+            self.status_message = "Turno del oponente. Esperando..."
+
+    def _on_turn(self, parsed): # Modo 4J
+        if self.game_mode == 4:
+            self._set_turn(parsed.player_id, f"Turno del jugador {parsed.player_id}. Esperando...")
+
+    def _on_game_over(self, parsed):
+        self.state = STATE_GAME_OVER
+        if parsed.won: self.status_message = "¡HAS GANADO LA PARTIDA! :D"
+        else: self.status_message = "Has perdido. Mejor suerte la proxima. :("
+
+    def _on_opponent_left(self, parsed): # Un jugador del equipo oponente se fue (Modo 2J)
+        if self.game_mode == 2:
+            self.finish("El oponente se ha desconectado. ¡Ganas por defecto!")
+
+    def _on_opponent_team_left(self, parsed): # Un jugador del equipo oponente se fue (Modo 4J)
+        if self.game_mode == 4 and self.state != STATE_GAME_OVER:
+            self.status_message = " ".join(parsed.parts[1:]) # El mensaje del servidor ya indica quién ganó/perdió
+
+    # --- Comprobaciones locales ---
+
+    def _check_my_sunk_ships(self):
+        for ship in self.my_ships:
+            if not ship["is_sunk"] and self.my_board.is_ship_sunk(ship["name"]): # Máscara del barco contenida en los impactos
+                ship["is_sunk"] = True
+                log.debug("[%s] ¡Mi %s ha sido hundido!", self.player_id, ship["name"])
+                if not self.server_resolves_shots: # Si no, el servidor ya avisó al tirador
+                    self.send(sunk_message("I_SUNK_MY_SHIP", ship["name"], ship["coords"]))
+                self._emit("sunk")
+
+    def _check_local_victory(self):
+        """Sin servidor autoritativo, el tirador anuncia GAME_WON cuando ve hundida toda la flota rival."""
+        if not self.server_resolves_shots and self.state != STATE_GAME_OVER and self.opponent_board.is_defeated(TOTAL_SHIP_CELLS):
+            log.debug("[%s] ¡Victoria local detectada! Celdas H/S oponente: %s/%s", self.player_id, TOTAL_SHIP_CELLS, TOTAL_SHIP_CELLS)
+            self.send("GAME_WON")
+
+def socket_sender(sock):
+    """send_line para una ClientSession sobre un socket bloqueante."""
+    def send_line(line):
+        sock.sendall(line if isinstance(line, bytes) else f"{line}\n".encode())
+    return send_line
+
+def connect_session(session, host, port, action, game_id=None):
+    """
+    Conecta la sesión al servidor y envía CREATE_GAME / JOIN_GAME. Retorna el socket, o None si no
+    se pudo conectar (la sesión queda en GAME_OVER con el motivo).
+    """
+    try:
+        sock = socket.create_connection((host, port))
+    except ConnectionRefusedError:
+        session.finish("Error: Conexion rechazada por el servidor.")
+        return None
+    except Exception as e:
+        session.finish(f"Error de conexion: {e}")
+        return None
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Cada línea sale al momento, sin esperar ACKs (Nagle)
+    session.send_line = socket_sender(sock)
+    session.start(action, game_id)
+    return sock
+
+def run_session(session, sock):
+    """Entrega a la sesión cada mensaje del socket hasta GAME_OVER o la desconexión. Bloqueante: usar en un hilo."""
+    # El lector arma los mensajes completos aunque lleguen partidos o varios en un mismo recv
+    frame_reader = SocketFrameReader(sock, allow_binary=session.request_binary_wire)
+    message = ""
+    while session.state != STATE_GAME_OVER:
+        try:
+            message = frame_reader.read_frame()
+            if message is None:
+                session.finish("Desconectado del servidor (recv vacío).")
+                break
+            session.handle_frame(message)
+        except ConnectionResetError:
+            session.finish("Conexion perdida con el servidor (reset).")
+            break
+        except socket.error as e:
+            session.finish(f"Error de socket: {e}")
+            break
+        except Exception as e:
+            log.exception("Error escuchando al servidor: %s (Mensaje: %r)", e, message)
+            session.finish(f"Error de red general: {e}")
+            break
+    session._emit("changed")
@@ -0,0 +1,77 @@
+# lobby.py
+# Índice del lobby: las partidas a las que todavía se puede unir alguien, mantenido de forma
+# incremental por el servidor (crear, unirse, salir, nombre de equipo, inicio y fin de partida) en
+# lugar de recorrer active_games con todos sus locks en cada LIST_GAMES. Guarda la respuesta
+# GAMES_LIST ya serializada y un número de versión que sube con cada cambio, para que el menú
+# pueda preguntar "¿cambió algo desde la versión N?" y recibir una respuesta de pocos bytes.
+# Los suscriptores (SUBSCRIBE_GAMES) reciben la lista una vez y después solo los cambios:
+#   GAME_ADDED <versión> <entrada> | GAME_UPDATED <versión> <entrada> | GAME_REMOVED <versión> <id>
+import threading
+
+class LobbyIndex:
+    """Partidas visibles en el lobby, en orden de creación, con su GAMES_LIST precalculado."""
+
+    def __init__(self):
+        self._lock = threading.Lock() # Lock hoja: no se toma ningún otro lock con este tomado
+        self._entries = {} # game_id -> entrada serializada "nombre|id|conectados|max"
+        self.version = 1 # 0 queda libre para "el cliente no tiene ninguna lista"
+        self._messages = None # (GAMES_LIST, GAMES_LIST_V) de la versión actual; se arma al pedirlo
+        self._subscribers = [] # Funciones send(bytes) que no bloquean (colas de salida)
+
+    def set_entry(self, game_id, entry):
+        """Publica (o quita, si entry es None) la entrada de una partida. Retorna True si el lobby cambió."""
+        with self._lock:
+            previous = self._entries.get(game_id)
+            if previous == entry:
+                return False
+            self.version += 1
+            if entry is None:
+                del self._entries[game_id]
+                delta = f"GAME_REMOVED {self.version} {game_id}\n"
+            else:
+                self._entries[game_id] = entry
+                delta = f"{'GAME_UPDATED' if previous else 'GAME_ADDED'} {self.version} {entry}\n"
+            self._messages = None
+            if self._subscribers:
+                # Se envía con el lock tomado para que todos los suscriptores vean los cambios en orden;
+                # send() solo encola. Un suscriptor que falla (cola llena o cerrada) deja de estarlo.
+                delta_bytes = delta.encode()
+                for send in list(self._subscribers):
+                    try:
+                        send(delta_bytes)
+                    except Exception:
+                        self._subscribers.remove(send)
+            return True
+
+    def remove_entry(self, game_id):
+        return self.set_entry(game_id, None)
+
+    def list_message(self, known_version=None):
+        """
+        Respuesta a LIST_GAMES. Sin versión: GAMES_LIST como siempre (menús antiguos).
+        Con versión: GAMES_LIST_UNCHANGED si el cliente ya tiene la actual, si no GAMES_LIST_V con la lista.
+        """
+        with self._lock:
+            return self._list_message_locked(known_version)
+
+    def _list_message_locked(self, known_version):
+        if known_version == self.version:
+            return f"GAMES_LIST_UNCHANGED {self.version}\n".encode()
+        if self._messages is None:
+            payload = ";".join(self._entries.values())
+            self._messages = (f"GAMES_LIST {payload}\n".encode(), f"GAMES_LIST_V {self.version} {payload}\n".encode())
+        return self._messages[0] if known_version is None else self._messages[1]
+
+    def subscribe(self, send, known_version=None):
+        """
+        Envía la lista actual (o GAMES_LIST_UNCHANGED si el suscriptor ya tiene esa versión) y registra
+        send para los cambios siguientes. Ambas cosas bajo el mismo lock: no se pierde ni repite ningún cambio.
+        """
+        with self._lock:
+            send(self._list_message_locked(0 if known_version is None else known_version))
+            self._subscribers.append(send)
+
+    def unsubscribe(self, send):
+        with self._lock:
+            if send in self._subscribers:
+                self._subscribers.remove(send)
@@ -0,0 +1,88 @@
+# logs.py
+# Logging con niveles para el servidor y el cliente. Los módulos piden su logger con get_logger() y
+# escriben con argumentos diferidos (log.debug("Datos: %r", data)): con el nivel por encima de DEBUG
+# la llamada se descarta antes de formatear nada. Con setup_logging() los registros pasan por una
+# cola sin límite (QueueHandler) y un único hilo (QueueListener) los escribe en la consola o en un
+# archivo, así el hilo que atiende a un jugador nunca espera a stdout, a un archivo ni a journald.
+# Sin setup_logging() (benchmarks, pruebas) solo se ven los WARNING y ERROR, como con logging por defecto.
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+ROOT_LOGGER_NAME = "batalla"
+DEFAULT_LEVEL = "INFO"
+LOG_LEVEL_ENV = "BATALLA_LOG_LEVEL" # Nivel por defecto si no se pasa --log-level (p. ej. para menu.py)
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s%(context)s: %(message)s"
+
+_listener = None
+
+def get_logger(name):
+    """Logger de un módulo ('server', 'client'...), hijo del logger común de la aplicación."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+class GameLoggerAdapter(logging.LoggerAdapter):
+    """Agrega game_id a cada registro; el formato lo muestra como [partida N]."""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = self.extra
+        return msg, kwargs
+
+def game_logger(logger, game_id):
+    return GameLoggerAdapter(logger, {"game_id": game_id})
+
+class ContextFilter(logging.Filter):
+    """Arma el campo %(context)s del formato; corre en el hilo que escribe, no en el que registra."""
+
+    def filter(self, record):
+        game_id = getattr(record, "game_id", None)
+        record.context = f" [partida {game_id}]" if game_id is not None else ""
+        return True
+
+def default_level():
+    """Nivel de BATALLA_LOG_LEVEL, o INFO si no está definida o no es uno de LEVELS (con un aviso)."""
+    level = os.environ.get(LOG_LEVEL_ENV, DEFAULT_LEVEL).upper()
+    if level not in LEVELS:
+        # Antes de setup_logging el aviso sale igual por stderr (como todo WARNING sin configurar)
+        get_logger("logs").warning("%s=%r no es un nivel válido (%s); se usa %s.",
+                                   LOG_LEVEL_ENV, os.environ[LOG_LEVEL_ENV], ", ".join(LEVELS), DEFAULT_LEVEL)
+        return DEFAULT_LEVEL
+    return level
+
+def setup_logging(level=None, log_file=None):
+    """
+    Configura el logger de la aplicación: nivel (por defecto el de BATALLA_LOG_LEVEL, o INFO) y destino
+    (stdout, o log_file si se indica) detrás de una cola. Llamar una vez al arrancar el proceso; las
+    siguientes llamadas solo cambian el nivel.
+    """
+    global _listener
+    if level is None:
+        level = default_level()
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    if _listener is not None:
+        return
+    target = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler(sys.stdout)
+    target.setFormatter(logging.Formatter(LOG_FORMAT))
+    target.addFilter(ContextFilter())
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, target)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Escribe lo que quede en la cola y detiene el hilo escritor."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def add_logging_args(parser):
+    parser.add_argument("--log-level", choices=LEVELS, default=default_level(),
+                        help="nivel mínimo de los mensajes (DEBUG muestra cada mensaje del protocolo)")
+    parser.add_argument("--log-file", default=None, help="escribir el log en este archivo en lugar de la consola")
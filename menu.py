@@ -1,12 +1,18 @@
 # menu.py
 
 import pygame
-import sys
 import os
 import socket
+import threading
+import time
 
+import logs
+from app_context import app
 # Importa la función principal del cliente
 from client import game_main_loop
+from protocol import GamesListMessage, LobbyDeltaMessage, SocketFrameReader, parse_message
+
+log = logs.get_logger("menu")
 
 SCREEN_WIDTH = 900
 SCREEN_HEIGHT = 500
@@ -20,15 +26,36 @@ BUTTON_TEXT_COLOR = WHITE
 # Usaremos la IP del servidor 
 SERVER_HOST_FOR_LIST = "172.23.43.50" # Asegurarse que sea la IP correcta del servidor
 SERVER_PORT_FOR_LIST = 8000
+LOBBY_POLL_INTERVAL_SECONDS = 3.0 # Cada cuánto se pide la lista de partidas en segundo plano
+
+# Los menús solo repintan cuando cambia lo que muestran (botón bajo el ratón, tamaño, lista de
+# partidas); tras MENU_ACTIVE_LINGER_SECONDS sin cambios el bucle baja a MENU_IDLE_FPS.
+MENU_ACTIVE_FPS = 30
+MENU_IDLE_FPS = 10
+MENU_ACTIVE_LINGER_SECONDS = 1.0
+
+gradient_cache = {} # (ancho, alto, color1, color2) -> superficie con el degradado ya dibujado
 
 def draw_gradient_background(surface, color1, color2):
-    """Dibuja un fondo degradado vertical."""
-    for y in range(SCREEN_HEIGHT):
-        ratio = y / SCREEN_HEIGHT
-        r = int(color1[0] * (1 - ratio) + color2[0] * ratio)
-        g = int(color1[1] * (1 - ratio) + color2[1] * ratio)
-        b = int(color1[2] * (1 - ratio) + color2[2] * ratio)
-        pygame.draw.line(surface, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+    """Dibuja un fondo degradado vertical (se calcula una vez por tamaño y colores)."""
+    key = (SCREEN_WIDTH, SCREEN_HEIGHT, color1, color2)
+    gradient = gradient_cache.get(key)
+    if gradient is None:
+        gradient = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        for y in range(SCREEN_HEIGHT):
+            ratio = y / SCREEN_HEIGHT
+            r = int(color1[0] * (1 - ratio) + color2[0] * ratio)
+            g = int(color1[1] * (1 - ratio) + color2[1] * ratio)
+            b = int(color1[2] * (1 - ratio) + color2[2] * ratio)
+            pygame.draw.line(gradient, (r, g, b), (0, y), (SCREEN_WIDTH, y))
+        gradient_cache.clear() # Solo interesa el tamaño actual de la ventana
+        gradient_cache[key] = gradient
+    surface.blit(gradient, (0, 0))
+
+def tick_menu(clock, last_change_time):
+    """Espera al siguiente cuadro: ritmo normal si hubo cambios hace poco, ritmo de reposo si no."""
+    idle = time.time() - last_change_time > MENU_ACTIVE_LINGER_SECONDS
+    clock.tick(MENU_IDLE_FPS if idle else MENU_ACTIVE_FPS)
 
 def draw_button(surface, rect, text, font, is_hovered):
     """Dibuja un botón con efecto de sombra en el texto."""
@@ -43,18 +70,17 @@ def draw_button(surface, rect, text, font, is_hovered):
 
 def crear_partida_menu():
     global SCREEN_WIDTH, SCREEN_HEIGHT  
-    pygame.init()
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
-    pygame.display.set_caption("Crear Partida - Batalla Naval") #
-    font_title = pygame.font.Font(pygame.font.match_font('arial'), 60)
-    font_button = pygame.font.Font(pygame.font.match_font('arial'), 44)
-    font_small = pygame.font.Font(pygame.font.match_font('arial'), 32)
+    screen = app.show((SCREEN_WIDTH, SCREEN_HEIGHT), "Crear Partida - Batalla Naval", pygame.RESIZABLE)
+    font_title = app.font('arial', 60)
+    font_button = app.font('arial', 44)
+    font_small = app.font('arial', 32)
+
+    clock = pygame.time.Clock()
+    last_view = None # Lo que se dibujó en el último cuadro: tamaño y botón bajo el ratón
+    last_change_time = time.time()
 
     running = True #
     while running:
-        screen.fill(BLACK) #
-        draw_gradient_background(screen, (30, 30, 60), (10, 10, 30))  # Fondo degradado
-        
         # Ajustar tamaños y posiciones dinámicamente
         width, height = screen.get_size()
         button_width = width // 3
@@ -67,149 +93,325 @@ def crear_partida_menu():
         btn_atras = pygame.Rect(20, 20, 120, 44)
         
         mouse_pos = pygame.mouse.get_pos() #
-            
-        title_surf = font_title.render("¿Cuántos jugadores?", True, WHITE) #
-        title_rect = title_surf.get_rect(center=(width // 2, height // 5))
-        screen.blit(title_surf, title_rect)
-
         is_hovered_2j = btn_2j.collidepoint(mouse_pos) #
-        draw_button(screen, btn_2j, "2 jugadores", font_button, is_hovered_2j) #
-
         is_hovered_4j = btn_4j.collidepoint(mouse_pos) #
-        draw_button(screen, btn_4j, "4 jugadores", font_button, is_hovered_4j) #
-
         is_hovered_atras = btn_atras.collidepoint(mouse_pos) #
-        draw_button(screen, btn_atras, "Atrás", font_small, is_hovered_atras) #
 
-        pygame.display.flip() #
+        view = (width, height, is_hovered_2j, is_hovered_4j, is_hovered_atras)
+        if view != last_view:
+            last_view = view
+            last_change_time = time.time()
+            screen.fill(BLACK) #
+            draw_gradient_background(screen, (30, 30, 60), (10, 10, 30))  # Fondo degradado
+
+            title_surf = font_title.render("¿Cuántos jugadores?", True, WHITE) #
+            title_rect = title_surf.get_rect(center=(width // 2, height // 5))
+            screen.blit(title_surf, title_rect)
+
+            draw_button(screen, btn_2j, "2 jugadores", font_button, is_hovered_2j) #
+            draw_button(screen, btn_4j, "4 jugadores", font_button, is_hovered_4j) #
+            draw_button(screen, btn_atras, "Atrás", font_small, is_hovered_atras) #
+
+            pygame.display.flip() #
+        tick_menu(clock, last_change_time)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT: #
-                pygame.quit() #
-                sys.exit() #
+                app.quit() #
                 
             if event.type == pygame.VIDEORESIZE:
                 SCREEN_WIDTH, SCREEN_HEIGHT = event.w, event.h  # Modificar variables globales
-                screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
+                screen = app.show((SCREEN_WIDTH, SCREEN_HEIGHT), flags=pygame.RESIZABLE)
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWSHOWN, pygame.WINDOWRESTORED):
+                last_view = None # Repintar todo
 
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: #
+                # Al terminar la partida se vuelve al menú principal, con la misma ventana
                 if btn_2j.collidepoint(event.pos):
-                    pygame.quit()
                     game_main_loop(mode=2, action="CREATE") # acción para crear
-                    sys.exit()
+                    running = False
                 elif btn_4j.collidepoint(event.pos):
-                    pygame.quit()
                     game_main_loop(mode=4, action="CREATE") # acción para crear
-                    sys.exit()
+                    running = False
                 elif btn_atras.collidepoint(event.pos):
                     running = False
 
-def obtener_partidas_disponibles():
+def consultar_partidas_disponibles(version=0, partidas=()):
+    """
+    Solicita al servidor la lista de partidas disponibles (lanza excepción si no se pudo).
+    version y partidas: la última lista recibida; si el lobby no cambió desde esa versión, el servidor
+    solo responde GAMES_LIST_UNCHANGED y sigue valiendo esa lista.
+    Retorna (versión, lista de diccionarios con 'nombre_creador', 'id', 'jugadores_conectados', 'max_jugadores').
+    """
+    # Usamos la IP y puerto definidos globalmente para la lista de partidas
+    with socket.create_connection((SERVER_HOST_FOR_LIST, SERVER_PORT_FOR_LIST), timeout=2) as s: #
+        s.sendall(f"LIST_GAMES {version}\n".encode())
+        data = SocketFrameReader(s).read_frame() or "" # La lista completa aunque llegue en varios recv
+    respuesta = parse_message(data)
+    if isinstance(respuesta, GamesListMessage) and respuesta.games is not None: # None: GAMES_LIST_UNCHANGED
+        return respuesta.version or 0, respuesta.games # Un servidor antiguo no envía versión
+    return version, list(partidas)
+
+class LobbyPoller:
+    """
+    Pide la lista de partidas en un hilo de fondo cada `interval` segundos y guarda la última recibida,
+    con su versión, bajo _lock. El bucle de dibujo solo lee snapshot(), así nunca espera a la red.
     """
-    Solicita al servidor la lista de partidas disponibles.
-    Retorna una lista de diccionarios con 'nombre_creador', 'id', 'jugadores_conectados', 'max_jugadores'.
-    """ 
-    partidas = []
-    try:
-        # Usamos la IP y puerto definidos globalmente para la lista de partidas
-        with socket.create_connection((SERVER_HOST_FOR_LIST, SERVER_PORT_FOR_LIST), timeout=2) as s: #
-            s.sendall(b"LIST_GAMES") 
-            data = s.recv(1024).decode() 
-            if data.startswith("GAMES_LIST "): 
-                games_str = data[len("GAMES_LIST "):] 
-                if games_str.strip(): 
-                    for item in games_str.split(";"): 
-                        campos = item.split("|") 
-                        # El servidor unificado siempre enviará los 4 campos
-                        if len(campos) >= 4: 
-                             nombre, id_str, conectados_str, max_jugadores_str = campos[:4] 
-                             partidas.append({ 
-                                "nombre_creador": nombre, 
-                                "id": int(id_str), 
-                                "jugadores_conectados": int(conectados_str), 
-                                "max_jugadores": int(max_jugadores_str) 
-                            })
-    except Exception as e:
-        print(f"Error obteniendo partidas del servidor: {e}") 
-    return partidas 
+
+    def __init__(self, interval=LOBBY_POLL_INTERVAL_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._partidas = []
+        self._version = 0 # Versión del lobby de _partidas; se envía al servidor para recibir solo lo que cambió
+        self._updated_at = None # time.monotonic() de la última respuesta correcta
+        self._error = None
+        self._refreshing = False
+        self._refresh_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._refresh_requested.set()
+
+    def refresh(self):
+        """Pide una consulta inmediata (botón Actualizar)."""
+        self._refresh_requested.set()
+
+    def snapshot(self):
+        """(partidas, segundos desde la última actualización o None, error o None, consultando ahora)."""
+        with self._lock:
+            age = None if self._updated_at is None else time.monotonic() - self._updated_at
+            return list(self._partidas), age, self._error, self._refreshing
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._poll_once()
+            self._refresh_requested.wait(self.interval)
+            self._refresh_requested.clear()
+
+    def _poll_once(self):
+        with self._lock:
+            self._refreshing = True
+            version, partidas = self._version, self._partidas
+        try:
+            version, partidas = consultar_partidas_disponibles(version, partidas)
+            self._publish(partidas, version)
+        except Exception as e:
+            log.warning("Error obteniendo partidas del servidor: %s", e)
+            with self._lock:
+                self._error = str(e) # Se conserva la última lista buena
+        with self._lock:
+            self._refreshing = False
+
+    def _publish(self, partidas, version):
+        with self._lock:
+            self._partidas = partidas
+            self._version = version
+            self._updated_at = time.monotonic()
+            self._error = None
+
+class LobbySubscriber(LobbyPoller):
+    """
+    Igual que LobbyPoller, pero con una conexión SUBSCRIBE_GAMES abierta: el servidor envía la lista una
+    vez y después solo GAME_ADDED / GAME_UPDATED / GAME_REMOVED. Si la conexión se corta se reintenta
+    cada `interval` segundos; si el servidor no conoce SUBSCRIBE_GAMES se vuelve a consultar con LIST_GAMES.
+    """
+
+    def __init__(self, interval=LOBBY_POLL_INTERVAL_SECONDS):
+        super().__init__(interval)
+        self._sock = None
+        self._live = False
+        self._subscription_supported = True
+
+    def stop(self):
+        super().stop()
+        self._close_subscription()
+
+    def refresh(self):
+        # Con la suscripción activa la lista ya está al día; reconectar fuerza una resincronización.
+        self._close_subscription()
+        super().refresh()
+
+    def snapshot(self):
+        partidas, age, error, refreshing = super().snapshot()
+        with self._lock:
+            live = self._live
+        return partidas, (0.0 if live else age), error, refreshing, live
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self._subscription_supported:
+                try:
+                    self._follow_subscription()
+                except Exception as e:
+                    log.warning("Suscripción al lobby interrumpida: %s", e)
+                    with self._lock:
+                        self._error = str(e)
+            else:
+                self._poll_once()
+            self._refresh_requested.wait(self.interval)
+            self._refresh_requested.clear()
+
+    def _follow_subscription(self):
+        with socket.create_connection((SERVER_HOST_FOR_LIST, SERVER_PORT_FOR_LIST), timeout=2) as s:
+            s.settimeout(None)
+            with self._lock:
+                self._sock = s
+                version, partidas = self._version, self._partidas
+            try:
+                s.sendall(f"SUBSCRIBE_GAMES {version}\n".encode())
+                reader = SocketFrameReader(s)
+                games = {}
+                while not self._stopped.is_set():
+                    frame = reader.read_frame()
+                    if frame is None:
+                        return
+                    mensaje = parse_message(frame)
+                    if isinstance(mensaje, GamesListMessage):
+                        lista = partidas if mensaje.games is None else mensaje.games
+                        games = {partida["id"]: partida for partida in lista}
+                    elif isinstance(mensaje, LobbyDeltaMessage):
+                        if mensaje.version != version + 1:
+                            self._refresh_requested.set() # Falta algún cambio: reconectar ya y recibir la lista completa
+                            return
+                        if mensaje.game is None:
+                            games.pop(mensaje.game_id, None)
+                        else:
+                            games[mensaje.game_id] = mensaje.game
+                    else:
+                        # Servidor sin SUBSCRIBE_GAMES (responde con un MSG de error): consultas periódicas
+                        log.info("El servidor no admite SUBSCRIBE_GAMES (%s); se consultará cada %s s.", frame, self.interval)
+                        self._subscription_supported = False
+                        return
+                    version = mensaje.version or 0
+                    self._publish(list(games.values()), version)
+                    with self._lock:
+                        self._live = True
+            finally:
+                with self._lock:
+                    self._sock = None
+                    self._live = False
+
+    def _close_subscription(self):
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            try: sock.shutdown(socket.SHUT_RDWR) # Despierta al hilo bloqueado en recv
+            except OSError: pass
+
+def describir_antiguedad(age, error, refreshing, live=False):
+    """Texto de estado de la lista: 'Actualizado hace 3 s', 'En vivo', etc."""
+    if live:
+        return "Lista en vivo"
+    if age is None:
+        return "Sin conexión con el servidor, reintentando..." if error else "Cargando partidas..."
+    texto = f"Actualizado hace {int(age)} s"
+    if refreshing:
+        texto += " · actualizando..."
+    elif error:
+        texto += " (sin conexión, reintentando)"
+    return texto
 
 def unirse_partida_menu():
-    pygame.init()
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT)) 
-    pygame.display.set_caption("Unirse a Partida - Batalla Naval") 
-    font_title = pygame.font.Font(pygame.font.match_font('arial'), 60) 
-    font_button = pygame.font.Font(pygame.font.match_font('arial'), 44) 
-    font_small = pygame.font.Font(pygame.font.match_font('arial'), 32) 
+    screen = app.show((SCREEN_WIDTH, SCREEN_HEIGHT), "Unirse a Partida - Batalla Naval") 
+    font_title = app.font('arial', 60) 
+    font_button = app.font('arial', 44) 
+    font_small = app.font('arial', 32) 
 
     button_width = 450 # Aumentado para más texto
     button_height = 60 
     spacing = 30 
     start_y = 180 
     btn_atras = pygame.Rect(20, 20, 120, 44) 
+    btn_actualizar = pygame.Rect(SCREEN_WIDTH - 200, 20, 180, 44)
+    font_status = app.font('arial', 22)
+    clock = pygame.time.Clock() # Sin la consulta bloqueante en cada vuelta, el bucle necesita su propio ritmo
+    last_view = None # Lista, texto de estado y botón bajo el ratón del último cuadro dibujado
+    last_change_time = time.time()
 
     running = True 
     partida_buttons = []
+    poller = LobbySubscriber().start()
 
     while running:
         mouse_pos = pygame.mouse.get_pos() 
-        screen.fill(BLACK) 
-
-        title_surf = font_title.render("Partidas disponibles", True, WHITE) 
-        title_rect = title_surf.get_rect(center=(SCREEN_WIDTH//2, 100)) 
-        screen.blit(title_surf, title_rect) 
-
-        is_hovered_atras = btn_atras.collidepoint(mouse_pos) 
-        draw_button(screen, btn_atras, "Atrás", font_small, is_hovered_atras) 
-
-        # Refrescar la lista de partidas cada vez que se muestra el menú
-        partidas_disponibles = obtener_partidas_disponibles() 
+        # La lista la mantiene el hilo de LobbySubscriber; aquí solo se lee la última recibida
+        partidas_disponibles, age, error, refreshing, live = poller.snapshot()
+        status_text = describir_antiguedad(age, error, refreshing, live)
         partida_buttons.clear() #
-
-        if not partidas_disponibles:
-            no_games_text = font_button.render("No hay partidas disponibles", True, WHITE)
-            no_games_rect = no_games_text.get_rect(center=(SCREEN_WIDTH // 2, start_y + button_height))
-            screen.blit(no_games_text, no_games_rect)
-        else:
-            for idx, partida in enumerate(partidas_disponibles): 
-                y = start_y + idx * (button_height + spacing) 
-                btn_rect = pygame.Rect((SCREEN_WIDTH - button_width)//2, y, button_width, button_height) 
-                partida_buttons.append((btn_rect, partida)) 
-                is_hovered = btn_rect.collidepoint(mouse_pos) 
-                # Texto mejorado para mostrar toda la información relevante
-                texto = f"{partida['nombre_creador']} ({partida['jugadores_conectados']}/{partida['max_jugadores']})" 
-                if partida['jugadores_conectados'] >= partida['max_jugadores']:
-                    texto += " - Llena"
-                draw_button(screen, btn_rect, texto, font_button, is_hovered) 
-
-        pygame.display.flip() 
+        for idx, partida in enumerate(partidas_disponibles): 
+            y = start_y + idx * (button_height + spacing) 
+            btn_rect = pygame.Rect((SCREEN_WIDTH - button_width)//2, y, button_width, button_height) 
+            partida_buttons.append((btn_rect, partida)) 
+        hovered = tuple(rect.collidepoint(mouse_pos) for rect in [btn_atras, btn_actualizar] + [b for b, _ in partida_buttons])
+
+        view = (partidas_disponibles, status_text, hovered)
+        if view != last_view:
+            last_view = view
+            last_change_time = time.time()
+            screen.fill(BLACK) 
+
+            title_surf = font_title.render("Partidas disponibles", True, WHITE) 
+            title_rect = title_surf.get_rect(center=(SCREEN_WIDTH//2, 100)) 
+            screen.blit(title_surf, title_rect) 
+
+            draw_button(screen, btn_atras, "Atrás", font_small, hovered[0]) 
+            draw_button(screen, btn_actualizar, "Actualizar", font_small, hovered[1])
+
+            status_surf = font_status.render(status_text, True, WHITE)
+            screen.blit(status_surf, status_surf.get_rect(center=(SCREEN_WIDTH // 2, 145)))
+
+            if not partidas_disponibles:
+                no_games_text = font_button.render("No hay partidas disponibles", True, WHITE)
+                no_games_rect = no_games_text.get_rect(center=(SCREEN_WIDTH // 2, start_y + button_height))
+                screen.blit(no_games_text, no_games_rect)
+            else:
+                for (btn_rect, partida), is_hovered in zip(partida_buttons, hovered[2:]): 
+                    # Texto mejorado para mostrar toda la información relevante
+                    texto = f"{partida['nombre_creador']} ({partida['jugadores_conectados']}/{partida['max_jugadores']})" 
+                    if partida['jugadores_conectados'] >= partida['max_jugadores']:
+                        texto += " - Llena"
+                    draw_button(screen, btn_rect, texto, font_button, is_hovered) 
+
+            pygame.display.flip() 
+        tick_menu(clock, last_change_time)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT: 
-                pygame.quit() 
-                sys.exit() 
+                poller.stop()
+                app.quit() 
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWSHOWN, pygame.WINDOWRESTORED):
+                last_view = None # Repintar todo
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: 
                 if btn_atras.collidepoint(event.pos): 
                     running = False 
+                if btn_actualizar.collidepoint(event.pos):
+                    poller.refresh()
                 for btn_rect, partida in partida_buttons: 
                     if btn_rect.collidepoint(event.pos):
                         if partida['jugadores_conectados'] < partida['max_jugadores']:
-                            pygame.quit()
+                            poller.stop()
                             # Usar la IP del servidor para la lista de partidas también para unirse.
                             game_main_loop(mode=partida['max_jugadores'],
                                         server_ip_to_join=SERVER_HOST_FOR_LIST, # Usar la IP definida
                                         game_id_to_join=partida['id'], # Pasar el ID de la partida
                                         action="JOIN") # acción para unirse
-                            sys.exit()
+                            running = False # Terminada la partida, de vuelta al menú principal
+                            break
                         else:
-                            print("Esta partida está llena.")
+                            log.info("Esta partida está llena.")
+    poller.stop()
 
 
 def menu_loop():
-    pygame.init() 
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT)) 
-    pygame.display.set_caption("Batalla Naval- Menú") 
-    font_title = pygame.font.Font(pygame.font.match_font('arial'), 80) 
-    font_button = pygame.font.Font(pygame.font.match_font('arial'), 48) 
+    screen = app.show((SCREEN_WIDTH, SCREEN_HEIGHT), "Batalla Naval- Menú") 
+    font_title = app.font('arial', 80) 
+    font_button = app.font('arial', 48) 
 
     button_width = 320 
     button_height = 60 
@@ -222,26 +424,36 @@ def menu_loop():
         {"label": "Cerrar", "rect": pygame.Rect((SCREEN_WIDTH - button_width)//2, start_y + 2*(button_height + spacing), button_width, button_height)}, 
     ]
 
+    clock = pygame.time.Clock() 
+    last_hovered = None # Botones bajo el ratón en el último cuadro dibujado
+    last_change_time = time.time() 
+
     running = True 
     while running:
         mouse_pos = pygame.mouse.get_pos() 
-        screen.fill(BLACK) 
+        hovered = tuple(btn["rect"].collidepoint(mouse_pos) for btn in buttons) 
+        if hovered != last_hovered: 
+            last_hovered = hovered 
+            last_change_time = time.time() 
+            screen.fill(BLACK) 
 
-        # Ajustar la posición del título para que quede más abajo
-        title_surf = font_title.render("Batalla Naval", True, WHITE) 
-        title_rect = title_surf.get_rect(center=(SCREEN_WIDTH//2, start_y - button_height - spacing))
-        screen.blit(title_surf, title_rect) 
+            # Ajustar la posición del título para que quede más abajo
+            title_surf = font_title.render("Batalla Naval", True, WHITE) 
+            title_rect = title_surf.get_rect(center=(SCREEN_WIDTH//2, start_y - button_height - spacing))
+            screen.blit(title_surf, title_rect) 
 
-        for btn in buttons: 
-            is_hovered = btn["rect"].collidepoint(mouse_pos) 
-            draw_button(screen, btn["rect"], btn["label"], font_button, is_hovered) 
+            for btn, is_hovered in zip(buttons, hovered): 
+                draw_button(screen, btn["rect"], btn["label"], font_button, is_hovered) 
 
-        pygame.display.flip() 
+            pygame.display.flip() 
+        tick_menu(clock, last_change_time) 
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT: 
                 running = False 
                 break 
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWSHOWN, pygame.WINDOWRESTORED): 
+                last_hovered = None # Repintar todo
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: 
                 for idx, btn in enumerate(buttons): 
                     if btn["rect"].collidepoint(event.pos): 
@@ -249,11 +461,15 @@ def menu_loop():
                             crear_partida_menu() 
                         elif btn["label"] == "Unirse a partida": 
                             unirse_partida_menu() 
+                        if btn["label"] != "Cerrar": 
+                            # Al volver (del submenú o de una partida) la ventana tiene otra pantalla: recuperar título y repintar
+                            screen = app.show((SCREEN_WIDTH, SCREEN_HEIGHT), "Batalla Naval- Menú") 
+                            last_hovered = None 
                         elif btn["label"] == "Cerrar": 
                             running = False 
                             break 
-    pygame.quit() 
-    sys.exit() 
+    app.quit() 
 
 if __name__ == "__main__":
+    logs.setup_logging() # Nivel con la variable de entorno BATALLA_LOG_LEVEL (INFO por defecto)
     menu_loop() 
\ No newline at end of file
@@ -0,0 +1,211 @@
+# metrics.py
+# Métricas del servidor pensadas para dejar siempre activas: contadores y sumas bajo un único lock hoja
+# (secciones de pocas instrucciones, sin E/S) e histogramas de cubetas fijas, sin guardar muestras.
+# Lo que se puede leer del estado (partidas por modo y fase) no se cuenta: se calcula al pedir el
+# reporte. El servidor las expone con el comando STATS (respuesta "STATS <json>") y, con
+# --stats-file, las vuelca a un archivo cada --stats-interval segundos.
+import bisect
+import json
+import os
+import threading
+import time
+
+import logs
+
+log = logs.get_logger("metrics")
+
+# Límites superiores de las cubetas, en segundos (la última cubeta es "más que eso")
+LATENCY_BUCKETS_SECONDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                           0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+
+def command_of(message):
+    """Primera palabra de un mensaje (str o bytes), con la que se cuenta; vacía si no tiene ninguna."""
+    words = message.split(None, 1)
+    return words[0] if words else message[:0]
+
+class Histogram:
+    """Conteo por cubetas fijas más suma y máximo, con su propio lock hoja."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_SECONDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        bucket = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, pct):
+        """Límite superior de la cubeta donde cae el percentil (aproximado por arriba, nunca más que el máximo)."""
+        if not self.count:
+            return 0.0
+        rank = self.count * pct / 100.0
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and i < len(self.bounds):
+                return min(self.bounds[i], self.max)
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot_locked()
+
+    def _snapshot_locked(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(1000 * self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(1000 * self.percentile(50), 3),
+            "p95_ms": round(1000 * self.percentile(95), 3),
+            "p99_ms": round(1000 * self.percentile(99), 3),
+            "max_ms": round(1000 * self.max, 3),
+            "buckets_ms": {("+inf" if i == len(self.bounds) else f"{1000 * self.bounds[i]:g}"): n
+                           for i, n in enumerate(self.counts) if n},
+        }
+
+class Metrics:
+    """Contadores del proceso. Todos los métodos son seguros entre hilos y no bloquean más que el lock propio."""
+
+    def __init__(self):
+        self._lock = threading.Lock() # Lock hoja: no se toma ningún otro lock con este tomado
+        self.started_at = time.time()
+        self.connections_active = 0
+        self.connections_total = 0
+        self.connections_handed_off = 0 # Pasadas a otro worker con --workers N (ver shards.py)
+        self.messages_in = {} # comando -> mensajes recibidos
+        self.messages_out = {} # comando (bytes, se decodifica al armar el reporte) -> mensajes encolados hacia los clientes
+        self.bytes_sent = 0
+        self.writes = 0 # Escrituras al socket (send/sendmsg/write), cada una con uno o más mensajes
+        self.lock_waits = {} # nombre del lock -> [esperas, segundos esperando, espera máxima]
+        self.lock_wait_listener = None # f(nombre, segundos) llamada además en cada espera (perfilado)
+        self.turn_latency = Histogram() # SHOT recibido -> TURN / YOUR_TURN_AGAIN encolado
+        self.lobby_wait = Histogram() # CREATE_GAME / JOIN_GAME -> partida lista (SETUP_YOUR_BOARD o TEAMS_INFO_FINAL)
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_active += 1
+            self.connections_total += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.connections_active -= 1
+
+    def connection_handed_off(self):
+        with self._lock:
+            self.connections_handed_off += 1
+
+    def message_in(self, command):
+        with self._lock:
+            self.messages_in[command] = self.messages_in.get(command, 0) + 1
+
+    def message_out(self, data):
+        """data: el mensaje codificado; se cuenta por su primera palabra (el comando)."""
+        command = command_of(data)
+        with self._lock:
+            self.messages_out[command] = self.messages_out.get(command, 0) + 1
+
+    def sent_bytes(self, count):
+        """Una escritura de count bytes a un cliente."""
+        with self._lock:
+            self.bytes_sent += count
+            self.writes += 1
+
+    def lock_waited(self, name, seconds):
+        with self._lock:
+            waits = self.lock_waits.get(name)
+            if waits is None:
+                waits = self.lock_waits[name] = [0, 0.0, 0.0]
+            waits[0] += 1
+            waits[1] += seconds
+            if seconds > waits[2]:
+                waits[2] = seconds
+        listener = self.lock_wait_listener
+        if listener is not None:
+            listener(name, seconds)
+
+    def snapshot(self, games=None):
+        """Diccionario listo para json.dumps. games: {modo: {fase: cantidad}} calculado por el servidor."""
+        with self._lock:
+            report = {
+                "time": round(time.time(), 3),
+                "uptime_s": round(time.time() - self.started_at, 3),
+                "connections": {"active": self.connections_active, "total": self.connections_total,
+                                "handed_off": self.connections_handed_off},
+                "games": games or {},
+                "messages_in": dict(self.messages_in),
+                "messages_out": {command.decode("ascii", "replace"): n for command, n in self.messages_out.items()},
+                "bytes_sent": self.bytes_sent,
+                "writes": self.writes,
+                "lock_wait": {name: {"waits": n, "total_ms": round(1000 * total, 3), "max_ms": round(1000 * worst, 3)}
+                              for name, (n, total, worst) in self.lock_waits.items()},
+            }
+        report["histograms"] = {"turn_latency": self.turn_latency.snapshot(), "lobby_wait": self.lobby_wait.snapshot()}
+        return report
+
+class TimedRLock:
+    """
+    RLock que suma a las métricas el tiempo esperado cuando está ocupado. El camino sin competencia es
+    un acquire(blocking=False) y nada más: el reloj solo se consulta si hay que esperar. Sirve de lock
+    para threading.Condition (delega los métodos internos que esta usa con un RLock).
+    """
+
+    def __init__(self, name, metrics_registry=None):
+        self.name = name
+        self.registry = metrics_registry or registry
+        self._lock = threading.RLock()
+        self._release_save = self._lock._release_save
+        self._acquire_restore = self._lock._acquire_restore
+        self._is_owned = self._lock._is_owned
+        self.release = self._lock.release
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        self.registry.lock_waited(self.name, time.perf_counter() - start)
+        return acquired
+
+    def __enter__(self):
+        if not self._lock.acquire(False):
+            start = time.perf_counter()
+            self._lock.acquire()
+            self.registry.lock_waited(self.name, time.perf_counter() - start)
+        return True
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+def write_snapshot(path, snapshot):
+    """Escribe el reporte de forma atómica (archivo temporal + rename): quien lo lea nunca ve uno a medias."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def start_periodic_dump(path, interval_seconds, build_snapshot):
+    """Hilo que cada interval_seconds escribe build_snapshot() en path. Retorna el Event que lo detiene."""
+    stop_event = threading.Event()
+
+    def dump_loop():
+        while not stop_event.wait(interval_seconds):
+            try:
+                write_snapshot(path, build_snapshot())
+            except OSError as e:
+                log.warning("No se pudo escribir %s: %s", path, e)
+
+    threading.Thread(target=dump_loop, daemon=True, name="metrics-dump").start()
+    return stop_event
+
+# Métricas del proceso servidor (los dos motores y las colas de salida comparten este objeto)
+registry = Metrics()
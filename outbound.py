@@ -0,0 +1,246 @@
+# outbound.py
+# Colas de salida por conexión para el servidor. Enviar a un jugador ya no es un sendall() bloqueante
+# hecho con los locks de la partida tomados: se encola el mensaje (operación acotada y sin bloqueo) y un
+# escritor propio de esa conexión lo vacía. Un cliente con la ventana TCP llena solo retrasa su propia
+# cola; si esta se llena se aplica la política configurada.
+# Dentro de batched_sends() (cada comando de un jugador) los escritores no se despiertan hasta el final:
+# todo lo que produjo el comando sale en una sola escritura por destinatario.
+import collections
+import socket
+import threading
+
+import logs
+from metrics import registry
+
+log = logs.get_logger("outbound")
+
+OVERFLOW_DROP = "drop"         # Cola llena: se cierra la conexión del cliente lento
+OVERFLOW_COALESCE = "coalesce" # Cola llena: se descartan mensajes reemplazables por uno más nuevo y, si aún no hay sitio, se cierra
+OVERFLOW_POLICIES = (OVERFLOW_DROP, OVERFLOW_COALESCE)
+DEFAULT_MAX_QUEUED_MESSAGES = 256
+
+# Mensajes de estado donde solo importa el último: los anteriores pueden descartarse si la cola se llena.
+COALESCIBLE_PREFIXES = (b"MSG ",)
+
+# Máximo de buffers por sendmsg (IOV_MAX en Linux y macOS es 1024)
+MAX_BUFFERS_PER_WRITE = 1024
+HAS_SENDMSG = hasattr(socket.socket, "sendmsg") # No existe en Windows
+
+class OutboundQueueOverflow(ConnectionResetError):
+    """La cola de salida de un cliente se llenó y su conexión fue descartada."""
+
+def _coalesce_key(data):
+    for prefix in COALESCIBLE_PREFIXES:
+        if data.startswith(prefix):
+            return prefix
+    return None
+
+class _SendBatch(threading.local):
+    depth = 0 # Bloques batched_sends anidados dentro del de más afuera
+    queues = None # Colas con mensajes nuevos -> None, mientras el hilo está dentro de batched_sends
+
+_send_batch = _SendBatch()
+
+class batched_sends:
+    """
+    `with batched_sends():` retiene los escritores de las colas a las que el hilo encola algo y los
+    despierta todos juntos al salir, así cada destinatario recibe en una sola escritura lo encolado
+    dentro del bloque (p. ej. UPDATE + YOUR_TURN_AGAIN tras un disparo). Anidado, vacía el de más afuera.
+    Clase y no contextlib.contextmanager: se usa en cada comando y así cuesta la mitad.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        batch = _send_batch
+        if batch.queues is None:
+            batch.queues = {}
+        else:
+            batch.depth += 1
+
+    def __exit__(self, *exc_info):
+        batch = _send_batch
+        if batch.depth:
+            batch.depth -= 1
+            return
+        queues, batch.queues = batch.queues, None
+        for queue in queues:
+            queue._wake()
+
+def set_tcp_nodelay(sock):
+    """
+    Desactiva Nagle: sin esto un segundo write pequeño espera el ACK del primero, y con el ACK
+    retardado del otro extremo eso son ~40 ms. Los envíos ya van agrupados por comando.
+    """
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except (OSError, AttributeError): # Sockets que no son TCP
+        pass
+
+def send_buffers(sock, buffers):
+    """
+    Escribe los mensajes en orden: con sendmsg (scatter-gather, sin copiarlos a un único bloque) donde
+    existe y con sendall del bloque unido donde no. Retorna los bytes enviados.
+    """
+    if len(buffers) == 1 or not HAS_SENDMSG:
+        data = b"".join(buffers)
+        sock.sendall(data)
+        return len(data)
+    total = 0
+    while buffers:
+        chunk = buffers[:MAX_BUFFERS_PER_WRITE]
+        sent = sock.sendmsg(chunk)
+        total += sent
+        # Descartar lo ya enviado; un envío parcial deja pendiente el resto del primer buffer
+        index = 0
+        while index < len(chunk) and sent >= len(chunk[index]):
+            sent -= len(chunk[index])
+            index += 1
+        buffers = buffers[index:]
+        if sent:
+            buffers[0] = memoryview(buffers[0])[sent:]
+    return total
+
+class OutboundQueue:
+    """
+    Parte común a los dos motores: cola acotada de mensajes (bytes) y política de desborde.
+    Las subclases implementan cómo se despierta y trabaja el escritor.
+    Expone sendall()/close() para que la lógica de server.py la use igual que un socket.
+    Con binary_wire (negociado en CREATE_GAME / JOIN_GAME) los protocol.WireMessage salen en su forma binaria.
+    """
+
+    binary_wire = False
+
+    def __init__(self, label="", max_messages=DEFAULT_MAX_QUEUED_MESSAGES, policy=OVERFLOW_DROP):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de desborde desconocida: {policy}")
+        self.label = label
+        self.max_messages = max_messages
+        self.policy = policy
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._closing = False
+
+    def sendall(self, data):
+        """Encola el mensaje sin bloquear. Lanza ConnectionResetError si la conexión ya se cerró o desbordó."""
+        overflowed = False
+        frame = data
+        if self.binary_wire and getattr(data, "binary", None):
+            frame = data.binary
+        with self._lock:
+            if self._closing:
+                raise ConnectionResetError(f"Conexión {self.label} cerrada")
+            if len(self._items) >= self.max_messages and not self._make_room(data):
+                self._closing = True
+                self._items.clear()
+                overflowed = True
+            else:
+                self._items.append(frame if isinstance(frame, bytes) else bytes(frame)) # WireMessage: sin copiar
+        if overflowed:
+            self._abort()
+            raise OutboundQueueOverflow(f"Cola de salida de {self.label} llena ({self.max_messages} mensajes). Conexión descartada.")
+        registry.message_out(data)
+        batch_queues = _send_batch.queues
+        if batch_queues is None:
+            self._wake()
+        else:
+            batch_queues[self] = None
+
+    def _make_room(self, new_data):
+        """Política coalesce: conserva solo el último mensaje de cada tipo reemplazable. Llamar con _lock."""
+        if self.policy != OVERFLOW_COALESCE:
+            return False
+        seen_keys = set()
+        new_key = _coalesce_key(new_data)
+        if new_key:
+            seen_keys.add(new_key) # El mensaje nuevo reemplaza a los encolados del mismo tipo
+        kept = collections.deque()
+        for item in reversed(self._items):
+            key = _coalesce_key(item)
+            if key:
+                if key in seen_keys:
+                    continue
+                seen_keys.add(key)
+            kept.appendleft(item)
+        self._items = kept
+        return len(kept) < self.max_messages
+
+    def _take_items(self):
+        """Saca todo lo encolado como lista de mensajes, para escribirlos de una vez. Llamar con _lock."""
+        items = list(self._items)
+        self._items.clear()
+        return items
+
+    def queued_messages(self):
+        with self._lock:
+            return len(self._items)
+
+    def _wake(self):
+        raise NotImplementedError
+
+    def _abort(self):
+        raise NotImplementedError
+
+class ThreadedOutboundQueue(OutboundQueue):
+    """Cola de salida con un hilo escritor por conexión (motor de hilos)."""
+
+    def __init__(self, sock, label="", max_messages=DEFAULT_MAX_QUEUED_MESSAGES, policy=OVERFLOW_DROP):
+        super().__init__(label, max_messages, policy)
+        self.sock = sock
+        self._has_items = threading.Condition(self._lock)
+        self._close_requested = False
+        self._writer_exited = False
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True, name=f"writer-{label}")
+        self._writer_thread.start()
+
+    def _wake(self):
+        with self._has_items:
+            self._has_items.notify()
+
+    def _writer_loop(self):
+        while True:
+            with self._has_items:
+                while not self._items and not self._closing:
+                    self._has_items.wait()
+                if not self._items:
+                    break # Cerrando y sin nada pendiente
+                items = self._take_items()
+            try:
+                registry.sent_bytes(send_buffers(self.sock, items))
+            except OSError as e:
+                log.info("Error enviando a %s: %s", self.label, e)
+                with self._lock:
+                    self._closing = True
+                    self._items.clear()
+                break
+
+        with self._lock:
+            self._writer_exited = True
+            close_requested = self._close_requested
+        if close_requested:
+            self._close_socket()
+        else:
+            self._shutdown_socket() # Error o desborde: despertar al lector para que limpie
+
+    def _abort(self):
+        # Despierta al escritor (que termina sin enviar lo pendiente) y al hilo lector del jugador.
+        self._wake()
+        self._shutdown_socket()
+
+    def close(self):
+        """Envía lo pendiente y luego cierra el socket (desde el hilo escritor)."""
+        with self._has_items:
+            self._closing = True
+            self._close_requested = True
+            writer_exited = self._writer_exited
+            self._has_items.notify()
+        if writer_exited:
+            self._close_socket()
+
+    def _shutdown_socket(self):
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+
+    def _close_socket(self):
+        self._shutdown_socket()
+        try: self.sock.close()
+        except OSError: pass
@@ -0,0 +1,251 @@
+# profiling.py
+# Modo de perfilado del servidor que se enciende y apaga en caliente (comando PROFILE desde loopback o
+# señal SIGUSR1), para tener algo que mirar cuando la latencia de turno se dispara en producción.
+# Apagado, el costo es una comprobación de `profiler.active` por comando y por notify_players_in_game.
+# Encendido, por cada ventana de --profile-window segundos escribe en --profile-dir:
+#   - prof-<inicio>-<n>.timers.txt: tiempo de pared y espera por locks de cada comando y de notify_players_in_game
+#   - modo sampling: prof-<inicio>-<n>.collapsed, pilas de todos los hilos muestreadas cada --profile-interval
+#     segundos en formato "f1;f2;f3 cuenta" (flamegraph.pl, speedscope)
+#   - modo deterministic: prof-<inicio>-<n>.pstats, cProfile de los comandos (python -m pstats archivo)
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+import logs
+from metrics import registry
+
+log = logs.get_logger("profiling")
+
+MODE_SAMPLING = "sampling"
+MODE_DETERMINISTIC = "deterministic"
+MODES = (MODE_SAMPLING, MODE_DETERMINISTIC)
+DEFAULT_WINDOW_SECONDS = 10
+DEFAULT_SAMPLING_INTERVAL_SECONDS = 0.01
+# Hasta 3.11 un cProfile.Profile solo ve el hilo que lo habilitó: se usa uno por hilo, habilitado
+# alrededor de cada comando. Desde 3.12 cProfile usa sys.monitoring (todo el intérprete, un solo
+# perfilador a la vez): se usa uno compartido durante toda la ventana.
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+class Profiler:
+    """Estado del modo de perfilado del proceso. start()/stop() son seguros desde cualquier hilo o señal."""
+
+    def __init__(self):
+        self.active = False # Lo único que se lee en el camino caliente
+        self.mode = MODE_SAMPLING
+        self.output_dir = "profiles"
+        self.window_seconds = DEFAULT_WINDOW_SECONDS
+        self.sampling_interval = DEFAULT_SAMPLING_INTERVAL_SECONDS
+        self.windows_written = 0
+        self._control_lock = threading.Lock() # Serializa start/stop
+        self._lock = threading.Lock() # Lock hoja para los datos de la ventana actual
+        self._local = threading.local() # Espera por locks acumulada por el hilo (ver lock_waited)
+        self._stop_event = None
+        self._worker = None
+        self._shared_profile = None # Perfil de toda la ventana (modo deterministic desde 3.12)
+        self._reset_window()
+
+    def configure(self, output_dir=None, window_seconds=None, mode=None, sampling_interval=None):
+        if output_dir is not None: self.output_dir = output_dir
+        if window_seconds is not None: self.window_seconds = window_seconds
+        if mode is not None: self.mode = mode
+        if sampling_interval is not None: self.sampling_interval = sampling_interval
+
+    def _reset_window(self):
+        """Llamar con _lock tomado (o antes de que haya otros hilos)."""
+        self.window_started = time.time()
+        self._timers = {} # nombre -> [llamadas, segundos, máximo, segundos esperando locks]
+        self._stacks = {} # pila colapsada -> muestras
+        self._thread_profiles = {} # ident del hilo -> cProfile.Profile (modo deterministic, hasta 3.11)
+        self._busy_profiles = set() # hilos con su perfil habilitado en este momento
+
+    # --- Encendido y apagado ---
+
+    def start(self, mode=None):
+        """Empieza a perfilar (si no lo estaba). Retorna el modo en uso."""
+        with self._control_lock:
+            if self.active:
+                return self.mode
+            if mode is not None:
+                if mode not in MODES:
+                    raise ValueError(f"Modo de perfilado desconocido: {mode}")
+                self.mode = mode
+            os.makedirs(self.output_dir, exist_ok=True)
+            with self._lock:
+                self._reset_window()
+            self._shared_profile = None
+            if self.mode == MODE_DETERMINISTIC and not PER_THREAD_PROFILES:
+                self._shared_profile = cProfile.Profile()
+                self._shared_profile.enable()
+            registry.lock_wait_listener = self.lock_waited
+            self._stop_event = threading.Event()
+            target = self._sampling_loop if self.mode == MODE_SAMPLING else self._window_loop
+            self._worker = threading.Thread(target=target, args=(self._stop_event,), daemon=True, name="profiler")
+            self.active = True
+            self._worker.start()
+            log.info("Perfilado %s activado: ventanas de %ss en %s", self.mode, self.window_seconds, self.output_dir)
+            return self.mode
+
+    def stop(self):
+        """Deja de perfilar y escribe la ventana en curso. Retorna False si no estaba activo."""
+        with self._control_lock:
+            if not self.active:
+                return False
+            self.active = False
+            registry.lock_wait_listener = None
+            self._stop_event.set()
+            if self._worker is not threading.current_thread():
+                self._worker.join()
+            self._write_window()
+            log.info("Perfilado desactivado (%s ventanas escritas en %s).", self.windows_written, self.output_dir)
+            return True
+
+    def toggle(self):
+        if not self.stop():
+            self.start()
+
+    def status(self):
+        return {"active": self.active, "mode": self.mode, "window_s": self.window_seconds,
+                "dir": os.path.abspath(self.output_dir), "windows": self.windows_written}
+
+    # --- Camino caliente (solo con active=True) ---
+
+    def lock_waited(self, name, seconds):
+        """Llamado por TimedRLock (vía metrics) cuando un hilo tuvo que esperar un lock."""
+        self._local.lock_wait = getattr(self._local, "lock_wait", 0.0) + seconds
+
+    def timer_start(self):
+        """Para medir un tramo sin envolverlo en una función: token = timer_start(); ...; timer_stop(nombre, token)."""
+        return time.perf_counter(), getattr(self._local, "lock_wait", 0.0)
+
+    def timer_stop(self, name, token):
+        start, lock_wait_before = token
+        elapsed = time.perf_counter() - start
+        lock_wait = getattr(self._local, "lock_wait", 0.0) - lock_wait_before
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = [0, 0.0, 0.0, 0.0]
+            timer[0] += 1
+            timer[1] += elapsed
+            if elapsed > timer[2]:
+                timer[2] = elapsed
+            timer[3] += lock_wait
+
+    def run_command(self, command, func, *args):
+        """Ejecuta func(*args) midiendo tiempo y esperas por locks bajo el nombre command (y con cProfile si corresponde)."""
+        token = self.timer_start()
+        profile = self._acquire_thread_profile() if self.mode == MODE_DETERMINISTIC and PER_THREAD_PROFILES else None
+        if profile is not None:
+            profile.enable()
+        try:
+            return func(*args)
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._release_thread_profile()
+            self.timer_stop(command, token)
+
+    def _acquire_thread_profile(self):
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._busy_profiles: # Comando anidado: ya lo está perfilando el de afuera
+                return None
+            profile = self._thread_profiles.get(ident)
+            if profile is None:
+                profile = self._thread_profiles[ident] = cProfile.Profile()
+            self._busy_profiles.add(ident)
+            return profile
+
+    def _release_thread_profile(self):
+        with self._lock:
+            self._busy_profiles.discard(threading.get_ident())
+
+    # --- Ventanas ---
+
+    def _window_loop(self, stop_event):
+        while not stop_event.wait(self.window_seconds):
+            self._write_window()
+
+    def _sampling_loop(self, stop_event):
+        own_ident = threading.get_ident()
+        labels = {} # code -> "archivo:función", para no armar el texto en cada muestra
+        next_window = time.monotonic() + self.window_seconds
+        while not stop_event.wait(self.sampling_interval):
+            samples = {}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+                    stack.append(label)
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                samples[key] = samples.get(key, 0) + 1
+            with self._lock:
+                for key, count in samples.items():
+                    self._stacks[key] = self._stacks.get(key, 0) + count
+            if time.monotonic() >= next_window:
+                next_window += self.window_seconds
+                self._write_window()
+
+    def _write_window(self):
+        """Escribe los archivos de la ventana que termina y empieza una nueva."""
+        with self._lock:
+            started, timers, stacks = self.window_started, self._timers, self._stacks
+            # Los perfiles de hilos que están en medio de un comando quedan para la próxima ventana
+            profiles = [p for ident, p in self._thread_profiles.items() if ident not in self._busy_profiles]
+            busy = {ident: p for ident, p in self._thread_profiles.items() if ident in self._busy_profiles}
+            self._reset_window()
+            self._thread_profiles = busy
+            self._busy_profiles = set(busy)
+        if self._shared_profile is not None:
+            self._shared_profile.disable()
+            profiles.append(self._shared_profile)
+            if self.active:
+                self._shared_profile = cProfile.Profile()
+                self._shared_profile.enable()
+            else:
+                self._shared_profile = None
+
+        window_name = f"prof-{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}-{self.windows_written:04d}"
+        prefix = os.path.join(self.output_dir, window_name)
+        try:
+            write_timers(f"{prefix}.timers.txt", timers, time.time() - started)
+            if stacks:
+                with open(f"{prefix}.collapsed", "w", encoding="utf-8") as f:
+                    for key, count in sorted(stacks.items()):
+                        f.write(f"{key} {count}\n")
+            stats = None
+            for profile in profiles:
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(profile)
+                    else:
+                        stats.add(profile)
+                except TypeError: # Perfil sin datos
+                    continue
+            if stats is not None:
+                stats.dump_stats(f"{prefix}.pstats")
+        except OSError as e:
+            log.warning("No se pudo escribir la ventana de perfilado %s: %s", prefix, e)
+            return
+        self.windows_written += 1
+        log.debug("Ventana de perfilado escrita: %s.*", prefix)
+
+def write_timers(path, timers, window_seconds):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# ventana de {window_seconds:.1f} s; tiempos en ms; 'locks' = espera por game_specific_lock/turn_lock\n")
+        f.write(f"{'nombre':<24} {'llamadas':>9} {'total':>10} {'media':>9} {'máx':>9} {'locks':>9}\n")
+        for name, (calls, total, worst, lock_wait) in sorted(timers.items(), key=lambda item: -item[1][1]):
+            f.write(f"{name:<24} {calls:>9} {1000 * total:>10.2f} {1000 * total / calls:>9.3f} "
+                    f"{1000 * worst:>9.3f} {1000 * lock_wait:>9.3f}\n")
+
+# Perfilador del proceso servidor (los dos motores lo comparten)
+profiler = Profiler()
@@ -0,0 +1,728 @@
+# protocol.py
+# Protocolo de texto común a server.py, server_asyncio.py, client.py y menu.py.
+# Cada mensaje es una línea terminada en '\n'. FrameDecoder arma las líneas de forma incremental
+# sobre un bytearray reutilizable (un recv puede traer medio mensaje o varios mensajes juntos) y
+# decodifica UTF-8 una sola vez por línea completa, así una secuencia multibyte partida entre dos
+# recv nunca se rompe. parse_message convierte cada línea en un objeto de mensaje tipado.
+#
+# Formato binario opcional: el cliente lo pide agregando +BIN a CREATE_GAME / JOIN_GAME y el servidor
+# lo confirma con la línea "WIRE BIN". Desde ahí los mensajes de la partida que más se repiten (disparos,
+# resultados, turnos, hundimientos, tableros) pueden ir como registros struct de tamaño fijo: un byte de
+# tipo (0x80-0xBF, que nunca empieza una línea UTF-8), un byte de largo y los campos, con cada casilla en
+# un byte (r * GRID_SIZE + c) y las casillas de un barco como máscara de bits. El resto sigue en texto:
+# las dos formas conviven en el mismo flujo y FrameDecoder(allow_binary=True) las separa por el primer
+# byte. Los clientes de texto no notan nada.
+import struct
+
+from board import GRID_SIZE, SHIPS_CONFIG, coords_mask, mask_coords
+
+MAX_FRAME_BYTES = 64 * 1024 # Un TEAM_BOARD completo ocupa ~200 bytes; esto solo protege de basura
+
+class ProtocolError(ValueError):
+    """Mensaje o trama que no respeta el protocolo."""
+
+class FrameDecoder:
+    """
+    Acumula bytes y devuelve las líneas completas recibidas, ya decodificadas y sin '\\n'. Con
+    allow_binary también separa las tramas binarias, que se devuelven como bytes (ver parse_message).
+    """
+
+    def __init__(self, max_frame_bytes=MAX_FRAME_BYTES, allow_binary=False):
+        self._buffer = bytearray()
+        self._max_frame_bytes = max_frame_bytes
+        self.allow_binary = allow_binary
+
+    def feed(self, data):
+        if self.allow_binary:
+            return self._feed_mixed(data)
+        buf = self._buffer
+        last_newline = data.rfind(b"\n")
+        if last_newline < 0:
+            buf += data
+            if len(buf) > self._max_frame_bytes:
+                buf.clear()
+                raise ProtocolError(f"Trama sin '\\n' mayor a {self._max_frame_bytes} bytes")
+            return []
+        # Se decodifica una sola vez el bloque de tramas completas; '\n' nunca aparece dentro de una
+        # secuencia UTF-8 multibyte, así que partir el texto después es equivalente a partir los bytes.
+        if buf:
+            buf += data[:last_newline]
+            block = buf.decode("utf-8", errors="replace")
+            buf.clear()
+        else:
+            block = data[:last_newline].decode("utf-8", errors="replace")
+        buf += data[last_newline + 1:]
+        return [frame for frame in (line.strip() for line in block.split("\n")) if frame]
+
+    def _feed_mixed(self, data):
+        """Texto y tramas binarias mezclados: se recorre trama por trama mirando el primer byte."""
+        buf = self._buffer
+        buf += data
+        frames = []
+        pos, size = 0, len(buf)
+        while pos < size:
+            lead = buf[pos]
+            if BINARY_TYPE_FIRST <= lead <= BINARY_TYPE_LAST:
+                if pos + 2 > size:
+                    break
+                end = pos + 2 + buf[pos + 1]
+                if end > size:
+                    break
+                frames.append(bytes(buf[pos:end]))
+                pos = end
+            else:
+                newline = buf.find(b"\n", pos)
+                if newline < 0:
+                    break
+                line = buf[pos:newline].decode("utf-8", errors="replace").strip()
+                if line:
+                    frames.append(line)
+                pos = newline + 1
+        del buf[:pos]
+        if len(buf) > self._max_frame_bytes:
+            buf.clear()
+            raise ProtocolError(f"Trama incompleta mayor a {self._max_frame_bytes} bytes")
+        return frames
+
+    def pending_text(self):
+        """Texto acumulado sin '\\n' (p. ej. el LIST_GAMES del menú antiguo, que no termina en salto de línea)."""
+        return self._buffer.decode("utf-8", errors="replace").strip()
+
+    def clear(self):
+        self._buffer.clear()
+
+    def take_pending_bytes(self):
+        """Saca los bytes acumulados de una trama todavía incompleta."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def _take_buffered(frame_reader):
+    """
+    Lo que un lector recibió y todavía no entregó, otra vez como bytes: las tramas completas (solo texto:
+    se usa antes de negociar el formato binario) y lo que quede de la siguiente. Ver shards.py.
+    """
+    frames, frame_reader._frames = frame_reader._frames, []
+    return b"".join(f"{frame}\n".encode() for frame in frames) + frame_reader.decoder.take_pending_bytes()
+
+def _take_unterminated(decoder, unterminated_commands):
+    """Algunos clientes antiguos envían un único comando sin '\\n' y esperan respuesta (LIST_GAMES del menú)."""
+    if unterminated_commands:
+        pending = decoder.pending_text()
+        if pending.startswith(unterminated_commands):
+            decoder.clear()
+            return pending
+    return None
+
+class SocketFrameReader:
+    """Lectura bloqueante de mensajes completos desde un socket, con FrameDecoder por debajo."""
+
+    def __init__(self, sock, recv_size=4096, allow_binary=False):
+        self.sock = sock
+        self.recv_size = recv_size
+        self.decoder = FrameDecoder(allow_binary=allow_binary)
+        self._frames = []
+
+    def read_frame(self, unterminated_commands=()):
+        """Retorna la siguiente línea completa, o None si el otro extremo cerró la conexión."""
+        while not self._frames:
+            data = self.sock.recv(self.recv_size)
+            if not data:
+                return None
+            self._frames.extend(self.decoder.feed(data))
+            if not self._frames:
+                legacy_frame = _take_unterminated(self.decoder, unterminated_commands)
+                if legacy_frame:
+                    return legacy_frame
+        return self._frames.pop(0)
+
+    def has_buffered_frames(self):
+        return bool(self._frames)
+
+    def take_buffered(self):
+        """Bytes recibidos y no entregados, para seguir la conexión en otro proceso (ver shards.py)."""
+        return _take_buffered(self)
+
+    def push_buffered(self, data):
+        """Inverso de take_buffered: bytes que llegaron por el socket antes de que este lector lo tuviera."""
+        self._frames.extend(self.decoder.feed(data))
+
+class AsyncFrameReader:
+    """Equivalente de SocketFrameReader sobre un asyncio.StreamReader."""
+
+    def __init__(self, reader, recv_size=4096, allow_binary=False):
+        self.reader = reader
+        self.recv_size = recv_size
+        self.decoder = FrameDecoder(allow_binary=allow_binary)
+        self._frames = []
+
+    async def read_frame(self, unterminated_commands=()):
+        while not self._frames:
+            data = await self.reader.read(self.recv_size)
+            if not data:
+                return None
+            self._frames.extend(self.decoder.feed(data))
+            if not self._frames:
+                legacy_frame = _take_unterminated(self.decoder, unterminated_commands)
+                if legacy_frame:
+                    return legacy_frame
+        return self._frames.pop(0)
+
+    def take_buffered(self):
+        return _take_buffered(self)
+
+    def push_buffered(self, data):
+        self._frames.extend(self.decoder.feed(data))
+
+def encode_message(*fields):
+    """encode_message("SHOT", 3, 4) -> b"SHOT 3 4\\n"."""
+    return (" ".join(str(field) for field in fields) + "\n").encode()
+
+def _parse_coords(tokens):
+    if len(tokens) % 2 != 0:
+        raise ProtocolError("Lista de coordenadas impar")
+    values = [int(token) for token in tokens]
+    return [(values[i], values[i + 1]) for i in range(0, len(values), 2)]
+
+def _format_coords(coords):
+    return " ".join(f"{r} {c}" for r, c in coords)
+
+class Message:
+    """
+    Mensaje genérico: comando y tokens separados por espacios. Los que llegan en binario no traen
+    línea: raw y parts se arman con to_line() solo si alguien los pide (logs, mensajes de error).
+    """
+
+    __slots__ = ("_raw", "_parts", "command")
+
+    def __init__(self, raw, parts):
+        self._raw = raw
+        self._parts = parts
+        self.command = parts[0]
+        try:
+            self._parse(parts[1:])
+        except (IndexError, ValueError) as e:
+            raise ProtocolError(f"{self.command} malformado: {raw}") from e
+
+    def _parse(self, args):
+        pass
+
+    def to_line(self):
+        return self.command
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            self._raw = self.to_line()
+        return self._raw
+
+    @property
+    def parts(self):
+        if self._parts is None:
+            self._parts = self.raw.split()
+        return self._parts
+
+    @property
+    def args(self):
+        return self.parts[1:]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.raw!r})"
+
+class ShotMessage(Message):
+    """SHOT r c (2J y servidor -> objetivo) o SHOT objetivo r c (4J, cliente -> servidor)."""
+    __slots__ = ("target_id", "row", "col")
+
+    def _parse(self, args):
+        if len(args) >= 3:
+            self.target_id = args[0]
+            self.row, self.col = int(args[1]), int(args[2])
+        else:
+            self.target_id = None
+            self.row, self.col = int(args[0]), int(args[1])
+
+    def to_line(self):
+        target = "" if self.target_id is None else f"{self.target_id} "
+        return f"{self.command} {target}{self.row} {self.col}"
+
+class ResultMessage(Message):
+    """RESULT r c H|M, o INCOMING_SHOT r c H|M (disparo a mi tablero ya resuelto por el servidor)."""
+    __slots__ = ("row", "col", "result")
+
+    def _parse(self, args):
+        self.row, self.col, self.result = int(args[0]), int(args[1]), args[2]
+
+    def to_line(self):
+        return f"{self.command} {self.row} {self.col} {self.result}"
+
+class UpdateMessage(Message):
+    """UPDATE r c H|M (2J) o UPDATE jugador r c H|M (4J)."""
+    __slots__ = ("target_id", "row", "col", "result")
+
+    def _parse(self, args):
+        if len(args) >= 4:
+            self.target_id = args[0]
+            args = args[1:]
+        else:
+            self.target_id = None
+        self.row, self.col, self.result = int(args[0]), int(args[1]), args[2]
+
+    def to_line(self):
+        target = "" if self.target_id is None else f"{self.target_id} "
+        return f"{self.command} {target}{self.row} {self.col} {self.result}"
+
+class SunkShipMessage(Message):
+    """I_SUNK_MY_SHIP nombre r1 c1 r2 c2 ..."""
+    __slots__ = ("ship_name", "coords")
+
+    def _parse(self, args):
+        self.ship_name = args[0]
+        self.coords = _parse_coords(args[1:])
+
+    def to_line(self):
+        return f"{self.command} {self.ship_name} {_format_coords(self.coords)}"
+
+class OpponentShipSunkMessage(Message):
+    """OPPONENT_SHIP_SUNK nombre coords... (2J) u OPPONENT_SHIP_SUNK jugador nombre coords... (4J)."""
+    __slots__ = ("target_id", "ship_name", "coords")
+
+    def _parse(self, args):
+        # En 4J el primer token es un id de jugador (P1..P4); en 2J ya es el nombre del barco.
+        if len(args) % 2 == 0 and args[0][:1] == "P" and args[0][1:].isdigit():
+            self.target_id = args[0]
+            args = args[1:]
+        else:
+            self.target_id = None
+        self.ship_name = args[0]
+        self.coords = _parse_coords(args[1:])
+
+    def to_line(self):
+        target = "" if self.target_id is None else f"{self.target_id} "
+        return f"{self.command} {target}{self.ship_name} {_format_coords(self.coords)}"
+
+class PlayerIdMessage(Message):
+    """PLAYER_ID id [game_id]."""
+    __slots__ = ("player_id", "game_id")
+
+    def _parse(self, args):
+        self.player_id = args[0]
+        self.game_id = int(args[1]) if len(args) > 1 else None
+
+class WelcomeMessage(Message):
+    """
+    WELCOME id game_id modo equipo conectados máximo: todo lo que el servidor asigna al entrar, en una
+    línea (reemplaza a los dos PLAYER_ID). equipo es TeamA / TeamB en 4J y "-" en 2J.
+    """
+    __slots__ = ("player_id", "game_id", "mode", "team_id", "connected_players", "max_players")
+
+    def _parse(self, args):
+        self.player_id = args[0]
+        self.game_id = int(args[1])
+        self.mode = int(args[2])
+        self.team_id = None if args[3] == "-" else args[3]
+        self.connected_players = int(args[4])
+        self.max_players = int(args[5])
+
+    def to_line(self):
+        return (f"{self.command} {self.player_id} {self.game_id} {self.mode} {self.team_id or '-'} "
+                f"{self.connected_players} {self.max_players}")
+
+def encode_welcome(player_id, game_id, mode, team_id, connected_players, max_players):
+    return f"WELCOME {player_id} {game_id} {mode} {team_id or '-'} {connected_players} {max_players}\n".encode()
+
+class PlayerTurnMessage(Message):
+    """START_GAME jugador / TURN jugador."""
+    __slots__ = ("player_id",)
+
+    def _parse(self, args):
+        self.player_id = args[0]
+
+    def to_line(self):
+        return f"{self.command} {self.player_id}"
+
+class GameOverMessage(Message):
+    """GAME_OVER WIN|LOSE."""
+    __slots__ = ("won",)
+
+    def _parse(self, args):
+        self.won = args[0] == "WIN"
+
+    def to_line(self):
+        return f"{self.command} {'WIN' if self.won else 'LOSE'}"
+
+class TeamsInfoFinalMessage(Message):
+    """TEAMS_INFO_FINAL mi_equipo equipo_rival id_rival1 id_rival2."""
+    __slots__ = ("my_team_name", "opponent_team_name", "opponent_ids")
+
+    def _parse(self, args):
+        self.my_team_name = args[0].replace("_", " ")
+        self.opponent_team_name = args[1].replace("_", " ")
+        self.opponent_ids = list(args[2:])
+
+class BoardLayoutMessage(Message):
+    """
+    TEAM_BOARD_DATA / TEAM_BOARD con barcos "r c r c ...|Nombre|H;..." .
+    ships es una lista de (nombre, orientación, [(r, c), ...]).
+    """
+    __slots__ = ("payload", "ships")
+
+    def _parse(self, args):
+        self.payload = self.raw[len(self.command):].strip()
+        self.ships = parse_board_layout(self.payload)
+
+    def to_line(self):
+        return f"{self.command} {self.payload}"
+
+def parse_board_layout(payload):
+    ships = []
+    for ship_def in payload.split(";"):
+        ship_def = ship_def.strip()
+        if not ship_def:
+            continue
+        coords_part, name, orientation = ship_def.split("|")
+        ships.append((name, orientation, _parse_coords(coords_part.split())))
+    return ships
+
+def serialize_board_layout(ships):
+    """Inverso de parse_board_layout: [(nombre, orientación, coords)] -> payload de TEAM_BOARD_DATA."""
+    return ";".join(f"{_format_coords(coords)}|{name}|{orientation}" for name, orientation, coords in ships)
+
+def encode_lobby_entry(name, game_id, connected_players, max_players):
+    """Entrada de GAMES_LIST "nombre|id|conectados|max"; los separadores no pueden ir dentro del nombre."""
+    clean_name = str(name).replace("|", "").replace(";", "")
+    return f"{clean_name}|{game_id}|{connected_players}|{max_players}"
+
+def parse_lobby_entry(entry):
+    """Inverso de encode_lobby_entry, con las claves que usa el menú. Retorna None si la entrada no es válida."""
+    fields = entry.split("|")
+    if len(fields) < 4:
+        return None
+    try:
+        return {
+            "nombre_creador": fields[0],
+            "id": int(fields[1]),
+            "jugadores_conectados": int(fields[2]),
+            "max_jugadores": int(fields[3]),
+        }
+    except ValueError:
+        return None
+
+class GamesListMessage(Message):
+    """
+    GAMES_LIST entradas (sin versión), GAMES_LIST_V versión entradas o GAMES_LIST_UNCHANGED versión.
+    games es None en GAMES_LIST_UNCHANGED (el cliente conserva su lista) y version es None en GAMES_LIST.
+    """
+    __slots__ = ("version", "games")
+
+    def _parse(self, args):
+        payload = self.raw[len(self.command):].strip()
+        self.version = None
+        if self.command != "GAMES_LIST":
+            version_str, _, payload = payload.partition(" ")
+            self.version = int(version_str)
+        if self.command == "GAMES_LIST_UNCHANGED":
+            self.games = None
+            return
+        self.games = [game for game in (parse_lobby_entry(e) for e in payload.split(";") if e.strip()) if game]
+
+class LobbyDeltaMessage(Message):
+    """
+    Cambio del lobby para suscriptores: GAME_ADDED/GAME_UPDATED versión entrada, GAME_REMOVED versión id.
+    game es el diccionario de la entrada (None en GAME_REMOVED); game_id siempre está.
+    """
+    __slots__ = ("version", "game_id", "game")
+
+    def _parse(self, args):
+        self.version = int(args[0])
+        if self.command == "GAME_REMOVED":
+            self.game_id = int(args[1])
+            self.game = None
+            return
+        entry = self.raw.split(" ", 2)[2]
+        self.game = parse_lobby_entry(entry)
+        if self.game is None:
+            raise ValueError(entry)
+        self.game_id = self.game["id"]
+
+MESSAGE_TYPES = {
+    "SHOT": ShotMessage,
+    "RESULT": ResultMessage,
+    "INCOMING_SHOT": ResultMessage,
+    "UPDATE": UpdateMessage,
+    "I_SUNK_MY_SHIP": SunkShipMessage,
+    "OPPONENT_SHIP_SUNK": OpponentShipSunkMessage,
+    "PLAYER_ID": PlayerIdMessage,
+    "WELCOME": WelcomeMessage,
+    "START_GAME": PlayerTurnMessage,
+    "TURN": PlayerTurnMessage,
+    "GAME_OVER": GameOverMessage,
+    "TEAMS_INFO_FINAL": TeamsInfoFinalMessage,
+    "TEAM_BOARD_DATA": BoardLayoutMessage,
+    "TEAM_BOARD": BoardLayoutMessage,
+    "GAMES_LIST": GamesListMessage,
+    "GAMES_LIST_V": GamesListMessage,
+    "GAMES_LIST_UNCHANGED": GamesListMessage,
+    "GAME_ADDED": LobbyDeltaMessage,
+    "GAME_UPDATED": LobbyDeltaMessage,
+    "GAME_REMOVED": LobbyDeltaMessage,
+}
+
+def parse_message(line):
+    """
+    Convierte una línea (o una trama binaria, como bytes) en su mensaje tipado o Message genérico.
+    Lanza ProtocolError si está malformada.
+    """
+    if isinstance(line, bytes):
+        return decode_binary_frame(line)
+    parts = line.split()
+    if not parts:
+        raise ProtocolError("Mensaje vacío")
+    return MESSAGE_TYPES.get(parts[0], Message)(line, parts)
+
+# --- Formato binario ---
+
+BINARY_WIRE_FLAG = "+BIN" # Token de CREATE_GAME / JOIN_GAME con el que el cliente pide el formato binario
+BINARY_WIRE_ACK = b"WIRE BIN\n" # Confirmación del servidor; antes de ella todo es texto
+
+BINARY_TYPE_FIRST, BINARY_TYPE_LAST = 0x80, 0xBF # Bytes de continuación UTF-8: nunca empiezan una línea
+BINARY_TYPES = {
+    "SHOT": 0x81,
+    "RESULT": 0x82,
+    "INCOMING_SHOT": 0x83,
+    "UPDATE": 0x84,
+    "START_GAME": 0x85,
+    "TURN": 0x86,
+    "YOUR_TURN_AGAIN": 0x87,
+    "OPPONENT_TURN_MSG": 0x88,
+    "GAME_OVER": 0x89,
+    "I_SUNK_MY_SHIP": 0x8A,
+    "OPPONENT_SHIP_SUNK": 0x8B,
+    "TEAM_BOARD_DATA": 0x8C,
+    "TEAM_BOARD": 0x8D,
+}
+
+MASK_BYTES = (GRID_SIZE * GRID_SIZE + 7) // 8
+# Registros: tipo, largo de lo que sigue y los campos. Jugador: 1..4 (P1..P4), 0 si no hay; casilla:
+# r * GRID_SIZE + c; resultado: b"H" o b"M"; barco: índice en SHIPS_CONFIG (+0x80 si es vertical).
+_RECORD_EMPTY = struct.Struct("BB")                      # YOUR_TURN_AGAIN, OPPONENT_TURN_MSG
+_RECORD_ONE = struct.Struct("BBB")                       # START_GAME/TURN jugador, GAME_OVER ganó
+_RECORD_TWO = struct.Struct("BBBB")                      # SHOT objetivo casilla, RESULT/INCOMING_SHOT casilla resultado
+_RECORD_UPDATE = struct.Struct("BBBBB")                  # UPDATE objetivo casilla resultado
+_RECORD_SUNK = struct.Struct(f"BBBB{MASK_BYTES}s")       # *_SUNK objetivo barco máscara
+_RECORD_SHIP = struct.Struct(f"B{MASK_BYTES}s")          # Un barco de TEAM_BOARD(_DATA): barco máscara
+
+_PLAYER_IDS = (None, "P1", "P2", "P3", "P4")
+_PLAYER_BYTES = {player_id: i for i, player_id in enumerate(_PLAYER_IDS)}
+_CELLS = tuple(divmod(i, GRID_SIZE) for i in range(GRID_SIZE * GRID_SIZE))
+_RESULTS = {ord("H"): "H", ord("M"): "M"}
+_SHIP_NAMES = tuple(name for name, _ in SHIPS_CONFIG)
+_SHIP_INDEXES = {name: i for i, name in enumerate(_SHIP_NAMES)}
+_VERTICAL = 0x80
+
+class WireMessage(bytes):
+    """
+    Mensaje que se puede enviar en las dos formas: estos bytes son la línea de texto (con '\\n') y
+    .binary la trama binaria, o None si el contenido no entra en los registros (coordenadas fuera del
+    tablero, barcos o jugadores desconocidos). La trama se arma recién la primera vez que se pide.
+    Quien envía elige según lo negociado; los constructores de abajo con binary=False devuelven bytes
+    comunes, sin este envoltorio, para cuando ningún destinatario negoció el formato binario.
+    """
+
+    _binary = None
+    _binary_source = None # (f, *campos): f(*campos) arma la trama
+
+    @property
+    def binary(self):
+        source = self._binary_source
+        if source is not None: # Dos hilos pueden armarla a la vez: da lo mismo
+            self._binary = source[0](*source[1:])
+            self._binary_source = None
+        return self._binary
+
+def _wire_message(text, *binary_source):
+    """WireMessage con la línea text (str) y la trama que arma binary_source[0](*binary_source[1:])."""
+    message = WireMessage(text, "utf-8")
+    message._binary_source = binary_source
+    return message
+
+def _pack(record, frame_type, *fields):
+    if None in fields:
+        return None
+    return record.pack(frame_type, record.size - 2, *fields)
+
+def _player_byte(player_id):
+    return _PLAYER_BYTES.get(player_id)
+
+def _cell_byte(r, c):
+    if 0 <= r < GRID_SIZE and 0 <= c < GRID_SIZE:
+        return r * GRID_SIZE + c
+    return None
+
+def _result_byte(result):
+    return ord(result) if result in ("H", "M") else None
+
+def _ship_byte(name, orientation=None):
+    index = _SHIP_INDEXES.get(name)
+    if index is None or orientation not in (None, "H", "V"):
+        return None
+    return index | _VERTICAL if orientation == "V" else index
+
+def _mask_bytes(coords):
+    if not all(_cell_byte(r, c) is not None for r, c in coords):
+        return None
+    return coords_mask(coords).to_bytes(MASK_BYTES, "little")
+
+def _encode_shot(r, c, target_id):
+    return _pack(_RECORD_TWO, BINARY_TYPES["SHOT"], _player_byte(target_id), _cell_byte(r, c))
+
+def _encode_result(command, r, c, result):
+    return _pack(_RECORD_TWO, BINARY_TYPES[command], _cell_byte(r, c), _result_byte(result))
+
+def _encode_update(r, c, result, target_id):
+    return _pack(_RECORD_UPDATE, BINARY_TYPES["UPDATE"], _player_byte(target_id), _cell_byte(r, c), _result_byte(result))
+
+def _encode_turn(command, player_id):
+    return _pack(_RECORD_ONE, BINARY_TYPES[command], _player_byte(player_id))
+
+def _encode_sunk(command, ship_name, coords, target_id):
+    return _pack(_RECORD_SUNK, BINARY_TYPES[command], _player_byte(target_id), _ship_byte(ship_name), _mask_bytes(coords))
+
+def _encode_board(command, ships):
+    records = []
+    for name, orientation, coords in ships:
+        ship, mask = _ship_byte(name, orientation), _mask_bytes(coords)
+        if ship is None or mask is None:
+            return None
+        records.append(_RECORD_SHIP.pack(ship, mask))
+    body = b"".join(records)
+    if len(body) > 255:
+        return None
+    return bytes((BINARY_TYPES[command], len(body))) + body
+
+def shot_message(r, c, target_id=None, binary=True):
+    """SHOT r c, o SHOT objetivo r c (4J, cliente -> servidor)."""
+    text = f"SHOT {r} {c}\n" if target_id is None else f"SHOT {target_id} {r} {c}\n"
+    return _wire_message(text, _encode_shot, r, c, target_id) if binary else text.encode()
+
+def result_message(command, r, c, result, binary=True):
+    """RESULT r c H|M o INCOMING_SHOT r c H|M."""
+    text = f"{command} {r} {c} {result}\n"
+    return _wire_message(text, _encode_result, command, r, c, result) if binary else text.encode()
+
+def update_message(r, c, result, target_id=None, binary=True):
+    """UPDATE r c H|M (2J) o UPDATE objetivo r c H|M (4J)."""
+    text = f"UPDATE {r} {c} {result}\n" if target_id is None else f"UPDATE {target_id} {r} {c} {result}\n"
+    return _wire_message(text, _encode_update, r, c, result, target_id) if binary else text.encode()
+
+def turn_message(command, player_id, binary=True):
+    """START_GAME jugador o TURN jugador."""
+    text = f"{command} {player_id}\n"
+    return _wire_message(text, _encode_turn, command, player_id) if binary else text.encode()
+
+def sunk_message(command, ship_name, coords, target_id=None, binary=True):
+    """I_SUNK_MY_SHIP nombre coords... u OPPONENT_SHIP_SUNK [objetivo] nombre coords..."""
+    target = "" if target_id is None else f"{target_id} "
+    text = f"{command} {target}{ship_name} {_format_coords(coords)}\n"
+    return _wire_message(text, _encode_sunk, command, ship_name, coords, target_id) if binary else text.encode()
+
+def board_message(command, ships, payload=None, binary=True):
+    """TEAM_BOARD_DATA / TEAM_BOARD con ships = [(nombre, orientación, coords)] (y su payload de texto, si ya se tiene)."""
+    ships = list(ships)
+    if payload is None:
+        payload = serialize_board_layout(ships)
+    text = f"{command} {payload}\n"
+    return _wire_message(text, _encode_board, command, ships) if binary else text.encode()
+
+YOUR_TURN_AGAIN_MESSAGE = _wire_message("YOUR_TURN_AGAIN\n", _pack, _RECORD_EMPTY, BINARY_TYPES["YOUR_TURN_AGAIN"])
+OPPONENT_TURN_MESSAGE = _wire_message("OPPONENT_TURN_MSG\n", _pack, _RECORD_EMPTY, BINARY_TYPES["OPPONENT_TURN_MSG"])
+GAME_OVER_WIN_MESSAGE = _wire_message("GAME_OVER WIN\n", _pack, _RECORD_ONE, BINARY_TYPES["GAME_OVER"], 1)
+GAME_OVER_LOSE_MESSAGE = _wire_message("GAME_OVER LOSE\n", _pack, _RECORD_ONE, BINARY_TYPES["GAME_OVER"], 0)
+
+def _new_message(cls, command):
+    """Mensaje tipado sin línea de texto, para llenar sus campos desde una trama binaria."""
+    message = cls.__new__(cls)
+    message._raw = None
+    message._parts = None
+    message.command = command
+    return message
+
+def _decode_constant(command, frame):
+    return _new_message(Message, command)
+
+def _decode_shot(command, frame):
+    _, _, target, cell = _RECORD_TWO.unpack(frame)
+    message = _new_message(ShotMessage, command)
+    message.target_id = _PLAYER_IDS[target]
+    message.row, message.col = _CELLS[cell]
+    return message
+
+def _decode_result(command, frame):
+    _, _, cell, result = _RECORD_TWO.unpack(frame)
+    message = _new_message(ResultMessage, command)
+    message.row, message.col = _CELLS[cell]
+    message.result = _RESULTS[result]
+    return message
+
+def _decode_update(command, frame):
+    _, _, target, cell, result = _RECORD_UPDATE.unpack(frame)
+    message = _new_message(UpdateMessage, command)
+    message.target_id = _PLAYER_IDS[target]
+    message.row, message.col = _CELLS[cell]
+    message.result = _RESULTS[result]
+    return message
+
+def _decode_turn(command, frame):
+    _, _, player = _RECORD_ONE.unpack(frame)
+    message = _new_message(PlayerTurnMessage, command)
+    message.player_id = _PLAYER_IDS[player]
+    if message.player_id is None:
+        raise ValueError("Jugador vacío")
+    return message
+
+def _decode_game_over(command, frame):
+    message = _new_message(GameOverMessage, command)
+    message.won = _RECORD_ONE.unpack(frame)[2] == 1
+    return message
+
+def _decode_sunk(command, frame):
+    _, _, target, ship, mask = _RECORD_SUNK.unpack(frame)
+    message = _new_message(OpponentShipSunkMessage if command == "OPPONENT_SHIP_SUNK" else SunkShipMessage, command)
+    if command == "OPPONENT_SHIP_SUNK":
+        message.target_id = _PLAYER_IDS[target]
+    message.ship_name = _SHIP_NAMES[ship]
+    message.coords = mask_coords(int.from_bytes(mask, "little"))
+    return message
+
+def _decode_board(command, frame):
+    ships = []
+    for ship, mask in _RECORD_SHIP.iter_unpack(memoryview(frame)[2:]):
+        ships.append((_SHIP_NAMES[ship & ~_VERTICAL], "V" if ship & _VERTICAL else "H",
+                      mask_coords(int.from_bytes(mask, "little"))))
+    message = _new_message(BoardLayoutMessage, command)
+    message.ships = ships
+    message.payload = serialize_board_layout(ships)
+    return message
+
+_BINARY_DECODERS = {
+    BINARY_TYPES["SHOT"]: ("SHOT", _decode_shot),
+    BINARY_TYPES["RESULT"]: ("RESULT", _decode_result),
+    BINARY_TYPES["INCOMING_SHOT"]: ("INCOMING_SHOT", _decode_result),
+    BINARY_TYPES["UPDATE"]: ("UPDATE", _decode_update),
+    BINARY_TYPES["START_GAME"]: ("START_GAME", _decode_turn),
+    BINARY_TYPES["TURN"]: ("TURN", _decode_turn),
+    BINARY_TYPES["YOUR_TURN_AGAIN"]: ("YOUR_TURN_AGAIN", _decode_constant),
+    BINARY_TYPES["OPPONENT_TURN_MSG"]: ("OPPONENT_TURN_MSG", _decode_constant),
+    BINARY_TYPES["GAME_OVER"]: ("GAME_OVER", _decode_game_over),
+    BINARY_TYPES["I_SUNK_MY_SHIP"]: ("I_SUNK_MY_SHIP", _decode_sunk),
+    BINARY_TYPES["OPPONENT_SHIP_SUNK"]: ("OPPONENT_SHIP_SUNK", _decode_sunk),
+    BINARY_TYPES["TEAM_BOARD_DATA"]: ("TEAM_BOARD_DATA", _decode_board),
+    BINARY_TYPES["TEAM_BOARD"]: ("TEAM_BOARD", _decode_board),
+}
+
+def decode_binary_frame(frame):
+    """Trama binaria completa (tipo, largo y campos, como la entrega FrameDecoder) -> mensaje tipado."""
+    try:
+        command, decode = _BINARY_DECODERS[frame[0]]
+        return decode(command, frame)
+    except (KeyError, IndexError, ValueError, struct.error) as e:
+        raise ProtocolError(f"Trama binaria malformada: {frame.hex(' ')}") from e
@@ -1,25 +1,52 @@
 # server.py
+import argparse
+import ipaddress
+import json
+import os
+import select
+import signal
 import socket
+import sys
 import threading
 import time
 
+import logs
+import metrics
+import outbound
+import profiling
+import shards
+from board import Fleet, FleetError, in_bounds
+from lobby import LobbyIndex
+from protocol import (BINARY_WIRE_ACK, BINARY_WIRE_FLAG, GAME_OVER_LOSE_MESSAGE, GAME_OVER_WIN_MESSAGE,
+                      OPPONENT_TURN_MESSAGE, YOUR_TURN_AGAIN_MESSAGE, ProtocolError, SocketFrameReader, board_message,
+                      encode_lobby_entry, encode_welcome, parse_message, result_message, shot_message, sunk_message,
+                      turn_message, update_message)
+
+log = logs.get_logger("server")
+
 # Usar la IP del servidor 
 HOST = "172.23.43.50" # Asegurarse que sea la IP correcta del servidor
 PORT = 8000
 
+# Colas de salida por conexión (ver outbound.py). Configurables con --send-queue-size y --overflow-policy.
+SEND_QUEUE_MAX_MESSAGES = outbound.DEFAULT_MAX_QUEUED_MESSAGES
+SEND_QUEUE_OVERFLOW_POLICY = outbound.OVERFLOW_DROP
+
 # active_games almacenará el estado de todas las partidas activas.
 # La clave será el game_id, el valor será el diccionario del estado de la partida.
 active_games = {}
 games_list_lock = threading.RLock() # Lock para acceder/modificar active_games
-next_game_id = 1
+next_game_id = 1 # Número de la próxima partida de este proceso; el id lo arma shards.router
 game_id_lock = threading.Lock() # Lock para la generación segura de next_game_id
+lobby_index = LobbyIndex() # Partidas a las que se puede unir alguien, con el GAMES_LIST ya armado
 
 def get_new_game_id():
+    """Con --workers N cada worker usa sus propios ids y el dueño de una partida se deduce del id (ver shards.py)."""
     global next_game_id
     with game_id_lock:
-        new_id = next_game_id
+        sequence = next_game_id
         next_game_id += 1
-        return new_id
+    return shards.router.game_id(sequence)
     
 # Esta función crea la estructura inicial para una nueva partida.
 def create_new_game_state_template(requested_mode):
@@ -30,7 +57,7 @@ def create_new_game_state_template(requested_mode):
         "clients": {}, 
         "player_setup_complete": {}, 
         "game_active": False,
-        "turn_lock": threading.RLock(), # Lock específico para los turnos de esta partida
+        "turn_lock": metrics.TimedRLock("turn_lock"), # Lock específico para los turnos de esta partida (mide sus esperas)
         "current_turn_player_id": None,
         "turn_order": [],
         "current_turn_index": 0,
@@ -41,8 +68,19 @@ def create_new_game_state_template(requested_mode):
             "TeamB": {"name": None, "captain": "P3", "members": ["P3", "P4"]}
         },
         "last_shot_details": {},
-        "game_specific_lock": threading.RLock() # Lock para el estado general de esta partida
+        "fleets": {}, # Dueño de la flota (jugador en 2J, equipo en 4J) -> board.Fleet comprometida en TEAM_BOARD_DATA
+        "server_resolves_shots": False, # True si al empezar todas las flotas estaban comprometidas
+        "lobby_sequence": 0, # Número del último cambio de su entrada en el lobby reenviado al worker 0 (shards.py)
+        "binary_wire": False, # Algún jugador negoció el formato binario: solo entonces se arman protocol.WireMessage
+        "finished": False, # La partida empezó y ya terminó (por ganador o por abandono)
+        "last_shot_received_at": None, # perf_counter del último SHOT aceptado, para la latencia de turno
+        "game_specific_lock": metrics.TimedRLock("game_specific_lock"), # Lock para el estado general de esta partida
+        "readiness_listeners": [], # Callbacks del motor asyncio avisados en cada cambio de disponibilidad
+        "log": log # Logger de la partida: register_player lo reemplaza por uno con el game_id como contexto
     }
+    # Condición sobre el mismo lock de la partida: los hilos que esperan que la partida esté lista
+    # duermen en ella y se despiertan en cuanto un JOIN_GAME, TEAM_NAME_IS o una salida cambia el estado.
+    game_state["readiness_cond"] = threading.Condition(game_state["game_specific_lock"])
     if requested_mode == 2:
         game_state["player_setup_complete"] = {"P1": False, "P2": False}
     elif requested_mode == 4:
@@ -52,665 +90,1106 @@ def create_new_game_state_template(requested_mode):
         game_state["turn_order"] = ["P1", "P3", "P2", "P4"]
     return game_state
 
+# Tiempo máximo que un cliente esperará a que su partida esté lista (llena y con nombres de equipo).
+MAX_GLOBAL_WAIT_SECONDS = 180 # 3 minutos
+# Cada cuánto un cliente en espera comprueba si su propio socket se cerró. No interviene en la
+# disponibilidad de la partida, que se señaliza por evento.
+WAIT_LIVENESS_CHECK_SECONDS = 5
+
+def notify_game_readiness_changed(game_state_dict):
+    """Despierta a todos los clientes que esperan que esta partida esté globalmente lista."""
+    with game_state_dict["readiness_cond"]:
+        game_state_dict["readiness_cond"].notify_all()
+        listeners = list(game_state_dict["readiness_listeners"])
+    for listener in listeners:
+        listener()
+
+def add_readiness_listener(game_state_dict, listener):
+    with game_state_dict["game_specific_lock"]:
+        game_state_dict["readiness_listeners"].append(listener)
+
+def remove_readiness_listener(game_state_dict, listener):
+    with game_state_dict["game_specific_lock"]:
+        if listener in game_state_dict["readiness_listeners"]:
+            game_state_dict["readiness_listeners"].remove(listener)
+
+def is_peer_closed(conn):
+    """True si el cliente cerró su extremo. No consume datos ni bloquea."""
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+        if not readable:
+            return False
+        return conn.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
 # Función para obtener el team_id dentro del contexto de una partida específica
 def get_player_team_id_from_game(game_state_dict, player_id_in_game):
     return game_state_dict["player_teams"].get(player_id_in_game)
 
 
 # Modificar notify_players para que opere sobre una partida específica
+def collect_recipients(game_state_dict, target_player_ids=None, exclude_player_id=None):
+    """[(player_id, conn)] de los destinatarios (None: todos) que siguen conectados. Llamar con game_specific_lock tomado."""
+    if target_player_ids:
+        ids_to_notify = target_player_ids
+    else:
+        ids_to_notify = list(game_state_dict["clients"].keys())
+    recipients = []
+    for pid in ids_to_notify:
+        if pid == exclude_player_id:
+            continue
+        client_info = game_state_dict["clients"].get(pid)
+        if client_info and client_info.get('conn'):
+            recipients.append((pid, client_info['conn']))
+    return recipients
+
+def deliver_to_recipients(game_state_dict, message_bytes, recipients):
+    for pid, recipient_conn in recipients:
+        try:
+            recipient_conn.sendall(message_bytes)
+        except Exception as e:
+            game_state_dict["log"].error("Error notificando a %s: %s", pid, e)
+
 def notify_players_in_game(game_state_dict, message_bytes, target_player_ids=None, exclude_player_id=None):
+    """
+    Encola message_bytes en la cola de salida de cada destinatario. Bajo game_specific_lock solo se
+    toma la lista de conexiones; el encolado (que no bloquea) se hace con el lock ya liberado, así
+    un cliente lento no retiene la partida.
+    """
+    profiler = profiling.profiler
+    timer = profiler.timer_start() if profiler.active else None
+    with game_state_dict["game_specific_lock"]:
+        recipients = collect_recipients(game_state_dict, target_player_ids, exclude_player_id)
+    deliver_to_recipients(game_state_dict, message_bytes, recipients)
+    if timer is not None:
+        profiler.timer_stop("notify_players_in_game", timer)
+
+def get_fleet_owner(game_state_dict, player_id):
+    """Dueño de la flota de un jugador: él mismo en 2J, su equipo en 4J (los compañeros comparten tablero)."""
+    if game_state_dict["mode"] == 4:
+        return get_player_team_id_from_game(game_state_dict, player_id)
+    return player_id
 
-    # game_specific_lock debe usarse aquí para leer game_state_dict["clients"] de forma segura
+def get_fleet_owners(game_state_dict):
+    return ["TeamA", "TeamB"] if game_state_dict["mode"] == 4 else ["P1", "P2"]
+
+def send_outgoing(game_state_dict, outgoing):
+    """
+    Envía [(mensaje, destinatarios o None para todos)] armados mientras se tenía turn_lock. Como
+    notify_players_in_game con cada mensaje, pero tomando game_specific_lock una sola vez para todos
+    (el perfilado lo cuenta como una llamada a notify_players_in_game).
+    """
+    profiler = profiling.profiler
+    timer = profiler.timer_start() if profiler.active else None
     with game_state_dict["game_specific_lock"]:
-        ids_to_notify = []
-        if target_player_ids:
-            ids_to_notify = target_player_ids
+        deliveries = [(message_bytes, collect_recipients(game_state_dict, target_ids)) for message_bytes, target_ids in outgoing]
+    for message_bytes, recipients in deliveries:
+        deliver_to_recipients(game_state_dict, message_bytes, recipients)
+    if timer is not None:
+        profiler.timer_stop("notify_players_in_game", timer)
+
+def record_turn_latency(game_state_dict):
+    """Latencia de turno: desde que llegó el SHOT hasta que se encolaron los mensajes del turno siguiente."""
+    shot_received_at = game_state_dict["last_shot_received_at"]
+    if shot_received_at is not None:
+        game_state_dict["last_shot_received_at"] = None
+        metrics.registry.turn_latency.observe(time.perf_counter() - shot_received_at)
+
+def advance_turn_after_shot(game_state_dict, shooter_id, target_id, result_char):
+    """
+    Pasa el turno según el resultado de un disparo ya resuelto: con 'H' sigue el tirador.
+    Llamar con turn_lock tomado; retorna los mensajes de turno para send_outgoing (fuera del lock).
+    """
+    if game_state_dict["mode"] == 2:
+        next_player_id, waiting_player_id = (shooter_id, target_id) if result_char == 'H' else (target_id, shooter_id)
+        game_state_dict["current_turn_player_id"] = next_player_id
+        game_state_dict["log"].debug("Turno para %s", next_player_id)
+        return [(YOUR_TURN_AGAIN_MESSAGE, [next_player_id]), (OPPONENT_TURN_MESSAGE, [waiting_player_id])]
+
+    if result_char == 'H':
+        game_state_dict["current_turn_player_id"] = shooter_id
+    else: # Miss
+        game_state_dict["current_turn_index"] = (game_state_dict["current_turn_index"] + 1) % game_state_dict["max_players"]
+        game_state_dict["current_turn_player_id"] = game_state_dict["turn_order"][game_state_dict["current_turn_index"]]
+    game_state_dict["log"].debug("Turno para %s", game_state_dict["current_turn_player_id"])
+    return [(turn_message("TURN", game_state_dict["current_turn_player_id"], binary=game_state_dict["binary_wire"]), None)]
+
+def finish_game(game_state_dict, winner_id):
+    """Termina la partida y envía GAME_OVER WIN/LOSE a cada bando. Retorna False si ya había terminado."""
+    with game_state_dict["turn_lock"]:
+        if not game_state_dict.get("game_active"):
+            return False
+        game_state_dict["game_active"] = False
+        game_state_dict["finished"] = True
+        game_state_dict["current_turn_player_id"] = None
+    refresh_lobby_entry(game_state_dict)
+
+    if game_state_dict["mode"] == 2:
+        winners = [winner_id]
+        losers = ["P2" if winner_id == "P1" else "P1"]
+        game_state_dict["log"].info("Fin de juego. Ganador: %s, Perdedor: %s.", winner_id, losers[0])
+    else:
+        winning_team_id = get_player_team_id_from_game(game_state_dict, winner_id)
+        losing_team_id = "TeamB" if winning_team_id == "TeamA" else "TeamA"
+        with game_state_dict["game_specific_lock"]: # Para leer team_members_map
+            winners = list(game_state_dict["team_members_map"].get(winning_team_id, []))
+            losers = list(game_state_dict["team_members_map"].get(losing_team_id, []))
+        game_state_dict["log"].info("Fin de juego. Ganadores: Equipo %s. Perdedores: Equipo %s.", winning_team_id, losing_team_id)
+    notify_players_in_game(game_state_dict, GAME_OVER_WIN_MESSAGE, target_player_ids=winners)
+    notify_players_in_game(game_state_dict, GAME_OVER_LOSE_MESSAGE, target_player_ids=losers)
+    return True
+
+def resolve_shot(game_state_dict, shooter_id, target_id, r, c, conn):
+    """
+    SHOT en una partida con flotas comprometidas: el servidor resuelve el disparo sobre la flota del
+    objetivo y envía en un solo paso UPDATE, el hundimiento, el cambio de turno o el GAME_OVER.
+    2J: UPDATE r c H|M al tirador e INCOMING_SHOT r c H|M al objetivo. 4J: UPDATE objetivo r c H|M a todos.
+    """
+    binary = game_state_dict["binary_wire"]
+    with game_state_dict["turn_lock"]:
+        if not game_state_dict.get("game_active") or game_state_dict.get("current_turn_player_id") != shooter_id:
+            conn.sendall(b"MSG No es tu turno o juego no activo.\n")
+            return COMMAND_CONTINUE
+        fleet = game_state_dict["fleets"][get_fleet_owner(game_state_dict, target_id)]
+        if not in_bounds(r, c) or fleet.was_shot(r, c):
+            conn.sendall(b"MSG Casilla invalida o ya disparada. Sigue tu turno.\n")
+            return COMMAND_CONTINUE
+        result_char, sunk_ship, fleet_destroyed = fleet.fire(r, c)
+
+        if game_state_dict["mode"] == 2:
+            outgoing = [(update_message(r, c, result_char, binary=binary), [shooter_id]),
+                        (result_message("INCOMING_SHOT", r, c, result_char, binary), [target_id])]
         else:
-            ids_to_notify = list(game_state_dict["clients"].keys())
-        for pid in ids_to_notify:
-            if pid == exclude_player_id:
-                continue
-            client_info = game_state_dict["clients"].get(pid)
-            if client_info and client_info.get('conn'):
-                try:
-                    client_info['conn'].sendall(message_bytes)
-                except Exception as e:
-                    print(f"Error notificando a {pid} en partida {game_state_dict.get('game_id', 'N/A')}: {e}")
+            outgoing = [(update_message(r, c, result_char, target_id, binary), None)]
+        if not fleet_destroyed:
+            outgoing += advance_turn_after_shot(game_state_dict, shooter_id, target_id, result_char)
+    game_state_dict["log"].debug("[%s] disparo a %s en (%s,%s): %s", shooter_id, target_id, r, c, result_char)
+
+    if sunk_ship is not None:
+        if game_state_dict["mode"] == 2:
+            sunk_msg, sunk_targets = sunk_message("OPPONENT_SHIP_SUNK", sunk_ship.name, sunk_ship.coords, binary=binary), [shooter_id]
+        else:
+            with game_state_dict["game_specific_lock"]:
+                sunk_targets = list(game_state_dict["team_members_map"].get(get_player_team_id_from_game(game_state_dict, shooter_id), []))
+            sunk_msg = sunk_message("OPPONENT_SHIP_SUNK", sunk_ship.name, sunk_ship.coords, target_id, binary)
+        # El UPDATE del disparo va antes que el hundimiento, y este antes que el turno o el GAME_OVER
+        outgoing.insert(2 if game_state_dict["mode"] == 2 else 1, (sunk_msg, sunk_targets))
+
+    send_outgoing(game_state_dict, outgoing)
+    if fleet_destroyed:
+        return COMMAND_GAME_FINISHED if finish_game(game_state_dict, shooter_id) else COMMAND_CONTINUE
+    record_turn_latency(game_state_dict)
+    return COMMAND_CONTINUE
 
-def handle_client_connection(conn, addr):
+# Resultados de process_game_command: indican al motor (hilos o asyncio) qué hacer con la conexión.
+COMMAND_CONTINUE = "CONTINUE"   # Seguir leyendo mensajes
+COMMAND_STOP = "STOP"           # Terminar el bucle de mensajes de este jugador
+COMMAND_GAME_FINISHED = "GAME_FINISHED" # Partida terminada: terminar (la cola de salida envía los GAME_OVER antes de cerrar)
+
+def register_player(conn, addr, initial_msg):
+    """
+    Procesa CREATE_GAME / JOIN_GAME y registra al jugador en su partida.
+    Retorna (game_state, player_id, game_id) o None si la conexión fue rechazada (ya se notificó y cerró).
+    conn solo necesita sendall() y close(), por lo que sirve tanto para sockets como para el motor asyncio.
+    """
+    words = initial_msg.split()
+    parts = [part for part in words if part != BINARY_WIRE_FLAG] # El formato lo negocia start_binary_wire
+    wants_binary_wire = len(parts) < len(words)
+    command = parts[0] if parts else ""
+
+    requested_mode = 0
+    player_name_temp = None
     assigned_player_id = None
-    assigned_game_id = None
-    current_game_state_ref = None # Referencia al diccionario de la partida actual
+    current_game_state_ref = None
 
-    try:
-        conn.settimeout(10.0)
-        initial_data_bytes = conn.recv(1024)
-        conn.settimeout(None)
+    if command == "CREATE_GAME":
+        if len(parts) >= 2:
+            try:
+                requested_mode = int(parts[1])
+                if requested_mode not in [2, 4]: raise ValueError("Modo inválido")
+                if requested_mode == 2 and len(parts) >= 3:
+                    player_name_temp = " ".join(parts[2:]).replace("_", " ")
+            except ValueError:
+                log.warning("CREATE_GAME malformado de %s: %s", addr, initial_msg)
+                conn.sendall(b"MSG Error: Informacion inicial invalida.\n")
+                conn.close()
+                return None
+            assigned_game_id = get_new_game_id()
+            current_game_state_ref = create_new_game_state_template(requested_mode)
+            current_game_state_ref["game_id"] = assigned_game_id
+            current_game_state_ref["log"] = logs.game_logger(log, assigned_game_id)
+            current_game_state_ref["binary_wire"] = wants_binary_wire
+            assigned_player_id = "P1" # El creador es P1 en su partida
+            current_game_state_ref["clients"][assigned_player_id] = {'conn': conn, 'addr': addr, 'joined_at': time.monotonic()}
+            if requested_mode == 2:
+                current_game_state_ref["clients"][assigned_player_id]['name'] = player_name_temp if player_name_temp else f"Jugador {assigned_player_id}"
+            elif requested_mode == 4: # Asignar team_id al capitán P1
+                current_game_state_ref["clients"][assigned_player_id]['team_id'] = get_player_team_id_from_game(current_game_state_ref, assigned_player_id)
+
+            with games_list_lock:
+                active_games[assigned_game_id] = current_game_state_ref
+            refresh_lobby_entry(current_game_state_ref)
+
+            current_game_state_ref["log"].info("Jugador %s (%s) creó la partida (Modo %s).", assigned_player_id, addr, requested_mode)
+            return current_game_state_ref, assigned_player_id, assigned_game_id
 
-        if not initial_data_bytes:
-            print(f"Conexión de {addr} cerrada sin datos iniciales.")
+        conn.sendall(b"MSG Error: Comando CREATE_GAME incompleto.\n")
+        conn.close()
+        return None
+
+    if command == "JOIN_GAME":
+        if len(parts) < 3:
+            conn.sendall(b"MSG Error: Comando JOIN_GAME incompleto.\n")
             conn.close()
-            return
+            return None
+        try:
+            target_game_id = int(parts[1])
+            requested_mode = int(parts[2])
 
-        initial_msg = initial_data_bytes.decode().strip()
-        print(f"DEBUG SERVER: Mensaje inicial de {addr}: '{initial_msg}'")
-        parts = initial_msg.split()
-        command = parts[0]
+            if requested_mode not in [2, 4]: # Añadir validación
+                log.warning("JOIN_GAME modo inválido (%s) de %s: %s", requested_mode, addr, initial_msg)
+                conn.sendall(b"MSG Error: Modo para unirse invalido.\n")
+                conn.close()
+                return None
 
-        requested_mode = 0
-        player_name_temp = None
+            if len(parts) >= 4 and requested_mode == 2 :
+                 player_name_temp = " ".join(parts[3:]).replace("_", " ")
 
-        if command == "CREATE_GAME":
-            if len(parts) >= 2:
-                try:
-                    requested_mode = int(parts[1])
-                    if requested_mode not in [2, 4]: raise ValueError("Modo inválido")
-                    if requested_mode == 2 and len(parts) >= 3:
-                        player_name_temp = " ".join(parts[2:]).replace("_", " ")
-                except ValueError:
-                    print(f"ERROR SERVER: CREATE_GAME malformado de {addr}: {initial_msg}")
-                    conn.sendall(b"MSG Error: Informacion inicial invalida.\n")
-                    conn.close()
-                    return
-                assigned_game_id = get_new_game_id()
-                current_game_state_ref = create_new_game_state_template(requested_mode)
-                current_game_state_ref["game_id"] = assigned_game_id               
-                assigned_player_id = "P1" # El creador es P1 en su partida
-                current_game_state_ref["clients"][assigned_player_id] = {'conn': conn, 'addr': addr}
-                if requested_mode == 2:
-                    current_game_state_ref["clients"][assigned_player_id]['name'] = player_name_temp if player_name_temp else f"Jugador {assigned_player_id}"
-                elif requested_mode == 4: # Asignar team_id al capitán P1
-                    current_game_state_ref["clients"][assigned_player_id]['team_id'] = get_player_team_id_from_game(current_game_state_ref, assigned_player_id)
-
-                with games_list_lock:
-                    active_games[assigned_game_id] = current_game_state_ref
-                
-                print(f"INFO SERVER: Jugador {assigned_player_id} ({addr}) creó Partida ID: {assigned_game_id} (Modo {requested_mode}).")
-
-            else: 
-                conn.sendall(b"MSG Error: Comando CREATE_GAME incompleto.\n")
+        except ValueError:
+            log.warning("JOIN_GAME malformado de %s: %s", addr, initial_msg)
+            conn.sendall(b"MSG Error: Informacion para unirse invalida.\n")
+            conn.close()
+            return None
+
+        with games_list_lock: # Para buscar en active_games
+            if target_game_id not in active_games:
+                conn.sendall(b"MSG Error: Partida no encontrada.\n")
                 conn.close()
-                return
+                return None
+            current_game_state_ref = active_games[target_game_id]
 
-        elif command == "JOIN_GAME":
-            if len(parts) >= 3: 
-                try:
-                    target_game_id = int(parts[1])
-                    requested_mode = int(parts[2]) 
-                    
-                    if requested_mode not in [2, 4]: # Añadir validación
-                        print(f"ERROR SERVER: JOIN_GAME modo inválido ({requested_mode}) de {addr}: {initial_msg}")
-                        conn.sendall(b"MSG Error: Modo para unirse invalido.\n")
-                        conn.close()
-                        return
-                    
-                    if len(parts) >= 4 and requested_mode == 2 : 
-                         player_name_temp = " ".join(parts[3:]).replace("_", " ")
-
-                except ValueError:
-                    print(f"ERROR SERVER: JOIN_GAME malformado de {addr}: {initial_msg}")
-                    conn.sendall(b"MSG Error: Informacion para unirse invalida.\n")
-                    conn.close()
-                    return
+        #usar el lock específico de la partida para modificarla
+        with current_game_state_ref["game_specific_lock"]:
+            if len(current_game_state_ref["clients"]) >= current_game_state_ref["max_players"]:
+                conn.sendall(b"MSG Partida llena.\n")
+                conn.close()
+                return None
 
-                with games_list_lock: # Para buscar en active_games
-                    if target_game_id not in active_games:
-                        conn.sendall(b"MSG Error: Partida no encontrada.\n")
-                        conn.close()
-                        return
-                    current_game_state_ref = active_games[target_game_id]
-                
-                #usar el lock específico de la partida para modificarla
-                with current_game_state_ref["game_specific_lock"]:
-                    if len(current_game_state_ref["clients"]) >= current_game_state_ref["max_players"]:
-                        conn.sendall(b"MSG Partida llena.\n")
-                        conn.close()
-                        return 
-
-                    # Asignar Px al jugador que se une
-                    for i in range(1, current_game_state_ref["max_players"] + 1):
-                        pid_candidate = f"P{i}"
-                        if pid_candidate not in current_game_state_ref["clients"]:
-                            assigned_player_id = pid_candidate
-                            break
-                    
-                    if not assigned_player_id: 
-                        conn.sendall(b"MSG Error: No se pudo asignar ID en la partida.\n")
-                        conn.close()
-                        return
+            # Asignar Px al jugador que se une
+            for i in range(1, current_game_state_ref["max_players"] + 1):
+                pid_candidate = f"P{i}"
+                if pid_candidate not in current_game_state_ref["clients"]:
+                    assigned_player_id = pid_candidate
+                    break
 
-                    current_game_state_ref["clients"][assigned_player_id] = {'conn': conn, 'addr': addr}
-                    if current_game_state_ref["mode"] == 2:
-                        current_game_state_ref["clients"][assigned_player_id]['name'] = player_name_temp if player_name_temp else f"Jugador {assigned_player_id}"
-                    if current_game_state_ref["mode"] == 4:
-                        current_game_state_ref["clients"][assigned_player_id]['team_id'] = get_player_team_id_from_game(current_game_state_ref, assigned_player_id)
-                    
-                    assigned_game_id = target_game_id
-                    print(f"INFO SERVER: Jugador {assigned_player_id} ({addr}) se unió a Partida ID: {assigned_game_id}.")
-            else: 
-                conn.sendall(b"MSG Error: Comando JOIN_GAME incompleto.\n")
+            if not assigned_player_id:
+                conn.sendall(b"MSG Error: No se pudo asignar ID en la partida.\n")
                 conn.close()
-                return
+                return None
+
+            current_game_state_ref["clients"][assigned_player_id] = {'conn': conn, 'addr': addr, 'joined_at': time.monotonic()}
+            if wants_binary_wire:
+                current_game_state_ref["binary_wire"] = True
+            if current_game_state_ref["mode"] == 2:
+                current_game_state_ref["clients"][assigned_player_id]['name'] = player_name_temp if player_name_temp else f"Jugador {assigned_player_id}"
+            if current_game_state_ref["mode"] == 4:
+                current_game_state_ref["clients"][assigned_player_id]['team_id'] = get_player_team_id_from_game(current_game_state_ref, assigned_player_id)
+
+            refresh_lobby_entry(current_game_state_ref)
+            current_game_state_ref["log"].info("Jugador %s (%s) se unió a la partida.", assigned_player_id, addr)
+        notify_game_readiness_changed(current_game_state_ref)
+        return current_game_state_ref, assigned_player_id, target_game_id
+
+    log.warning("Mensaje inicial inesperado de %s: %s", addr, initial_msg)
+    conn.sendall(b"MSG Error: Protocolo inicial incorrecto.\n")
+    conn.close()
+    return None
+
+def start_binary_wire(conn, frame_reader, initial_msg):
+    """
+    Si el cliente pidió el formato binario (+BIN en CREATE_GAME / JOIN_GAME), acepta desde ya sus tramas
+    binarias y se lo confirma con WIRE BIN; a partir de ahí su cola de salida envía en binario los
+    mensajes que lo admiten. Llamar tras registrar al jugador y antes de enviarle nada más.
+    """
+    if BINARY_WIRE_FLAG not in initial_msg.split():
+        return False
+    frame_reader.decoder.allow_binary = True
+    conn.sendall(BINARY_WIRE_ACK)
+    conn.binary_wire = True
+    return True
+
+def send_welcome(game_state_dict, player_id, conn):
+    """
+    WELCOME al jugador recién registrado: su id, la partida, el modo, su equipo y cuántos hay ya en ella.
+    Un solo mensaje y sin pausas: lo que le sigue (REQUEST_TEAM_NAME, MSG de espera) puede llegarle en
+    el mismo segmento y el cliente lo procesa en orden.
+    """
+    with game_state_dict["game_specific_lock"]:
+        welcome = encode_welcome(player_id, game_state_dict["game_id"], game_state_dict["mode"],
+                                 get_player_team_id_from_game(game_state_dict, player_id),
+                                 len(game_state_dict["clients"]), game_state_dict["max_players"])
+    conn.sendall(welcome)
+
+def is_team_captain(game_state_dict, player_id):
+    return player_id == game_state_dict["team_details"]["TeamA"]["captain"] or \
+           player_id == game_state_dict["team_details"]["TeamB"]["captain"]
+
+def apply_team_name_message(game_state_dict, player_id, team_name_msg):
+    """Guarda el nombre de equipo recibido en un TEAM_NAME_IS del capitán."""
+    if not team_name_msg.startswith("TEAM_NAME_IS "):
+        return
+    team_name_payload = team_name_msg[len("TEAM_NAME_IS "):].strip()
+    if team_name_payload:
+        with game_state_dict["game_specific_lock"]:
+            player_team_id_for_name = game_state_dict["clients"][player_id].get('team_id', get_player_team_id_from_game(game_state_dict, player_id))
+
+            game_state_dict["team_details"][player_team_id_for_name]['name'] = team_name_payload
+        game_state_dict["log"].info("[%s] Nombre para %s establecido a '%s'.", player_id, player_team_id_for_name, team_name_payload)
+        refresh_lobby_entry(game_state_dict) # El lobby muestra el nombre del Equipo A
+        notify_game_readiness_changed(game_state_dict)
+
+def ensure_default_team_name(game_state_dict, player_id):
+    with game_state_dict["game_specific_lock"]:
+        player_team_id_check = game_state_dict["clients"][player_id].get('team_id', get_player_team_id_from_game(game_state_dict, player_id))
+        if not game_state_dict["team_details"][player_team_id_check]['name']:
+            default_team_name = f"Equipo_{player_team_id_check[-1]}"
+            game_state_dict["team_details"][player_team_id_check]['name'] = default_team_name
+            game_state_dict["log"].info("[%s] Usando nombre de equipo por defecto '%s' para %s.", player_id, default_team_name, player_team_id_check)
+            refresh_lobby_entry(game_state_dict)
+            notify_game_readiness_changed(game_state_dict)
+
+def is_game_globally_ready(game_state_dict):
+    """Partida llena y, en modo 4J, con los dos nombres de equipo. Llamar con game_specific_lock tomado."""
+    ready_check = (len(game_state_dict["clients"]) == game_state_dict["max_players"])
+    if game_state_dict["mode"] == 4:
+        all_team_names_set = game_state_dict["team_details"]["TeamA"]["name"] and \
+                             game_state_dict["team_details"]["TeamB"]["name"]
+        ready_check = ready_check and all_team_names_set
+    return bool(ready_check)
+
+def build_teams_info_final_message(game_state_dict, player_id):
+    my_team_id_final = game_state_dict["clients"][player_id]['team_id']
+    my_team_name_final = game_state_dict["team_details"][my_team_id_final]['name'] or f"Equipo_{my_team_id_final[-1]}"
+    opponent_team_id_final = "TeamB" if my_team_id_final == "TeamA" else "TeamA"
+    opponent_team_name_final = game_state_dict["team_details"][opponent_team_id_final]['name'] or f"Equipo_{opponent_team_id_final[-1]}"
+    opponent_member_ids = game_state_dict["team_members_map"].get(opponent_team_id_final, [])
+    opponent_ids_payload = " ".join(opponent_member_ids)
+    return f"TEAMS_INFO_FINAL {my_team_name_final.replace(' ', '_')} {opponent_team_name_final.replace(' ', '_')} {opponent_ids_payload}\n" #
+
+def send_setup_signal(game_state_dict, player_id, conn):
+    """
+    Envía OPPONENT_NAME / TEAMS_INFO_FINAL y SETUP_YOUR_BOARD cuando la partida está globalmente lista.
+    Retorna True si este cliente ya recibió su señal de configuración (se envía una sola vez).
+    """
+    with outbound.batched_sends(), game_state_dict["game_specific_lock"]:
+        if game_state_dict["clients"][player_id].get("setup_signal_sent"):
+            return True
+        # Determinar si este cliente es un "jugador de configuración" (P1/P2 para 2J, P1/P3 para 4J)
+        is_primary_setup_player = (game_state_dict["mode"] == 2) or \
+                                  (game_state_dict["mode"] == 4 and player_id in ("P1", "P3"))
+
+        if is_primary_setup_player:
+            # Enviar OPPONENT_NAME / TEAMS_INFO_FINAL primero
+            if game_state_dict["mode"] == 2:
+                other_id = "P2" if player_id == "P1" else "P1"
+                # Asegurar que el cliente other_id exista y tenga un nombre, o usar predeterminado
+                opponent_name = game_state_dict.get("clients", {}).get(other_id, {}).get('name', "Oponente")
+                conn.sendall(f"OPPONENT_NAME {opponent_name.replace(' ', '_')}\n".encode()) #
+            elif game_state_dict["mode"] == 4: # P1 o P3 (capitanes)
+                conn.sendall(build_teams_info_final_message(game_state_dict, player_id).encode())
+
+            conn.sendall(b"SETUP_YOUR_BOARD\n") #
+            game_state_dict["log"].debug("[%s] Enviado OPPONENT_NAME/TEAMS_INFO_FINAL y SETUP_YOUR_BOARD (partida globalmente lista).", player_id)
+        elif game_state_dict["mode"] == 4 and player_id in ("P2", "P4"):
+            # Jugadores no capitanes en modo 4J (P2, P4) necesitan TEAMS_INFO_FINAL y luego esperar TEAM_BOARD
+            conn.sendall(build_teams_info_final_message(game_state_dict, player_id).encode())
+            game_state_dict["log"].debug("[%s] Enviado TEAMS_INFO_FINAL. Esperando TEAM_BOARD del capitán.", player_id)
         else:
-            print(f"ERROR SERVER: Mensaje inicial inesperado de {addr}: {initial_msg}")
-            conn.sendall(b"MSG Error: Protocolo inicial incorrecto.\n")
-            conn.close()
+            return False
+        game_state_dict["clients"][player_id]["setup_signal_sent"] = True
+        joined_at = game_state_dict["clients"][player_id]["joined_at"]
+    metrics.registry.lobby_wait.observe(time.monotonic() - joined_at) # Desde CREATE/JOIN hasta la partida lista
+    return True
+
+def get_readiness_snapshot(game_state_dict, player_id):
+    """
+    Lee de una vez, con el lock de la partida, lo que necesita un cliente en espera.
+    Retorna (sigue_conectado, partida_lista, mensaje_de_espera).
+    """
+    with game_state_dict["game_specific_lock"]:
+        if player_id not in game_state_dict["clients"]:
+            return False, False, None
+        if is_game_globally_ready(game_state_dict):
+            return True, True, None
+        return True, False, build_wait_message(game_state_dict, len(game_state_dict["clients"]))
+
+def build_wait_message(game_state_dict, num_current_clients):
+    msg_parts = [f"MSG Esperando jugadores ({num_current_clients}/{game_state_dict['max_players']})"]
+    if game_state_dict["mode"] == 4:
+        # Acceder de forma segura a los nombres de los equipos para el mensaje de estado
+        with game_state_dict["game_specific_lock"]:
+             team_a_name_status = game_state_dict["team_details"]["TeamA"]["name"] or "Pendiente"
+             team_b_name_status = game_state_dict["team_details"]["TeamB"]["name"] or "Pendiente"
+        msg_parts.append(f". Nombres Equipo A: {team_a_name_status}, Equipo B: {team_b_name_status}")
+    return "".join(msg_parts)
+
+def process_game_command(current_game_state_ref, assigned_player_id, conn, message):
+    """
+    Procesa un mensaje (ya parseado con protocol.parse_message) del bucle principal de un jugador configurado.
+    Es común a los dos motores del servidor; retorna COMMAND_CONTINUE, COMMAND_STOP o COMMAND_GAME_FINISHED.
+    """
+    command = message.command
+
+    if command == "READY_SETUP":
+        game_log = current_game_state_ref["log"]
+        with current_game_state_ref["game_specific_lock"]:
+            can_send_ready = False
+            if current_game_state_ref["mode"] == 2: can_send_ready = True
+            elif current_game_state_ref["mode"] == 4 and assigned_player_id in ("P1", "P3"): can_send_ready = True
+
+            cond1_not_can_send = not can_send_ready
+            cond2_pid_not_in_setup = assigned_player_id not in current_game_state_ref.get("player_setup_complete", {})
+            cond3_game_active = current_game_state_ref.get("game_active", False)
+
+            if cond1_not_can_send or cond2_pid_not_in_setup or cond3_game_active:
+                game_log.debug("[%s] READY_SETUP ignorado -> not_can_send:%s, pid_not_in_setup:%s, game_active:%s",
+                               assigned_player_id, cond1_not_can_send, cond2_pid_not_in_setup, cond3_game_active)
+                return COMMAND_CONTINUE
+
+            current_game_state_ref["player_setup_complete"][assigned_player_id] = True
+
+            player_name_for_msg = current_game_state_ref.get("clients", {}).get(assigned_player_id, {}).get('name', assigned_player_id)
+            game_log.debug("[%s] Marcado como listo. player_setup_complete ahora es: %s", assigned_player_id, current_game_state_ref["player_setup_complete"])
+
+            if current_game_state_ref["mode"] == 2:
+                status_msg_for_other = f"MSG El jugador {player_name_for_msg} ha terminado.\n"
+                notify_players_in_game(current_game_state_ref, status_msg_for_other.encode(), exclude_player_id=assigned_player_id)
+            elif current_game_state_ref["mode"] == 4:
+                my_team_id_for_msg = get_player_team_id_from_game(current_game_state_ref, assigned_player_id)
+                my_team_name_for_msg = current_game_state_ref["team_details"].get(my_team_id_for_msg, {}).get('name', f"Equipo {my_team_id_for_msg}")
+                notify_players_in_game(
+                    current_game_state_ref,
+                    f"MSG El capitan del {my_team_name_for_msg} ({assigned_player_id}) ha terminado.\n".encode(),
+                    exclude_player_id=assigned_player_id
+                )
+            try:
+                conn.sendall(b"MSG Esperando que el oponente/otros terminen...\n")
+            except socket.error:
+                game_log.debug("[%s] Socket error al enviar 'MSG Esperando...' después de READY_SETUP. Terminando hilo.", assigned_player_id)
+                return COMMAND_STOP
+
+            all_set_up = False
+            if current_game_state_ref["mode"] == 2:
+                all_set_up = current_game_state_ref["player_setup_complete"].get("P1", False) and \
+                             current_game_state_ref["player_setup_complete"].get("P2", False)
+            elif current_game_state_ref["mode"] == 4:
+                all_set_up = current_game_state_ref["player_setup_complete"].get("P1", False) and \
+                             current_game_state_ref["player_setup_complete"].get("P3", False)
+
+            if all_set_up and not current_game_state_ref["game_active"]:
+                 game_log.debug("[%s] Todos listos y juego inactivo. Intentando iniciar juego.", assigned_player_id)
+
+                 with current_game_state_ref["turn_lock"]:
+                    if not current_game_state_ref["game_active"]: # Doble chequeo, crucial
+                        current_game_state_ref["game_active"] = True
+                        refresh_lobby_entry(current_game_state_ref)
+
+                        if current_game_state_ref["mode"] == 4:
+                            for team_leader, teammate in [("P1", "P2"), ("P3", "P4")]:
+                                # Si el hilo del compañero aún no le envió TEAMS_INFO_FINAL, se envía ahora, en el
+                                # mismo lote del comando: debe llegarle antes que TEAM_BOARD y START_GAME
+                                teammate_info = current_game_state_ref["clients"].get(teammate)
+                                if teammate_info and teammate_info.get('conn') and not teammate_info.get("setup_signal_sent"):
+                                    with current_game_state_ref["game_specific_lock"]: # El hilo del compañero puede estar enviándola
+                                        send_teams_info = not teammate_info.get("setup_signal_sent")
+                                        if send_teams_info:
+                                            teammate_info["setup_signal_sent"] = True
+                                            try:
+                                                teammate_info['conn'].sendall(build_teams_info_final_message(current_game_state_ref, teammate).encode())
+                                            except Exception as e_ti:
+                                                game_log.error("Error enviando TEAMS_INFO_FINAL a %s: %s", teammate, e_ti)
+                                    if send_teams_info:
+                                        metrics.registry.lobby_wait.observe(time.monotonic() - teammate_info["joined_at"])
+                                if team_leader in current_game_state_ref["clients"] and teammate in current_game_state_ref["clients"]:
+                                    leader_info = current_game_state_ref["clients"][team_leader]
+                                    board_to_send = leader_info.get('last_board')
+                                    if board_to_send:
+                                        teammate_conn_obj = current_game_state_ref["clients"][teammate].get('conn')
+                                        if teammate_conn_obj:
+                                            try:
+                                                teammate_conn_obj.sendall(board_message("TEAM_BOARD", board_to_send.ships, board_to_send.payload, current_game_state_ref["binary_wire"]))
+                                                game_log.debug("Enviado TEAM_BOARD de %s a %s", team_leader, teammate)
+                                            except Exception as e_tb:
+                                                game_log.error("Error enviando TEAM_BOARD a %s: %s", teammate, e_tb)
+
+                        if current_game_state_ref["mode"] == 2:
+                            current_game_state_ref["current_turn_player_id"] = "P1"
+                        elif current_game_state_ref["mode"] == 4:
+                            current_game_state_ref["current_turn_index"] = 0
+                            current_game_state_ref["current_turn_player_id"] = current_game_state_ref["turn_order"][0]
+                            current_game_state_ref["last_shot_details"].clear()
+
+                        # Si todos comprometieron su flota, el servidor resuelve los disparos; si no (clientes
+                        # antiguos), sigue reenviando SHOT al objetivo y esperando su RESULT como siempre.
+                        current_game_state_ref["server_resolves_shots"] = all(
+                            owner in current_game_state_ref["fleets"] for owner in get_fleet_owners(current_game_state_ref))
+                        if current_game_state_ref["server_resolves_shots"]:
+                            notify_players_in_game(current_game_state_ref, b"SERVER_RESOLVES_SHOTS\n")
+
+                        start_msg = turn_message("START_GAME", current_game_state_ref["current_turn_player_id"], current_game_state_ref["binary_wire"])
+                        notify_players_in_game(current_game_state_ref, start_msg)
+                        game_log.info("Juego iniciado. Turno para: %s", current_game_state_ref["current_turn_player_id"])
+                    else:
+                        game_log.debug("[%s] Juego YA ESTABA activo bajo turn_lock. No se reinicia.", assigned_player_id)
+
+    elif command == "TEAM_BOARD_DATA":
+        # Compromiso de la flota antes de READY_SETUP: cada jugador en 2J, los capitanes en 4J
+        if current_game_state_ref["mode"] == 2 or assigned_player_id in ("P1", "P3"):
+            try:
+                fleet = Fleet.from_layout(message.ships)
+            except FleetError as e:
+                current_game_state_ref["log"].warning("[%s] TEAM_BOARD_DATA rechazado: %s", assigned_player_id, e)
+                try: conn.sendall(b"MSG Disposicion de barcos invalida.\n"); return COMMAND_CONTINUE
+                except: return COMMAND_STOP
+            with current_game_state_ref["game_specific_lock"]:
+                if current_game_state_ref.get("game_active"):
+                    return COMMAND_CONTINUE # La flota no se puede cambiar con la partida en juego
+                current_game_state_ref["fleets"][get_fleet_owner(current_game_state_ref, assigned_player_id)] = fleet
+                if current_game_state_ref["mode"] == 4:
+                    current_game_state_ref["clients"][assigned_player_id]['last_board'] = message # BoardLayoutMessage: se reenvía tal cual en TEAM_BOARD
+            current_game_state_ref["log"].debug("[%s] Recibido TEAM_BOARD_DATA: %s barcos.", assigned_player_id, len(message.ships))
+
+    elif command == "SHOT":
+        if not current_game_state_ref.get("game_active") or current_game_state_ref.get("current_turn_player_id") != assigned_player_id:
+            try: conn.sendall(b"MSG No es tu turno o juego no activo.\n"); return COMMAND_CONTINUE
+            except: return COMMAND_STOP
+
+        current_game_state_ref["last_shot_received_at"] = time.perf_counter()
+        r, c = message.row, message.col
+        if current_game_state_ref["mode"] == 2:
+            target_opponent_id = "P2" if assigned_player_id == "P1" else "P1"
+            if current_game_state_ref["server_resolves_shots"]:
+                return resolve_shot(current_game_state_ref, assigned_player_id, target_opponent_id, r, c, conn)
+
+            notify_players_in_game(current_game_state_ref, shot_message(r, c, binary=current_game_state_ref["binary_wire"]), target_player_ids=[target_opponent_id])
+            current_game_state_ref["log"].debug("[%s] disparo a (%s,%s). Enviando al oponente.", assigned_player_id, r, c)
+
+        elif current_game_state_ref["mode"] == 4:
+            target_opponent_id_shot = message.target_id
+            if target_opponent_id_shot is None:
+                current_game_state_ref["log"].warning("[%s] SHOT malformado (4P) - %s", assigned_player_id, message.raw)
+                return COMMAND_CONTINUE
+
+            with current_game_state_ref["game_specific_lock"]: # Para leer team_id y last_shot_details
+                target_client_info = current_game_state_ref["clients"].get(target_opponent_id_shot)
+                if not target_client_info or get_player_team_id_from_game(current_game_state_ref, target_opponent_id_shot) == get_player_team_id_from_game(current_game_state_ref, assigned_player_id):
+                    try: conn.sendall(b"MSG Oponente invalido.\n"); return COMMAND_CONTINUE
+                    except: return COMMAND_STOP
+                current_game_state_ref["last_shot_details"][target_opponent_id_shot] = assigned_player_id
+            if current_game_state_ref["server_resolves_shots"]:
+                return resolve_shot(current_game_state_ref, assigned_player_id, target_opponent_id_shot, r, c, conn)
+
+            notify_players_in_game(current_game_state_ref, shot_message(r, c, binary=current_game_state_ref["binary_wire"]), target_player_ids=[target_opponent_id_shot])
+            current_game_state_ref["log"].debug("[%s] disparo a %s en (%s,%s)", assigned_player_id, target_opponent_id_shot, r, c)
+
+    elif command == "RESULT":
+        # Con flotas comprometidas el resultado lo calcula el servidor: se ignoran RESULT, I_SUNK_MY_SHIP y GAME_WON
+        if not current_game_state_ref.get("game_active") or current_game_state_ref["server_resolves_shots"]: return COMMAND_CONTINUE
+        r_res, c_res, result_char = message.row, message.col, message.result
+
+        if current_game_state_ref["mode"] == 2:
+            original_shooter_id = "P2" if assigned_player_id == "P1" else "P1"
+            # El UPDATE sale junto con el cambio de turno (un solo send_outgoing), o solo si el juego ya terminó
+            outgoing = [(update_message(r_res, c_res, result_char, binary=current_game_state_ref["binary_wire"]), [original_shooter_id])]
+            with current_game_state_ref["turn_lock"]:
+                game_still_active = current_game_state_ref.get("game_active") # Chequeo doble
+                if game_still_active:
+                    outgoing += advance_turn_after_shot(current_game_state_ref, original_shooter_id, assigned_player_id, result_char)
+            send_outgoing(current_game_state_ref, outgoing)
+            if game_still_active:
+                record_turn_latency(current_game_state_ref)
+
+        elif current_game_state_ref["mode"] == 4:
+            original_shooter_id = None
+            with current_game_state_ref["game_specific_lock"]: # Para leer last_shot_details
+                original_shooter_id = current_game_state_ref["last_shot_details"].get(assigned_player_id)
+
+            if not original_shooter_id or original_shooter_id not in current_game_state_ref.get("clients", {}):
+                return COMMAND_CONTINUE
+
+            outgoing = [(update_message(r_res, c_res, result_char, assigned_player_id, current_game_state_ref["binary_wire"]), None)]
+            with current_game_state_ref["turn_lock"]:
+                game_still_active = current_game_state_ref.get("game_active")
+                if game_still_active:
+                    outgoing += advance_turn_after_shot(current_game_state_ref, original_shooter_id, assigned_player_id, result_char)
+            send_outgoing(current_game_state_ref, outgoing)
+            current_game_state_ref["log"].debug("Enviado UPDATE a todos: UPDATE %s %s %s %s", assigned_player_id, r_res, c_res, result_char)
+            if game_still_active:
+                record_turn_latency(current_game_state_ref)
+
+    elif command == "I_SUNK_MY_SHIP":
+        if not current_game_state_ref.get("game_active") or current_game_state_ref["server_resolves_shots"]: return COMMAND_CONTINUE
+        try:
+            ship_name = message.ship_name
+
+            if current_game_state_ref["mode"] == 2:
+                shooter_player_id = "P2" if assigned_player_id == "P1" else "P1"
+                notify_players_in_game(current_game_state_ref, sunk_message("OPPONENT_SHIP_SUNK", ship_name, message.coords, binary=current_game_state_ref["binary_wire"]), target_player_ids=[shooter_player_id])
+
+            elif current_game_state_ref["mode"] == 4:
+                original_shooter_id_sunk = None
+                with current_game_state_ref["game_specific_lock"]: # Para leer last_shot_details
+                    original_shooter_id_sunk = current_game_state_ref["last_shot_details"].get(assigned_player_id)
+
+                if not original_shooter_id_sunk or original_shooter_id_sunk not in current_game_state_ref.get("clients",{}):
+                    return COMMAND_CONTINUE
+
+                shooter_team_id = get_player_team_id_from_game(current_game_state_ref, original_shooter_id_sunk)
+                if not shooter_team_id: return COMMAND_CONTINUE
+
+                members_to_notify_sunk = []
+                with current_game_state_ref["game_specific_lock"]:
+                    members_to_notify_sunk = current_game_state_ref["team_members_map"].get(shooter_team_id, [])
+
+                notify_players_in_game(current_game_state_ref, sunk_message("OPPONENT_SHIP_SUNK", ship_name, message.coords, assigned_player_id, current_game_state_ref["binary_wire"]), target_player_ids=members_to_notify_sunk)
+                current_game_state_ref["log"].debug("Notificado a equipo %s que hundieron %s de %s.", shooter_team_id, ship_name, assigned_player_id)
+
+        except Exception as e:
+            current_game_state_ref["log"].error("Error procesando I_SUNK_MY_SHIP: %s - Data: %s", e, message.raw)
+            return COMMAND_CONTINUE
+
+    elif command == "GAME_WON":
+        if current_game_state_ref["server_resolves_shots"]:
+            current_game_state_ref["log"].warning("[%s] GAME_WON ignorado, el servidor decide el fin de la partida.", assigned_player_id)
+        elif current_game_state_ref.get("game_active"):
+            if not finish_game(current_game_state_ref, assigned_player_id):
+                current_game_state_ref["log"].debug("[%s] GAME_WON pero juego ya inactivo en lock.", assigned_player_id)
+                return COMMAND_STOP # Salir del bucle de mensajes si el juego terminó por otra razón
+            return COMMAND_GAME_FINISHED
+        else:
+            current_game_state_ref["log"].warning("[%s] GAME_WON ignorado, juego no activo.", assigned_player_id)
+
+    return COMMAND_CONTINUE
+
+def dispatch_game_command(current_game_state_ref, assigned_player_id, conn, message):
+    """
+    process_game_command desde el bucle de mensajes de un motor; con el perfilado activo, medido por comando.
+    Lo que el comando envía sale al terminar, en una escritura por destinatario (outbound.batched_sends).
+    """
+    with outbound.batched_sends():
+        if profiling.profiler.active:
+            return profiling.profiler.run_command(message.command, process_game_command,
+                                                  current_game_state_ref, assigned_player_id, conn, message)
+        return process_game_command(current_game_state_ref, assigned_player_id, conn, message)
+
+def cleanup_player(assigned_game_id, assigned_player_id):
+    """Elimina al jugador de su partida, finaliza la partida si estaba activa y la borra si queda vacía."""
+    game_ended_by_this_dc = False
+    # Usar games_list_lock para leer active_games, y game_specific_lock para modificar la partida
+    with games_list_lock:
+        if assigned_game_id in active_games:
+            game_to_clean = active_games[assigned_game_id]
+            with game_to_clean["game_specific_lock"]:
+                if assigned_player_id in game_to_clean["clients"]:
+                    del game_to_clean["clients"][assigned_player_id]
+                    game_to_clean["log"].info("Jugador %s eliminado. Restantes: %s", assigned_player_id, list(game_to_clean["clients"]))
+
+                was_game_active_before_leaving = game_to_clean["game_active"]
+                if was_game_active_before_leaving:
+                     with game_to_clean["turn_lock"]: # Usar el turn_lock de la partida específica
+                        if game_to_clean["game_active"]:
+                            game_to_clean["game_active"] = False
+                            game_to_clean["finished"] = True
+                            game_to_clean["current_turn_player_id"] = None
+                            game_ended_by_this_dc = True
+
+                if game_ended_by_this_dc:
+                    game_to_clean["log"].info("Jugador %s se fue durante la partida activa.", assigned_player_id)
+
+            # Los demás jugadores en espera (y el lobby) deben ver el nuevo número de conectados
+            refresh_lobby_entry(game_to_clean)
+            notify_game_readiness_changed(game_to_clean)
+
+    # Re-chequear y eliminar si la partida está vacía, ahora con el lock apropiado
+    with games_list_lock:
+        if assigned_game_id in active_games and not active_games[assigned_game_id]["clients"]:
+            active_games[assigned_game_id]["log"].info("Partida vacía. Eliminando de active_games.")
+            publish_lobby_entry(active_games.pop(assigned_game_id))
+
+def make_send_queue(sock, addr):
+    return outbound.ThreadedOutboundQueue(sock, label=str(addr), max_messages=SEND_QUEUE_MAX_MESSAGES,
+                                          policy=SEND_QUEUE_OVERFLOW_POLICY)
+
+def hand_off_connection(conn, addr, fd, target_shard, initial_msg, buffered):
+    """
+    Pasa la conexión al worker que debe atenderla (ver shards.py). Si no se puede, avisa al cliente por
+    conn; en los dos casos quien llama solo tiene que cerrar su copia de la conexión.
+    """
+    try:
+        shards.router.hand_off(target_shard, fd, initial_msg, buffered)
+    except OSError as e:
+        log.error("No se pudo pasar la conexión de %s al worker %s: %s", addr, target_shard, e)
+        send_single_reply(conn, b"MSG Error: Servidor no disponible.\n")
+        return
+    metrics.registry.connection_handed_off()
+    log.debug("Conexión de %s (%r) pasada al worker %s.", addr, initial_msg, target_shard)
+
+def handle_client_connection(sock, addr, initial_msg=None, buffered=b""):
+    """initial_msg/buffered: conexión pasada por otro worker, que ya leyó el mensaje inicial (ver shards.py)."""
+    assigned_player_id = None
+    assigned_game_id = None
+    current_game_state_ref = {} # Referencia al diccionario de la partida actual
+    initial_player_info_processed = False
+
+    # Las lecturas van directo al socket; los envíos de un jugador pasan por la cola de salida de la
+    # conexión, que se crea solo cuando se sabe que no es una consulta del lobby.
+    frame_reader = SocketFrameReader(sock)
+    conn = None
+    metrics.registry.connection_opened()
+    outbound.set_tcp_nodelay(sock) # El motor asyncio ya lo hace en cada transporte TCP
+
+    try:
+        if initial_msg is None:
+            sock.settimeout(10.0)
+            # El menú antiguo envía LIST_GAMES sin '\n' y espera la respuesta sin cerrar su lado.
+            initial_msg = frame_reader.read_frame(unterminated_commands=("LIST_GAMES",))
+            sock.settimeout(None)
+        else:
+            frame_reader.push_buffered(buffered)
+
+        if not initial_msg:
+            log.debug("Conexión de %s cerrada sin datos iniciales.", addr)
+            return
+        target_shard = shards.router.route(initial_msg)
+        if target_shard is not None:
+            hand_off_connection(sock, addr, sock.fileno(), target_shard, initial_msg, frame_reader.take_buffered())
             return
+        metrics.registry.message_in(metrics.command_of(initial_msg))
 
-        # Enviar PLAYER_ID y GAME_ID al cliente
-        conn.sendall(f"PLAYER_ID {assigned_player_id} {assigned_game_id}\n".encode())
-        time.sleep(0.1)
+        if initial_msg.startswith("LIST_GAMES"):
+            log.debug("Recibida petición LIST_GAMES de %s.", addr)
+            handle_list_games_request(sock, initial_msg)
+            return
+
+        if initial_msg.startswith("STATS"):
+            log.debug("Recibida petición STATS de %s.", addr)
+            handle_stats_request(sock)
+            return
+
+        if initial_msg.startswith("PROFILE"):
+            send_single_reply(sock, build_profile_reply(addr, initial_msg))
+            return
+
+        if initial_msg.startswith("SUBSCRIBE_GAMES"):
+            log.debug("Suscripción al lobby de %s.", addr)
+            conn = make_send_queue(sock, addr)
+            serve_lobby_subscription(conn, initial_msg, frame_reader.read_frame)
+            return
+
+        conn = make_send_queue(sock, addr)
+        log.debug("Nueva conexión de juego de %s. Mensaje inicial: %r", addr, initial_msg)
+
+        registration = register_player(conn, addr, initial_msg)
+        if registration is None:
+            return
+        current_game_state_ref, assigned_player_id, assigned_game_id = registration
+        game_log = current_game_state_ref["log"]
+        with outbound.batched_sends(): # WIRE BIN y WELCOME en una escritura
+            start_binary_wire(conn, frame_reader, initial_msg)
+            send_welcome(current_game_state_ref, assigned_player_id, conn)
         initial_player_info_processed = True
-        conn.sendall(f"PLAYER_ID {assigned_player_id}\n".encode()) 
-        time.sleep(0.1)
 
         if current_game_state_ref["mode"] == 4:
-            player_client_info = current_game_state_ref["clients"][assigned_player_id] 
-            is_captain = (assigned_player_id == current_game_state_ref["team_details"]["TeamA"]["captain"] or \
-                          assigned_player_id == current_game_state_ref["team_details"]["TeamB"]["captain"]) 
-            if is_captain:
+            if is_team_captain(current_game_state_ref, assigned_player_id):
                 try:
-                    conn.sendall(b"REQUEST_TEAM_NAME\n") 
-                    print(f"DEBUG SERVER [{assigned_player_id}]: Enviado REQUEST_TEAM_NAME.")
-                    conn.settimeout(60.0)
-                    team_name_msg_bytes = conn.recv(1024) 
-                    conn.settimeout(None)
-                    if team_name_msg_bytes:
-                        team_name_msg = team_name_msg_bytes.decode().strip()
-                        if team_name_msg.startswith("TEAM_NAME_IS "): 
-                            team_name_payload = team_name_msg[len("TEAM_NAME_IS "):].strip() 
-                            if team_name_payload:
-                                with current_game_state_ref["game_specific_lock"]: 
-                                    player_team_id_for_name = current_game_state_ref["clients"][assigned_player_id].get('team_id', get_player_team_id_from_game(current_game_state_ref, assigned_player_id))
-
-                                    current_game_state_ref["team_details"][player_team_id_for_name]['name'] = team_name_payload 
-                                print(f"INFO SERVER [{assigned_player_id}]: Nombre para {player_team_id_for_name} establecido a '{team_name_payload}'.")
+                    conn.sendall(b"REQUEST_TEAM_NAME\n")
+                    game_log.debug("[%s] Enviado REQUEST_TEAM_NAME.", assigned_player_id)
+                    sock.settimeout(60.0)
+                    team_name_msg = frame_reader.read_frame()
+                    sock.settimeout(None)
+                    if team_name_msg:
+                        metrics.registry.message_in(metrics.command_of(team_name_msg))
+                        apply_team_name_message(current_game_state_ref, assigned_player_id, team_name_msg)
                 except socket.timeout:
-                    print(f"WARN SERVER [{assigned_player_id}]: Timeout esperando TEAM_NAME_IS.") 
+                    game_log.warning("[%s] Timeout esperando TEAM_NAME_IS.", assigned_player_id)
                 except Exception as e:
-                    print(f"ERROR SERVER [{assigned_player_id}]: Procesando TEAM_NAME_IS: {e}") 
-                
-                with current_game_state_ref["game_specific_lock"]: 
-                    player_team_id_check = current_game_state_ref["clients"][assigned_player_id].get('team_id', get_player_team_id_from_game(current_game_state_ref, assigned_player_id))
-                    if not current_game_state_ref["team_details"][player_team_id_check]['name']:
-                        default_team_name = f"Equipo_{player_team_id_check[-1]}" 
-                        current_game_state_ref["team_details"][player_team_id_check]['name'] = default_team_name 
-                        print(f"INFO SERVER [{assigned_player_id}]: Usando nombre de equipo por defecto '{default_team_name}' para {player_team_id_check}.")
+                    game_log.error("[%s] Procesando TEAM_NAME_IS: %s", assigned_player_id, e)
 
-        # ---Fase Consolidada de Espera y Señalización de Configuración ---
-        setup_signal_sent_to_this_client = False 
-        wait_for_global_readiness_loops = 0
-        #  Es el tiempo máximo que un cliente esperará si la partida nunca se llena.
-        MAX_GLOBAL_WAIT_LOOPS = 180 # 180 segundos (3 minutos)
+                ensure_default_team_name(current_game_state_ref, assigned_player_id)
 
-        while not setup_signal_sent_to_this_client and wait_for_global_readiness_loops < MAX_GLOBAL_WAIT_LOOPS:
-            game_is_globally_ready_now = False
-            num_current_clients = 0
-            is_this_client_still_connected = False 
+        # ---Fase Consolidada de Espera y Señalización de Configuración ---
+        # El hilo duerme en readiness_cond y se despierta en cuanto cambia la partida (unión, nombre de
+        # equipo o salida). Solo se envía un MSG de espera cuando su contenido cambia.
+        wait_deadline = time.monotonic() + MAX_GLOBAL_WAIT_SECONDS
+        last_wait_msg_sent = None
+        game_is_globally_ready_now = False
+        full_wait_msg = None
 
-            with current_game_state_ref["game_specific_lock"]:
-                if assigned_player_id not in current_game_state_ref["clients"]:
-                    print(f"DEBUG SERVER [{assigned_player_id}]: Cliente desconectado durante espera de disponibilidad global.")
-                    return 
-
-                is_this_client_still_connected = True 
-                num_current_clients = len(current_game_state_ref["clients"])
-                
-                # Verificar condición de disponibilidad global
-                ready_check = (num_current_clients == current_game_state_ref["max_players"])
-                if current_game_state_ref["mode"] == 4:
-                    all_team_names_set = current_game_state_ref["team_details"]["TeamA"]["name"] and \
-                                         current_game_state_ref["team_details"]["TeamB"]["name"]
-                    ready_check = ready_check and all_team_names_set
-                game_is_globally_ready_now = ready_check
+        while True:
+            with current_game_state_ref["readiness_cond"]:
+                still_connected, game_is_globally_ready_now, full_wait_msg = get_readiness_snapshot(current_game_state_ref, assigned_player_id)
+                if not still_connected:
+                    game_log.debug("[%s] Cliente desconectado durante espera de disponibilidad global.", assigned_player_id)
+                    return
+                if not game_is_globally_ready_now and full_wait_msg == last_wait_msg_sent:
+                    remaining_wait = wait_deadline - time.monotonic()
+                    if remaining_wait <= 0:
+                        break
+                    notified = current_game_state_ref["readiness_cond"].wait(min(remaining_wait, WAIT_LIVENESS_CHECK_SECONDS))
+                    if not notified and is_peer_closed(sock):
+                        game_log.debug("[%s] Cliente cerró la conexión durante espera de disponibilidad global.", assigned_player_id)
+                        return
+                    continue
 
             if game_is_globally_ready_now:
-                with current_game_state_ref["game_specific_lock"]: 
-                    # Determinar si este cliente es un "jugador de configuración" (P1/P2 para 2J, P1/P3 para 4J)
-                    is_primary_setup_player = (current_game_state_ref["mode"] == 2) or \
-                                              (current_game_state_ref["mode"] == 4 and assigned_player_id in ("P1", "P3"))
+                break
 
-                    if is_primary_setup_player:
-                        # Enviar OPPONENT_NAME / TEAMS_INFO_FINAL primero
-                        if current_game_state_ref["mode"] == 2:
-                            other_id = "P2" if assigned_player_id == "P1" else "P1"
-                            # Asegurar que el cliente other_id exista y tenga un nombre, o usar predeterminado
-                            opponent_name = current_game_state_ref.get("clients", {}).get(other_id, {}).get('name', "Oponente")
-                            conn.sendall(f"OPPONENT_NAME {opponent_name.replace(' ', '_')}\n".encode()) # 
-                        elif current_game_state_ref["mode"] == 4: # P1 o P3 (capitanes)
-                            my_team_id_final = current_game_state_ref["clients"][assigned_player_id]['team_id']
-                            my_team_name_final = current_game_state_ref["team_details"][my_team_id_final]['name'] or f"Equipo_{my_team_id_final[-1]}"
-                            opponent_team_id_final = "TeamB" if my_team_id_final == "TeamA" else "TeamA"
-                            opponent_team_name_final = current_game_state_ref["team_details"][opponent_team_id_final]['name'] or f"Equipo_{opponent_team_id_final[-1]}"
-                            opponent_member_ids = current_game_state_ref["team_members_map"].get(opponent_team_id_final, [])
-                            opponent_ids_payload = " ".join(opponent_member_ids)
-                            teams_info_final_msg = f"TEAMS_INFO_FINAL {my_team_name_final.replace(' ', '_')} {opponent_team_name_final.replace(' ', '_')} {opponent_ids_payload}\n" # 
-                            conn.sendall(teams_info_final_msg.encode())
-                        
-                        conn.sendall(b"SETUP_YOUR_BOARD\n") # 
-                        print(f"DEBUG SERVER [{assigned_player_id}]: Enviado OPPONENT_NAME/TEAMS_INFO_FINAL y SETUP_YOUR_BOARD (partida globalmente lista).")
-
-                        setup_signal_sent_to_this_client = True # Salir del bucle de espera de este manejador
-                    
-                    elif current_game_state_ref["mode"] == 4 and assigned_player_id in ("P2", "P4"):
-                        # Jugadores no capitanes en modo 4J (P2, P4) necesitan TEAMS_INFO_FINAL y luego esperar TEAM_BOARD
-                        my_team_id_final = current_game_state_ref["clients"][assigned_player_id]['team_id']
-                        my_team_name_final = current_game_state_ref["team_details"][my_team_id_final]['name'] or f"Equipo_{my_team_id_final[-1]}"
-                        opponent_team_id_final = "TeamB" if my_team_id_final == "TeamA" else "TeamA"
-                        opponent_team_name_final = current_game_state_ref["team_details"][opponent_team_id_final]['name'] or f"Equipo_{opponent_team_id_final[-1]}"
-                        opponent_member_ids = current_game_state_ref["team_members_map"].get(opponent_team_id_final, [])
-                        opponent_ids_payload = " ".join(opponent_member_ids)
-                        teams_info_final_msg = f"TEAMS_INFO_FINAL {my_team_name_final.replace(' ', '_')} {opponent_team_name_final.replace(' ', '_')} {opponent_ids_payload}\n" # 
-                        conn.sendall(teams_info_final_msg.encode())
-                        print(f"DEBUG SERVER [{assigned_player_id}]: Enviado TEAMS_INFO_FINAL. Esperando TEAM_BOARD del capitán.")
-                       
-                        setup_signal_sent_to_this_client = True 
-            else:
-                # La partida aún no está globalmente lista. Enviar un mensaje de espera.
-                msg_parts = [f"MSG Esperando jugadores ({num_current_clients}/{current_game_state_ref['max_players']})"]
-                if current_game_state_ref["mode"] == 4:
-                    # Acceder de forma segura a los nombres de los equipos para el mensaje de estado
-                    team_a_name_status = "Pendiente"
-                    team_b_name_status = "Pendiente"
-                    with current_game_state_ref["game_specific_lock"]:
-                         team_a_name_status = current_game_state_ref["team_details"]["TeamA"]["name"] or "Pendiente"
-                         team_b_name_status = current_game_state_ref["team_details"]["TeamB"]["name"] or "Pendiente"
-                    msg_parts.append(f". Nombres Equipo A: {team_a_name_status}, Equipo B: {team_b_name_status}")
-                
-                full_wait_msg = "".join(msg_parts)          
-                
-                if wait_for_global_readiness_loops % 5 == 0 or wait_for_global_readiness_loops == 0:
-                    try:
-                        conn.sendall(f"{full_wait_msg}\n".encode()) # 
-                    except socket.error:
-                        print(f"DEBUG SERVER [{assigned_player_id}]: Error de socket durante envío de espera global. Cliente probablemente desconectado.")
-                        return 
-                
-                wait_for_global_readiness_loops += 1
-                time.sleep(1) 
-        # Después del bucle:
-        if not is_this_client_still_connected: # Doble verificación por si el cliente se desconectó
-             return 
-
-        if not setup_signal_sent_to_this_client and wait_for_global_readiness_loops >= MAX_GLOBAL_WAIT_LOOPS:
-            # Si llegamos aquí, significa que el cliente esperó demasiado tiempo sin que la partida estuviera lista.    
-            print(f"ERROR SERVER [{assigned_player_id}]: Timeout global ({MAX_GLOBAL_WAIT_LOOPS}s) esperando que la partida esté lista. ({num_current_clients}/{current_game_state_ref['max_players']}).")
+            # La partida aún no está globalmente lista. Enviar el mensaje de espera actualizado.
+            try:
+                conn.sendall(f"{full_wait_msg}\n".encode()) #
+            except socket.error:
+                game_log.debug("[%s] Error de socket durante envío de espera global. Cliente probablemente desconectado.", assigned_player_id)
+                return
+            last_wait_msg_sent = full_wait_msg
+
+        if not game_is_globally_ready_now:
+            # Si llegamos aquí, significa que el cliente esperó demasiado tiempo sin que la partida estuviera lista.
+            game_log.warning("[%s] Timeout global (%ss) esperando que la partida esté lista. %s", assigned_player_id, MAX_GLOBAL_WAIT_SECONDS, full_wait_msg)
             try:
                 conn.sendall(b"MSG Error: Timeout esperando que la partida este completamente lista. Desconectando.\n")
             except socket.error:
                 pass # El cliente podría haberse ido ya
             # El bloque finally de handle_client_connection se encargará de la limpieza.
-            return 
-        
-        print(f"DEBUG SERVER [{assigned_player_id}]: Finalizada fase de espera global. Procediendo al bucle principal de mensajes.")
-     
-        while True:
-            data_bytes = conn.recv(1024) 
-            if not data_bytes:
-                print(f"Jugador {assigned_player_id} desconectado (recv vacío).") 
-                break
-            
-            data_decoded_full_message = data_bytes.decode()
-            messages_received = data_decoded_full_message.split('\n') 
+            return
 
-            for data_single_message in messages_received:
-                data = data_single_message.strip() 
-                if not data: 
-                    continue
+        send_setup_signal(current_game_state_ref, assigned_player_id, conn)
 
-                # Mantener los logs de depuración 
-                print(f"DEBUG SERVER [{assigned_player_id}]: Datos: '{data}'")
-                parts = data.split() 
-                if not parts: continue
-                command = parts[0] 
-
-                if command == "READY_SETUP": 
-                    print(f"DEBUG SERVER [{assigned_player_id}]: Entrando en procesar READY_SETUP. game_active actual: {current_game_state_ref.get('game_active')}")
-                    with current_game_state_ref["game_specific_lock"]: 
-                        print(f"DEBUG SERVER [{assigned_player_id}]: READY_SETUP - current_game_state_ref adquirido.")
-                        can_send_ready = False
-                        if current_game_state_ref["mode"] == 2: can_send_ready = True
-                        elif current_game_state_ref["mode"] == 4 and assigned_player_id in ("P1", "P3"): can_send_ready = True
-
-                        cond1_not_can_send = not can_send_ready
-                        cond2_pid_not_in_setup = assigned_player_id not in current_game_state_ref.get("player_setup_complete", {})
-                        cond3_game_active = current_game_state_ref.get("game_active", False) 
-                        
-                        print(f"DEBUG SERVER [{assigned_player_id}]: READY_SETUP validación -> not_can_send:{cond1_not_can_send}, pid_not_in_setup:{cond2_pid_not_in_setup}, game_active:{cond3_game_active}")
-
-                        if cond1_not_can_send or cond2_pid_not_in_setup or cond3_game_active: 
-                            print(f"DEBUG SERVER [{assigned_player_id}]: READY_SETUP ignorado debido a condiciones de validación.")
-                            continue
-                        
-                        print(f"DEBUG SERVER [{assigned_player_id}]: READY_SETUP - Validación pasada. Procediendo a marcar como listo.")
-                        current_game_state_ref["player_setup_complete"][assigned_player_id] = True 
-                        
-                        player_name_for_msg = current_game_state_ref.get("clients", {}).get(assigned_player_id, {}).get('name', assigned_player_id)
-                        print(f"DEBUG SERVER [{assigned_player_id}]: Marcado como listo. player_setup_complete ahora es: {current_game_state_ref['player_setup_complete']}")
-                        
-                        if current_game_state_ref["mode"] == 2:
-                            status_msg_for_other = f"MSG El jugador {player_name_for_msg} ha terminado.\n" 
-                            notify_players_in_game(current_game_state_ref, status_msg_for_other.encode(), exclude_player_id=assigned_player_id)
-                        elif current_game_state_ref["mode"] == 4:
-                            my_team_id_for_msg = get_player_team_id_from_game(current_game_state_ref, assigned_player_id) 
-                            my_team_name_for_msg = current_game_state_ref["team_details"].get(my_team_id_for_msg, {}).get('name', f"Equipo {my_team_id_for_msg}") 
-                            notify_players_in_game(
-                                current_game_state_ref, 
-                                f"MSG El capitan del {my_team_name_for_msg} ({assigned_player_id}) ha terminado.\n".encode(),
-                                exclude_player_id=assigned_player_id 
-                            )
-                        try:
-                            conn.sendall(b"MSG Esperando que el oponente/otros terminen...\n") 
-                        except socket.error: 
-                            print(f"DEBUG SERVER [{assigned_player_id}]: Socket error al enviar 'MSG Esperando...' después de READY_SETUP. Terminando hilo.")
-                            break 
-
-                        all_set_up = False
-                        if current_game_state_ref["mode"] == 2:
-                            all_set_up = current_game_state_ref["player_setup_complete"].get("P1", False) and \
-                                         current_game_state_ref["player_setup_complete"].get("P2", False) 
-                        elif current_game_state_ref["mode"] == 4:
-                            all_set_up = current_game_state_ref["player_setup_complete"].get("P1", False) and \
-                                         current_game_state_ref["player_setup_complete"].get("P3", False) 
-                        
-                        print(f"DEBUG SERVER [{assigned_player_id}]: Chequeo all_set_up: {all_set_up}. game_active: {current_game_state_ref['game_active']}")
-                        if all_set_up and not current_game_state_ref["game_active"]: 
-                             print(f"DEBUG SERVER [{assigned_player_id}]: all_set_up es True y game_active es False. Intentando iniciar juego.")
-                             
-                             with current_game_state_ref["turn_lock"]: 
-                                if not current_game_state_ref["game_active"]: # Doble chequeo, crucial
-                                    current_game_state_ref["game_active"] = True 
-                                    
-                                    if current_game_state_ref["mode"] == 4: 
-                                        for team_leader, teammate in [("P1", "P2"), ("P3", "P4")]: 
-                                            if team_leader in current_game_state_ref["clients"] and teammate in current_game_state_ref["clients"]:
-                                                leader_info = current_game_state_ref["clients"][team_leader]
-                                                board_to_send = leader_info.get('last_board') 
-                                                if board_to_send:
-                                                    teammate_conn_obj = current_game_state_ref["clients"][teammate].get('conn')
-                                                    if teammate_conn_obj:
-                                                        try:
-                                                            teammate_conn_obj.sendall(f"TEAM_BOARD {board_to_send}\n".encode()) 
-                                                            print(f"DEBUG SERVER: Enviado TEAM_BOARD de {team_leader} a {teammate}")
-                                                        except Exception as e_tb:
-                                                            print(f"Error enviando TEAM_BOARD a {teammate}: {e_tb}")
-
-                                    if current_game_state_ref["mode"] == 2:
-                                        current_game_state_ref["current_turn_player_id"] = "P1" 
-                                    elif current_game_state_ref["mode"] == 4:
-                                        current_game_state_ref["current_turn_index"] = 0 
-                                        current_game_state_ref["current_turn_player_id"] = current_game_state_ref["turn_order"][0] 
-                                        current_game_state_ref["last_shot_details"].clear() 
-
-                                    start_msg = f"START_GAME {current_game_state_ref['current_turn_player_id']}\n".encode() 
-                                    notify_players_in_game(current_game_state_ref, start_msg) 
-                                    print(f"INFO SERVER: Juego iniciado. Turno para: {current_game_state_ref['current_turn_player_id']}")
-                                else: 
-                                    print(f"DEBUG SERVER [{assigned_player_id}]: Juego YA ESTABA activo bajo turn_lock. No se reinicia.")
-                       
-                elif command == "TEAM_BOARD_DATA": 
-                    if current_game_state_ref["mode"] == 4 and assigned_player_id in ("P1", "P3"):
-                        with current_game_state_ref["game_specific_lock"]: 
-                            board_payload = " ".join(parts[1:]) 
-                            current_game_state_ref["clients"][assigned_player_id]['last_board'] = board_payload.strip() 
-                        print(f"DEBUG [{assigned_player_id}]: Recibido TEAM_BOARD_DATA. Length: {len(board_payload)}")
-                   
-                elif command == "SHOT": 
-                    if not current_game_state_ref.get("game_active") or current_game_state_ref.get("current_turn_player_id") != assigned_player_id:
-                        try: conn.sendall(b"MSG No es tu turno o juego no activo.\n"); continue
-                        except: break
-                    
-                    if current_game_state_ref["mode"] == 2:
-                        try:
-                            r, c = parts[1], parts[2]
-                            target_opponent_id = "P2" if assigned_player_id == "P1" else "P1"
-                            
-                            notify_players_in_game(current_game_state_ref, f"SHOT {r} {c}\n".encode(), target_player_ids=[target_opponent_id])
-                            print(f"[{assigned_player_id}] disparo a ({r},{c}). Enviando al oponente.")
-                        except IndexError:
-                             print(f"ERROR [{assigned_player_id}]: SHOT malformado (2P) - {data}")
-                             continue 
-                    
-                    elif current_game_state_ref["mode"] == 4:
-                        try:
-                            target_opponent_id_shot = parts[1]
-                            r, c = parts[2], parts[3]
-                            
-                            with current_game_state_ref["game_specific_lock"]: # Para leer team_id y last_shot_details
-                                target_client_info = current_game_state_ref["clients"].get(target_opponent_id_shot)
-                                if not target_client_info or get_player_team_id_from_game(current_game_state_ref, target_opponent_id_shot) == get_player_team_id_from_game(current_game_state_ref, assigned_player_id):
-                                    try: conn.sendall(b"MSG Oponente invalido.\n"); continue
-                                    except: break
-                                current_game_state_ref["last_shot_details"][target_opponent_id_shot] = assigned_player_id
-                            
-                            notify_players_in_game(current_game_state_ref, f"SHOT {r} {c}\n".encode(), target_player_ids=[target_opponent_id_shot])
-                            print(f"DEBUG [{assigned_player_id}]: {assigned_player_id} disparo a {target_opponent_id_shot} en ({r},{c})")
-                        except IndexError:
-                            print(f"ERROR [{assigned_player_id}]: SHOT malformado (4P) - {data}")
-                            continue
-                
-                elif command == "RESULT": 
-                    if not current_game_state_ref.get("game_active"): continue
-                    try:
-                        r_res, c_res, result_char = parts[1], parts[2], parts[3]
-                    except IndexError:
-                        print(f"ERROR [{assigned_player_id}]: RESULT malformado - {data}")
-                        continue
-
-                    if current_game_state_ref["mode"] == 2:
-                        original_shooter_id = "P2" if assigned_player_id == "P1" else "P1"
-                        notify_players_in_game(current_game_state_ref, f"UPDATE {r_res} {c_res} {result_char}\n".encode(), target_player_ids=[original_shooter_id])
-                        
-                        with current_game_state_ref["turn_lock"]:
-                            if not current_game_state_ref.get("game_active"): continue # Chequeo doble
-                            if result_char == 'H':
-                                current_game_state_ref["current_turn_player_id"] = original_shooter_id
-                                notify_players_in_game(current_game_state_ref, b"YOUR_TURN_AGAIN\n", target_player_ids=[original_shooter_id])
-                                notify_players_in_game(current_game_state_ref, b"OPPONENT_TURN_MSG\n", target_player_ids=[assigned_player_id])
-                            else: 
-                                current_game_state_ref["current_turn_player_id"] = assigned_player_id
-                                notify_players_in_game(current_game_state_ref, b"YOUR_TURN_AGAIN\n", target_player_ids=[assigned_player_id])
-                                notify_players_in_game(current_game_state_ref, b"OPPONENT_TURN_MSG\n", target_player_ids=[original_shooter_id])
-                            print(f"INFO SERVER (2P): Turno para {current_game_state_ref['current_turn_player_id']}")
-                    
-                    elif current_game_state_ref["mode"] == 4:
-                        original_shooter_id = None
-                        with current_game_state_ref["game_specific_lock"]: # Para leer last_shot_details
-                            original_shooter_id = current_game_state_ref["last_shot_details"].get(assigned_player_id)
-                        
-                        if not original_shooter_id or original_shooter_id not in current_game_state_ref.get("clients", {}):
-                            continue
-                        
-                        notify_players_in_game(current_game_state_ref, f"UPDATE {assigned_player_id} {r_res} {c_res} {result_char}\n".encode())
-                        print(f"DEBUG SERVER (4P): Enviado UPDATE a todos: {f'UPDATE {assigned_player_id} {r_res} {c_res} {result_char}'}")
-
-                        with current_game_state_ref["turn_lock"]:
-                            if not current_game_state_ref.get("game_active"): continue
-                            if result_char == 'H':
-                                current_game_state_ref["current_turn_player_id"] = original_shooter_id
-                            else: # Miss
-                                current_game_state_ref["current_turn_index"] = (current_game_state_ref["current_turn_index"] + 1) % current_game_state_ref["max_players"]
-                                current_game_state_ref["current_turn_player_id"] = current_game_state_ref["turn_order"][current_game_state_ref["current_turn_index"]]
-                            
-                            notify_players_in_game(current_game_state_ref, f"TURN {current_game_state_ref['current_turn_player_id']}\n".encode())
-                            print(f"INFO SERVER (4P): Turno para {current_game_state_ref['current_turn_player_id']}.")
-
-                elif command == "I_SUNK_MY_SHIP": 
-                    if not current_game_state_ref.get("game_active"): continue
-                    try:
-                        ship_name = parts[1]
-                        coords_str_payload = " ".join(parts[2:])
+        game_log.debug("[%s] Finalizada fase de espera global. Procediendo al bucle principal de mensajes.", assigned_player_id)
 
-                        if current_game_state_ref["mode"] == 2:
-                            shooter_player_id = "P2" if assigned_player_id == "P1" else "P1"
-                            notify_players_in_game(current_game_state_ref, f"OPPONENT_SHIP_SUNK {ship_name} {coords_str_payload}\n".encode(), target_player_ids=[shooter_player_id])
-                        
-                        elif current_game_state_ref["mode"] == 4:
-                            original_shooter_id_sunk = None
-                            with current_game_state_ref["game_specific_lock"]: # Para leer last_shot_details
-                                original_shooter_id_sunk = current_game_state_ref["last_shot_details"].get(assigned_player_id)
-                            
-                            if not original_shooter_id_sunk or original_shooter_id_sunk not in current_game_state_ref.get("clients",{}):
-                                continue
-                            
-                            shooter_team_id = get_player_team_id_from_game(current_game_state_ref, original_shooter_id_sunk) 
-                            if not shooter_team_id: continue
-
-                            members_to_notify_sunk = []
-                            with current_game_state_ref["game_specific_lock"]: 
-                                members_to_notify_sunk = current_game_state_ref["team_members_map"].get(shooter_team_id, [])
-                            
-                            notify_players_in_game(current_game_state_ref, f"OPPONENT_SHIP_SUNK {assigned_player_id} {ship_name} {coords_str_payload}\n".encode(), target_player_ids=members_to_notify_sunk)
-                            print(f"INFO SERVER: Notificado a equipo {shooter_team_id} que hundieron {ship_name} de {assigned_player_id}.")
-
-                    except Exception as e:
-                        print(f"Error procesando I_SUNK_MY_SHIP: {e} - Data: {data}")
-                        continue
-                
-                elif command == "GAME_WON": 
-                    if current_game_state_ref.get("game_active"):
-                        winner_proposer_id = assigned_player_id
-                        
-                        with current_game_state_ref["turn_lock"]:
-                            if not current_game_state_ref.get("game_active"):
-                                print(f"DEBUG SERVER [{assigned_player_id}]: GAME_WON pero juego ya inactivo en lock.")
-                                break # Salir del bucle de mensajes si el juego terminó por otra razón
-                            current_game_state_ref["game_active"] = False
-                            current_game_state_ref["current_turn_player_id"] = None
+        while True:
+            data = frame_reader.read_frame()
+            if data is None:
+                game_log.info("Jugador %s desconectado (recv vacío).", assigned_player_id)
+                break
 
-                        if current_game_state_ref["mode"] == 2:
-                            loser_id = "P2" if winner_proposer_id == "P1" else "P1"
-                            print(f"INFO (2P): Procesando GAME_WON. Ganador: {winner_proposer_id}, Perdedor: {loser_id}.")
-                            notify_players_in_game(current_game_state_ref, b"GAME_OVER WIN\n", target_player_ids=[winner_proposer_id])
-                            notify_players_in_game(current_game_state_ref, b"GAME_OVER LOSE\n", target_player_ids=[loser_id])
-                        
-                        elif current_game_state_ref["mode"] == 4:
-                            winning_team_id = get_player_team_id_from_game(current_game_state_ref, winner_proposer_id)
-                            if not winning_team_id: continue
-                            
-                            with current_game_state_ref["game_specific_lock"]: # Para leer team_members_map
-                                winners = current_game_state_ref["team_members_map"].get(winning_team_id, [])
-                                losing_team_id = "TeamB" if winning_team_id == "TeamA" else "TeamA"
-                                losers = current_game_state_ref["team_members_map"].get(losing_team_id, [])
-                            
-                            print(f"INFO (4P): Fin de juego. Ganadores: Equipo {winning_team_id}. Perdedores: Equipo {losing_team_id}.")
-                            for p_win_id in winners: notify_players_in_game(current_game_state_ref, b"GAME_OVER WIN\n", target_player_ids=[p_win_id])
-                            for p_lose_id in losers: notify_players_in_game(current_game_state_ref, b"GAME_OVER LOSE\n", target_player_ids=[p_lose_id])
-                        
-                        time.sleep(0.5)
-                        break 
-                    else:
-                        print(f"WARN SERVER [{assigned_player_id}]: GAME_WON ignorado, juego no activo.")
+            game_log.debug("[%s] Datos: %r", assigned_player_id, data)
+            try:
+                message = parse_message(data)
+            except ProtocolError as e:
+                game_log.warning("[%s] %s", assigned_player_id, e)
+                continue
+            metrics.registry.message_in(message.command)
+            command_outcome = dispatch_game_command(current_game_state_ref, assigned_player_id, conn, message)
+            if command_outcome != COMMAND_CONTINUE:
+                break
 
-    except ConnectionResetError: 
-        print(f"Jugador {assigned_player_id or addr} ha reseteado la conexion.") 
+    except ConnectionResetError:
+        log.info("Jugador %s ha reseteado la conexion.", assigned_player_id or addr)
     except socket.timeout:
-        print(f"Socket timeout para {assigned_player_id or addr}.")
-    except socket.error as e: 
+        log.info("Socket timeout para %s.", assigned_player_id or addr)
+    except socket.error as e:
         if current_game_state_ref.get("game_active", False) or not initial_player_info_processed:
              if isinstance(e, ConnectionResetError) or (hasattr(e, 'winerror') and e.winerror == 10054): # Común en Windows
-                 print(f"Jugador {assigned_player_id or addr} cerró la conexión (socket error detectado).")
+                 log.info("Jugador %s cerró la conexión (socket error detectado).", assigned_player_id or addr)
              else:
-                 print(f"Error de socket con {assigned_player_id or addr}: {e}")
-    except Exception as e: 
-        print(f"Error inesperado con el jugador {assigned_player_id or addr}: {e}")
-        import traceback
-        traceback.print_exc()
+                 log.warning("Error de socket con %s: %s", assigned_player_id or addr, e)
+    except Exception as e:
+        log.exception("Error inesperado con el jugador %s: %s", assigned_player_id or addr, e)
     finally:
-        print(f"Limpiando para el jugador {assigned_player_id or addr} en partida {assigned_game_id or 'N/A'}.")
-       
+        log.debug("Limpiando para el jugador %s en partida %s.", assigned_player_id or addr, assigned_game_id or "N/A")
 
         if assigned_game_id is not None and assigned_player_id is not None:
-            game_ended_by_this_dc = False
-            # Usar games_list_lock para leer active_games, y game_specific_lock para modificar la partida
-            with games_list_lock:
-                if assigned_game_id in active_games:
-                    game_to_clean = active_games[assigned_game_id]
-                    with game_to_clean["game_specific_lock"]:
-                        if assigned_player_id in game_to_clean["clients"]:
-                            del game_to_clean["clients"][assigned_player_id]
-                            print(f"Jugador {assigned_player_id} eliminado de clientes de Partida ID: {assigned_game_id}. Restantes: {list(game_to_clean['clients'].keys())}")
-
-                        was_game_active_before_leaving = game_to_clean["game_active"]
-                        if was_game_active_before_leaving:
-                             with game_to_clean["turn_lock"]: # Usar el turn_lock de la partida específica
-                                if game_to_clean["game_active"]: 
-                                    game_to_clean["game_active"] = False
-                                    game_to_clean["current_turn_player_id"] = None
-                                    game_ended_by_this_dc = True
-                            
-                        if game_ended_by_this_dc:
-                            print(f"INFO SERVER: Jugador {assigned_player_id} se fue durante partida activa {assigned_game_id}.")
-                      
-                        if not game_to_clean["clients"]: # Si la partida queda vacía
-                            print(f"Partida ID: {assigned_game_id} está vacía. Eliminando de active_games.")
-                            pass 
-
-            # Re-chequear y eliminar si la partida está vacía, ahora con el lock apropiado
-            with games_list_lock:
-                if assigned_game_id in active_games and not active_games[assigned_game_id]["clients"]:
-                    print(f"Confirmando eliminación de Partida ID: {assigned_game_id} (vacía) de active_games.")
-                    del active_games[assigned_game_id]
-
-        print(f"Fin de handle_client_connection para {assigned_player_id or addr} en partida {assigned_game_id or 'N/A'}.")
-
-def get_formatted_available_games():
-    games_output = []
-    with games_list_lock: 
-        for game_id, game_state in active_games.items():
-            # Usar el lock específico de la partida para leer su estado interno de forma segura
-            with game_state["game_specific_lock"]:
-                if len(game_state["clients"]) < game_state["max_players"]:
-                    # Determinar nombre del creador/equipo (P1 o TeamA)
-                    creator_display_name = f"Partida {game_id}"
-                    if "P1" in game_state["clients"]:
-                        if game_state["mode"] == 2 and 'name' in game_state["clients"]["P1"]:
-                            creator_display_name = game_state["clients"]["P1"]['name']
-                        elif game_state["mode"] == 4:
-                            team_a_name = game_state["team_details"]["TeamA"]["name"]
-                            if team_a_name:
-                                creator_display_name = f"Equipo: {team_a_name}"
-                            elif 'name' in game_state["clients"]["P1"] : # Si P1 tiene nombre (no siempre para 4J)
-                                 creator_display_name = game_state["clients"]["P1"]['name']
-
-                    games_output.append({
-                        "nombre_creador": creator_display_name, # Será usado como nombre de la partida en el menú del cliente
-                        "id": game_id,
-                        "jugadores_conectados": len(game_state["clients"]),
-                        "max_jugadores": game_state["max_players"]
-                    })
-    return games_output
-
-def handle_list_games_request(conn_list):
-    games_data = get_formatted_available_games()
-    games_str_parts = []
-    for g in games_data:
-        # Asegurarse que el nombre no contenga '|' o ';'
-        clean_name = str(g['nombre_creador']).replace("|", "").replace(";", "")
-        games_str_parts.append(f"{clean_name}|{g['id']}|{g['jugadores_conectados']}|{g['max_jugadores']}")
-    games_str = ";".join(games_str_parts)
+            cleanup_player(assigned_game_id, assigned_player_id)
+        if conn is not None:
+            conn.close() # Vacía la cola de salida y cierra el socket
+        else:
+            try: sock.close()
+            except OSError: pass
+        metrics.registry.connection_closed()
+
+        log.debug("Fin de handle_client_connection para %s en partida %s.", assigned_player_id or addr, assigned_game_id or "N/A")
+
+def build_lobby_entry(game_state):
+    """Entrada de la partida en el lobby, o None si no admite jugadores. Llamar con game_specific_lock tomado."""
+    if not game_state["clients"] or game_state["game_active"] or len(game_state["clients"]) >= game_state["max_players"]:
+        return None
+    game_id = game_state["game_id"]
+    # Determinar nombre del creador/equipo (P1 o TeamA)
+    creator_display_name = f"Partida {game_id}"
+    if "P1" in game_state["clients"]:
+        if game_state["mode"] == 2 and 'name' in game_state["clients"]["P1"]:
+            creator_display_name = game_state["clients"]["P1"]['name']
+        elif game_state["mode"] == 4:
+            team_a_name = game_state["team_details"]["TeamA"]["name"]
+            if team_a_name:
+                creator_display_name = f"Equipo: {team_a_name}"
+            elif 'name' in game_state["clients"]["P1"] : # Si P1 tiene nombre (no siempre para 4J)
+                 creator_display_name = game_state["clients"]["P1"]['name']
+    # El nombre será usado como nombre de la partida en el menú del cliente
+    return encode_lobby_entry(creator_display_name, game_id, len(game_state["clients"]), game_state["max_players"])
+
+def refresh_lobby_entry(game_state_dict):
+    """Recalcula la entrada de la partida en lobby_index. Llamar después de cada cambio que la afecte."""
+    publish_lobby_entry(game_state_dict, build_lobby_entry)
+
+def publish_lobby_entry(game_state_dict, build_entry=None):
+    """
+    Actualiza lobby_index con build_entry(game_state_dict) (None: la partida sale del lobby). Con
+    --workers N, los workers que no guardan el lobby combinado le reenvían cada cambio real al que sí
+    (ver shards.py): numerado bajo game_specific_lock, para que el worker 0 lo aplique en orden, y
+    enviado ya fuera de él.
+    """
+    forward = shards.router.enabled and not shards.router.is_lobby_registry
+    with game_state_dict["game_specific_lock"]: # Dos cambios de la misma partida se aplican en orden
+        entry = build_entry(game_state_dict) if build_entry else None
+        if not lobby_index.set_entry(game_state_dict["game_id"], entry) or not forward:
+            return
+        game_state_dict["lobby_sequence"] += 1
+        sequence = game_state_dict["lobby_sequence"]
+    shards.router.forward_lobby_entry(game_state_dict["game_id"], sequence, entry)
+
+def parse_lobby_version(request):
+    """'LIST_GAMES 12' / 'SUBSCRIBE_GAMES 12' -> 12; sin versión (menús antiguos) o inválida -> None."""
+    parts = request.split()
+    if len(parts) < 2:
+        return None
     try:
-        conn_list.sendall(f"GAMES_LIST {games_str}\n".encode())
-    except Exception as e:
-        print(f"Error enviando GAMES_LIST: {e}")
+        return int(parts[1])
+    except ValueError:
+        return None
+
+def build_games_list_message(request="LIST_GAMES"):
+    return lobby_index.list_message(parse_lobby_version(request))
+
+def serve_lobby_subscription(conn, request, read_frame):
+    """
+    SUBSCRIBE_GAMES [versión]: envía la lista y luego los cambios del lobby por conn (cola de salida)
+    hasta que el cliente cierre. read_frame() bloquea hasta el siguiente mensaje del cliente (o None).
+    """
+    lobby_index.subscribe(conn.sendall, parse_lobby_version(request))
+    try:
+        while read_frame() is not None:
+            pass # El suscriptor no envía nada más; cualquier mensaje se ignora
     finally:
-        try: conn_list.shutdown(socket.SHUT_RDWR)
-        except: pass
-        conn_list.close()
+        lobby_index.unsubscribe(conn.sendall)
+
+def send_single_reply(conn, data):
+    """
+    Respuesta de una consulta de un solo uso (LIST_GAMES, STATS). El motor de hilos responde directo
+    por el socket, sin cola de salida: aquí se cuenta lo que las colas contarían.
+    """
+    conn.sendall(data)
+    if not isinstance(conn, outbound.OutboundQueue):
+        metrics.registry.message_out(data)
+        metrics.registry.sent_bytes(len(data))
+
+def handle_list_games_request(conn_list, request="LIST_GAMES"):
+    """Responde una consulta del lobby (conexión de un solo uso: la cierra quien la atiende)."""
+    try:
+        send_single_reply(conn_list, build_games_list_message(request))
+    except Exception as e:
+        log.warning("Error enviando GAMES_LIST: %s", e)
+
+def game_phase(game_state):
+    if game_state["finished"]:
+        return "finished"
+    if game_state["game_active"]:
+        return "playing"
+    if len(game_state["clients"]) < game_state["max_players"]:
+        return "lobby"
+    return "setup" # Llena: nombres de equipo y colocación de barcos
+
+def count_games_by_phase():
+    """{"2J": {"lobby": n, "setup": n, "playing": n, "finished": n}, "4J": {...}}. Lectura sin los locks de cada partida."""
+    with games_list_lock:
+        games = list(active_games.values())
+    counts = {}
+    for game_state in games:
+        by_phase = counts.setdefault(f"{game_state['mode']}J", {})
+        phase = game_phase(game_state)
+        by_phase[phase] = by_phase.get(phase, 0) + 1
+    return counts
+
+def build_stats_snapshot():
+    snapshot = metrics.registry.snapshot(count_games_by_phase())
+    if shards.router.enabled: # Con --workers N, STATS describe solo al worker que atendió la consulta
+        snapshot["shard"] = {"index": shards.router.index, "count": shards.router.count}
+    return snapshot
+
+def handle_stats_request(conn_stats):
+    """STATS: responde "STATS <json>" en una línea con las métricas del servidor (ver metrics.py)."""
+    try:
+        payload = json.dumps(build_stats_snapshot(), separators=(",", ":"), sort_keys=True)
+        send_single_reply(conn_stats, f"STATS {payload}\n".encode())
+    except Exception as e:
+        log.warning("Error enviando STATS: %s", e)
+
+def is_loopback_address(addr):
+    try:
+        return ipaddress.ip_address(addr[0]).is_loopback
+    except (ValueError, TypeError, IndexError):
+        return False
+
+def build_profile_reply(addr, request):
+    """
+    Comando de administración PROFILE ON [sampling|deterministic] | OFF | STATUS (ver profiling.py).
+    Solo se acepta desde loopback: el operador entra a la máquina del servidor. Puede escribir archivos
+    y esperar al hilo del perfilador, así que el motor asyncio lo llama fuera del bucle de eventos.
+    """
+    if not is_loopback_address(addr):
+        log.warning("PROFILE rechazado desde %s (solo loopback).", addr)
+        return b"PROFILE_ERROR Solo se acepta desde loopback.\n"
+    parts = request.split()
+    action = parts[1].upper() if len(parts) > 1 else "STATUS"
+    try:
+        if action == "ON":
+            mode = profiling.profiler.start(parts[2] if len(parts) > 2 else None)
+            return f"PROFILE_OK ON {mode} {profiling.profiler.status()['dir']}\n".encode()
+        if action == "OFF":
+            profiling.profiler.stop()
+            return f"PROFILE_OK OFF {profiling.profiler.windows_written}\n".encode()
+        if action == "STATUS":
+            return f"PROFILE_STATUS {json.dumps(profiling.profiler.status(), sort_keys=True)}\n".encode()
+    except (ValueError, OSError) as e:
+        return f"PROFILE_ERROR {e}\n".encode()
+    return b"PROFILE_ERROR Uso: PROFILE ON [sampling|deterministic] | OFF | STATUS\n"
+
+def toggle_profiling_on_signal(signum, frame):
+    # El manejador corre en el hilo principal entre dos instrucciones (en asyncio, quizá en medio de un
+    # comando): encender o apagar desde otro hilo para no esperar ahí al perfilador ni a sus locks.
+    threading.Thread(target=profiling.profiler.toggle, daemon=True, name="profiler-toggle").start()
 
-def start_server():
-    global current_game_state_ref
+STATS_DUMP_INTERVAL_SECONDS = 10
 
+# Cola de conexiones pendientes de accept(); con 5 una ráfaga de menús consultando el lobby perdía SYN.
+LISTEN_BACKLOG = 128
+
+def start_handed_off_connection(sock, initial_msg, buffered):
+    """Conexión que otro worker pasó a este (hilo receptor de shards.router): se atiende en su propio hilo."""
+    sock.setblocking(True) # El descriptor puede llegar no bloqueante (timeout del otro proceso o asyncio)
+    try:
+        addr = sock.getpeername()
+    except OSError:
+        sock.close() # El cliente se fue mientras tanto
+        return
+    threading.Thread(target=handle_client_connection, args=(sock, addr, initial_msg, buffered), daemon=True).start()
+
+def start_server(host=HOST, port=PORT):
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM) 
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) 
+    if shards.router.enabled:
+        # Todos los workers escuchan en el mismo puerto y el kernel reparte las conexiones entre ellos
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        shards.router.start(start_handed_off_connection, lobby_index.set_entry)
     try:
-        server_socket.bind((HOST, PORT)) 
+        server_socket.bind((host, port)) 
     except OSError as e:
-        print(f"Error al enlazar el socket en {HOST}:{PORT} - {e}") 
+        log.error("Error al enlazar el socket en %s:%s - %s", host, port, e)
         return
         
-    server_socket.listen(5) 
-    print(f"Servidor Unificado de Batalla Naval escuchando en {HOST}:{PORT}") 
+    server_socket.listen(LISTEN_BACKLOG)
+    log.info("Servidor Unificado de Batalla Naval escuchando en %s:%s%s", host, port, describe_shard())
     
     active_threads = []
     try:
@@ -718,57 +1197,118 @@ def start_server():
             try:
                 conn, addr = server_socket.accept() 
             except OSError: 
-                print("Socket del servidor cerrado. Terminando bucle de aceptación.") 
+                log.info("Socket del servidor cerrado. Terminando bucle de aceptación.")
                 break
             except Exception as e:
-                print(f"Error aceptando conexión: {e}") 
+                log.error("Error aceptando conexión: %s", e)
                 continue
 
-            initial_peek_bytes = None
-            try:
-                conn.settimeout(0.2)  
-                initial_peek_bytes = conn.recv(1024, socket.MSG_PEEK) 
-                conn.settimeout(None) 
-                if initial_peek_bytes:
-                    decoded_peek = initial_peek_bytes.decode().strip()
-                    if decoded_peek.startswith("LIST_GAMES"): 
-                        conn.recv(len(initial_peek_bytes)) 
-                        print(f"DEBUG SERVER: Recibida petición LIST_GAMES de {addr}.") 
-                        handle_list_games_request(conn) 
-                        continue 
-            except socket.timeout: 
-                conn.settimeout(None)
-            except Exception as e: 
-                print(f"Error en peek de conexión de {addr}: {e}") 
-                conn.close()
-                continue
-            
-            print(f"INFO SERVER: Nueva conexión de juego de {addr}")
+            # El bucle de aceptación no lee nada: el hilo de la conexión recibe el primer mensaje y
+            # decide si es una consulta del lobby (LIST_GAMES) o un jugador (CREATE_GAME/JOIN_GAME).
             thread = threading.Thread(target=handle_client_connection, args=(conn, addr), daemon=True) 
             thread.start()
             active_threads.append(thread)
-            
-            active_threads = [t for t in active_threads if t.is_alive()]
+            if len(active_threads) % 64 == 0: # Purgar de vez en cuando, no en cada accept
+                active_threads = [t for t in active_threads if t.is_alive()]
 
     except KeyboardInterrupt:
-        print("\nDeteniendo el servidor (Ctrl+C)...")
+        log.info("Deteniendo el servidor (Ctrl+C)...")
     finally:
         if server_socket:
             server_socket.close()
-        print("Esperando que los hilos de cliente terminen...")
+        log.info("Esperando que los hilos de cliente terminen...")
         for t in active_threads:
             if t.is_alive():
                 t.join(timeout=1.0) # Dar un poco de tiempo para que los hilos terminen
-        print("Servidor principal finalizando.")
+        log.info("Servidor principal finalizando.")
+
+def describe_shard():
+    return f" (worker {shards.router.index + 1} de {shards.router.count})" if shards.router.enabled else ""
+
+def parse_server_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de Batalla Naval")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="threads: un hilo por conexión (por defecto). asyncio: un único bucle de eventos.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="procesos que atienden el mismo puerto (SO_REUSEPORT), cada uno con sus propias partidas")
+    parser.add_argument("--shard-index", type=int, default=None, help=argparse.SUPPRESS) # Los agrega shards.run_workers
+    parser.add_argument("--shard-dir", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--send-queue-size", type=int, default=SEND_QUEUE_MAX_MESSAGES,
+                        help="mensajes pendientes máximos en la cola de salida de cada conexión")
+    parser.add_argument("--overflow-policy", choices=outbound.OVERFLOW_POLICIES, default=SEND_QUEUE_OVERFLOW_POLICY,
+                        help="drop: cerrar al cliente lento. coalesce: descartar primero los MSG de estado ya superados.")
+    parser.add_argument("--stats-file", default=None,
+                        help="volcar las métricas (las mismas de STATS, en JSON) a este archivo periódicamente")
+    parser.add_argument("--stats-interval", type=float, default=STATS_DUMP_INTERVAL_SECONDS,
+                        help="segundos entre volcados de --stats-file")
+    parser.add_argument("--profile", action="store_true", help="arrancar con el perfilado activado")
+    parser.add_argument("--profile-mode", choices=profiling.MODES, default=profiling.MODE_SAMPLING,
+                        help="modo del perfilado al activarlo con la señal, --profile o PROFILE ON sin modo")
+    parser.add_argument("--profile-dir", default="profiles", help="carpeta para los archivos del perfilado")
+    parser.add_argument("--profile-window", type=float, default=profiling.DEFAULT_WINDOW_SECONDS,
+                        help="segundos por archivo de perfilado")
+    parser.add_argument("--profile-interval", type=float, default=profiling.DEFAULT_SAMPLING_INTERVAL_SECONDS,
+                        help="segundos entre muestras en el modo sampling")
+    logs.add_logging_args(parser)
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers debe ser al menos 1")
+    if args.workers > 1 and not shards.HAS_REUSEPORT:
+        parser.error("--workers necesita SO_REUSEPORT y paso de descriptores entre procesos (Linux)")
+    return args
+
+def apply_server_args(args):
+    global SEND_QUEUE_MAX_MESSAGES, SEND_QUEUE_OVERFLOW_POLICY
+    SEND_QUEUE_MAX_MESSAGES = args.send_queue_size
+    SEND_QUEUE_OVERFLOW_POLICY = args.overflow_policy
+    logs.setup_logging(args.log_level, args.log_file)
+    if args.shard_index is not None:
+        shards.router.configure(args.shard_index, args.workers, args.shard_dir)
+        # Cada worker vuelca sus propias métricas y perfiles
+        suffix = f"shard{args.shard_index}"
+        if args.stats_file:
+            root, ext = os.path.splitext(args.stats_file)
+            args.stats_file = f"{root}.{suffix}{ext}"
+        args.profile_dir = os.path.join(args.profile_dir, suffix)
+    if args.stats_file:
+        metrics.start_periodic_dump(args.stats_file, args.stats_interval, build_stats_snapshot)
+        log.info("Métricas en %s cada %ss.", args.stats_file, args.stats_interval)
+    profiling.profiler.configure(args.profile_dir, args.profile_window, args.profile_mode, args.profile_interval)
+    if hasattr(signal, "SIGUSR1"): # No existe en Windows
+        signal.signal(signal.SIGUSR1, toggle_profiling_on_signal)
+    if args.profile:
+        profiling.profiler.start()
 
 if __name__ == "__main__":
-    server_thread = threading.Thread(target=start_server, daemon=True) 
+    # El motor asyncio importa este módulo como "server"; registrar __main__ con ese nombre
+    # evita una segunda copia de active_games y de los locks.
+    sys.modules.setdefault("server", sys.modules[__name__])
+    args = parse_server_args()
+    if args.workers > 1 and args.shard_index is None:
+        # Proceso principal de --workers N: solo lanza y vigila a los workers (ver shards.py)
+        logs.setup_logging(args.log_level, args.log_file)
+        sys.exit(shards.run_workers(args.workers, sys.argv[1:], os.path.abspath(__file__)))
+    apply_server_args(args)
+
+    if args.engine == "asyncio":
+        import server_asyncio
+        try:
+            server_asyncio.run_server(args.host, args.port)
+        except KeyboardInterrupt:
+            log.info("Deteniendo el servidor (Ctrl+C)...")
+        finally:
+            log.info("Servidor principal finalizando.")
+        sys.exit(0)
+
+    server_thread = threading.Thread(target=start_server, args=(args.host, args.port), daemon=True) 
     server_thread.start() 
-    print("Presiona Ctrl+C para detener el servidor.") 
+    log.info("Presiona Ctrl+C para detener el servidor.")
     try:
         while server_thread.is_alive(): 
             time.sleep(1)
     except KeyboardInterrupt:
-        print("\nDeteniendo el servidor (Ctrl+C)...") 
+        log.info("Deteniendo el servidor (Ctrl+C)...")
     finally:
-        print("Servidor principal finalizando.") 
\ No newline at end of file
+        log.info("Servidor principal finalizando.")
@@ -0,0 +1,275 @@
+# server_asyncio.py
+# Motor alternativo del servidor basado en asyncio: todas las conexiones se atienden desde un único
+# bucle de eventos en lugar de un hilo por conexión. La lógica de la partida (registro, comandos,
+# limpieza) es la misma de server.py; aquí solo cambia la forma de leer y esperar.
+import asyncio
+
+import logs
+import outbound
+import server as core
+from metrics import command_of, registry
+from protocol import AsyncFrameReader, ProtocolError, parse_message
+
+log = logs.get_logger("server.asyncio")
+
+class AsyncConnection(outbound.OutboundQueue):
+    """
+    Cola de salida con la interfaz mínima de un socket (sendall/close) para la lógica común de server.py.
+    sendall() solo encola; una tarea escritora por conexión escribe y espera drain(), de modo que el
+    buffer del transporte de un cliente lento no crece sin límite: lo que se acumula queda en la cola
+    acotada y se le aplica la política de desborde.
+    """
+
+    def __init__(self, writer, label=""):
+        super().__init__(label, core.SEND_QUEUE_MAX_MESSAGES, core.SEND_QUEUE_OVERFLOW_POLICY)
+        self.writer = writer
+        self._has_items = asyncio.Event()
+        self._writer_task = asyncio.get_running_loop().create_task(self._writer_loop())
+
+    def _wake(self):
+        # Se ejecuta siempre en el hilo del bucle de eventos.
+        self._has_items.set()
+
+    async def _writer_loop(self):
+        try:
+            while True:
+                await self._has_items.wait()
+                self._has_items.clear()
+                with self._lock:
+                    items = self._take_items()
+                    closing = self._closing
+                if items:
+                    self.writer.writelines(items) # Una sola escritura (sendmsg desde Python 3.12)
+                    await self.writer.drain()
+                    registry.sent_bytes(sum(map(len, items)))
+                elif closing:
+                    break
+        except (ConnectionError, OSError) as e:
+            log.info("Error enviando a %s: %s", self.label, e)
+            with self._lock:
+                self._closing = True
+                self._items.clear()
+            self.writer.transport.abort()
+            return
+        self.writer.close()
+
+    def _abort(self):
+        # Desborde: se descarta lo pendiente y se corta la conexión; el lector recibe EOF y limpia.
+        self._has_items.set()
+        self.writer.transport.abort()
+
+    def close(self):
+        """Envía lo pendiente y luego cierra (desde la tarea escritora)."""
+        with self._lock:
+            self._closing = True
+        self._has_items.set()
+
+    async def wait_closed(self):
+        await self._writer_task
+
+async def wait_until_game_ready(game_state, player_id, conn, reader):
+    """
+    Espera a que la partida esté globalmente lista y envía la señal de configuración.
+    Retorna False si el cliente se desconectó o se agotó MAX_GLOBAL_WAIT_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    game_log = game_state["log"]
+    readiness_changed = asyncio.Event()
+    listener = lambda: loop.call_soon_threadsafe(readiness_changed.set)
+    core.add_readiness_listener(game_state, listener)
+    deadline = loop.time() + core.MAX_GLOBAL_WAIT_SECONDS
+    last_wait_msg_sent = None
+    try:
+        while True:
+            readiness_changed.clear()
+            still_connected, game_is_ready, wait_msg = core.get_readiness_snapshot(game_state, player_id)
+            if not still_connected:
+                game_log.debug("[%s] Cliente desconectado durante espera de disponibilidad global.", player_id)
+                return False
+            if game_is_ready:
+                core.send_setup_signal(game_state, player_id, conn)
+                return True
+            if wait_msg != last_wait_msg_sent:
+                conn.sendall(f"{wait_msg}\n".encode())
+                last_wait_msg_sent = wait_msg
+
+            remaining_wait = deadline - loop.time()
+            if remaining_wait <= 0:
+                game_log.warning("[%s] Timeout global (%ss) esperando que la partida esté lista. %s", player_id, core.MAX_GLOBAL_WAIT_SECONDS, wait_msg)
+                conn.sendall(b"MSG Error: Timeout esperando que la partida este completamente lista. Desconectando.\n")
+                return False
+            try:
+                await asyncio.wait_for(readiness_changed.wait(), timeout=min(remaining_wait, core.WAIT_LIVENESS_CHECK_SECONDS))
+            except asyncio.TimeoutError:
+                if reader.at_eof():
+                    game_log.debug("[%s] Cliente cerró la conexión durante espera de disponibilidad global.", player_id)
+                    return False
+    finally:
+        core.remove_readiness_listener(game_state, listener)
+
+async def handle_connection(reader, writer, initial_msg=None, buffered=b""):
+    """initial_msg/buffered: conexión pasada por otro worker, que ya leyó el mensaje inicial (ver shards.py)."""
+    addr = writer.get_extra_info("peername")
+    conn = AsyncConnection(writer, label=str(addr))
+    assigned_player_id = None
+    assigned_game_id = None
+    current_game_state_ref = {}
+    frame_reader = AsyncFrameReader(reader)
+    registry.connection_opened()
+
+    try:
+        if initial_msg is None:
+            try:
+                initial_msg = await asyncio.wait_for(frame_reader.read_frame(unterminated_commands=("LIST_GAMES",)), timeout=10.0)
+            except asyncio.TimeoutError:
+                log.info("Socket timeout para %s.", addr)
+                return
+        else:
+            frame_reader.push_buffered(buffered)
+
+        if not initial_msg:
+            log.debug("Conexión de %s cerrada sin datos iniciales.", addr)
+            return
+        target_shard = core.shards.router.route(initial_msg)
+        if target_shard is not None:
+            # Sin leer nada más: lo que ya esté en el StreamReader viaja con la conexión
+            writer.transport.pause_reading()
+            reader.feed_eof()
+            buffered = frame_reader.take_buffered() + await reader.read()
+            core.hand_off_connection(conn, addr, writer.get_extra_info("socket").fileno(), target_shard, initial_msg, buffered)
+            return
+        registry.message_in(command_of(initial_msg))
+
+        if initial_msg.startswith("LIST_GAMES"):
+            log.debug("Recibida petición LIST_GAMES de %s.", addr)
+            core.handle_list_games_request(conn, initial_msg)
+            return
+
+        if initial_msg.startswith("STATS"):
+            log.debug("Recibida petición STATS de %s.", addr)
+            core.handle_stats_request(conn)
+            return
+
+        if initial_msg.startswith("PROFILE"):
+            reply = await asyncio.get_running_loop().run_in_executor(None, core.build_profile_reply, addr, initial_msg)
+            core.send_single_reply(conn, reply)
+            return
+
+        if initial_msg.startswith("SUBSCRIBE_GAMES"):
+            # Los cambios del lobby se producen en este mismo bucle de eventos, así que
+            # lobby_index puede llamar a conn.sendall directamente.
+            log.debug("Suscripción al lobby de %s.", addr)
+            core.lobby_index.subscribe(conn.sendall, core.parse_lobby_version(initial_msg))
+            try:
+                while await frame_reader.read_frame() is not None:
+                    pass
+            finally:
+                core.lobby_index.unsubscribe(conn.sendall)
+            return
+
+        log.debug("Nueva conexión de juego de %s. Mensaje inicial: %r", addr, initial_msg)
+        registration = core.register_player(conn, addr, initial_msg)
+        if registration is None:
+            return
+        current_game_state_ref, assigned_player_id, assigned_game_id = registration
+        game_log = current_game_state_ref["log"]
+        core.start_binary_wire(conn, frame_reader, initial_msg)
+        core.send_welcome(current_game_state_ref, assigned_player_id, conn)
+
+        if current_game_state_ref["mode"] == 4 and core.is_team_captain(current_game_state_ref, assigned_player_id):
+            try:
+                conn.sendall(b"REQUEST_TEAM_NAME\n")
+                game_log.debug("[%s] Enviado REQUEST_TEAM_NAME.", assigned_player_id)
+                team_name_msg = await asyncio.wait_for(frame_reader.read_frame(), timeout=60.0)
+                if team_name_msg:
+                    registry.message_in(command_of(team_name_msg))
+                    core.apply_team_name_message(current_game_state_ref, assigned_player_id, team_name_msg)
+            except asyncio.TimeoutError:
+                game_log.warning("[%s] Timeout esperando TEAM_NAME_IS.", assigned_player_id)
+            except Exception as e:
+                game_log.error("[%s] Procesando TEAM_NAME_IS: %s", assigned_player_id, e)
+
+            core.ensure_default_team_name(current_game_state_ref, assigned_player_id)
+
+        # ---Fase de espera hasta que la partida esté globalmente lista ---
+        # Se despierta por evento (listener de la partida), no por sondeo.
+        if not await wait_until_game_ready(current_game_state_ref, assigned_player_id, conn, reader):
+            return
+
+        game_log.debug("[%s] Finalizada fase de espera global. Procediendo al bucle principal de mensajes.", assigned_player_id)
+
+        while True:
+            data = await frame_reader.read_frame()
+            if data is None:
+                game_log.info("Jugador %s desconectado (recv vacío).", assigned_player_id)
+                break
+
+            game_log.debug("[%s] Datos: %r", assigned_player_id, data)
+            try:
+                message = parse_message(data)
+            except ProtocolError as e:
+                game_log.warning("[%s] %s", assigned_player_id, e)
+                continue
+            registry.message_in(message.command)
+            command_outcome = core.dispatch_game_command(current_game_state_ref, assigned_player_id, conn, message)
+            if command_outcome != core.COMMAND_CONTINUE:
+                break
+
+    except (ConnectionResetError, BrokenPipeError):
+        log.info("Jugador %s ha reseteado la conexion.", assigned_player_id or addr)
+    except Exception as e:
+        log.exception("Error inesperado con el jugador %s: %s", assigned_player_id or addr, e)
+    finally:
+        log.debug("Limpiando para el jugador %s en partida %s.", assigned_player_id or addr, assigned_game_id or "N/A")
+        if assigned_game_id is not None and assigned_player_id is not None:
+            core.cleanup_player(assigned_game_id, assigned_player_id)
+        conn.close() # Vacía la cola de salida y cierra
+        await conn.wait_closed()
+        registry.connection_closed()
+
+handed_off_tasks = set() # Referencias a las tareas de conexiones pasadas por otro worker, para que no se recolecten
+
+async def handle_handed_off_connection(sock, initial_msg, buffered):
+    try:
+        reader, writer = await asyncio.open_connection(sock=sock)
+    except OSError as e:
+        log.info("Conexión pasada por otro worker ya cerrada: %s", e)
+        sock.close()
+        return
+    await handle_connection(reader, writer, initial_msg, buffered)
+
+def start_shard_router(loop):
+    """Lo que llega de otros workers (en el hilo receptor de shards.router) se atiende en el bucle de eventos."""
+    def on_connection(sock, initial_msg, buffered):
+        loop.call_soon_threadsafe(start_handed_off_task, sock, initial_msg, buffered)
+
+    def start_handed_off_task(sock, initial_msg, buffered):
+        task = loop.create_task(handle_handed_off_connection(sock, initial_msg, buffered))
+        handed_off_tasks.add(task)
+        task.add_done_callback(handed_off_tasks.discard)
+
+    def on_lobby_entry(game_id, entry):
+        # Los suscriptores del lobby son colas de este bucle: el cambio se aplica desde él
+        loop.call_soon_threadsafe(core.lobby_index.set_entry, game_id, entry)
+
+    core.shards.router.start(on_connection, on_lobby_entry)
+
+async def serve(host, port):
+    if core.shards.router.enabled:
+        start_shard_router(asyncio.get_running_loop())
+    server = await asyncio.start_server(handle_connection, host, port, reuse_address=True,
+                                        reuse_port=core.shards.router.enabled, backlog=core.LISTEN_BACKLOG)
+    log.info("Servidor Unificado de Batalla Naval (asyncio) escuchando en %s:%s%s", host, port, core.describe_shard())
+    async with server:
+        await server.serve_forever()
+
+def run_server(host=core.HOST, port=core.PORT):
+    asyncio.run(serve(host, port))
+
+if __name__ == "__main__":
+    args = core.parse_server_args()
+    core.apply_server_args(args)
+    try:
+        run_server(args.host, args.port)
+    except KeyboardInterrupt:
+        log.info("Deteniendo el servidor (Ctrl+C)...")
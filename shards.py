@@ -0,0 +1,241 @@
+# shards.py
+# Servidor en varios procesos (server.py --workers N). Cada worker es un server.py completo con su
+# propio active_games y su propio socket de escucha en el mismo puerto (SO_REUSEPORT): el kernel
+# reparte las conexiones nuevas entre ellos. Las partidas se reparten por id: el worker i crea las
+# partidas con (id - 1) % N == i (ver server.get_new_game_id), así que el dueño de una partida se
+# deduce del id sin consultar a nadie. Si a un worker le llega JOIN_GAME de una partida ajena, le pasa
+# el socket al dueño (SCM_RIGHTS sobre un socket Unix de datagramas) junto con el mensaje inicial ya
+# leído; desde ahí la conexión es del dueño y la partida entera se juega en un solo proceso.
+# El lobby combinado vive en el worker 0: los demás le reenvían los cambios de las entradas de sus
+# partidas y le pasan las conexiones LIST_GAMES / SUBSCRIBE_GAMES, así el menú ve una sola lista con
+# un solo número de versión. Mensajes entre workers (un datagrama cada uno):
+#   CONN <mensaje inicial>\n<bytes ya recibidos sin procesar>   con el socket del cliente adjunto
+#   LOBBY <game_id> <número> [<entrada>]                        sin entrada: la partida sale del lobby
+# Los cambios del lobby los envía un hilo propio (el envío puede bloquear si el worker 0 va atrasado) y
+# llevan un número por partida: el worker 0 descarta los que llegan después de uno más nuevo.
+import array
+import collections
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import logs
+
+log = logs.get_logger("server.shards")
+
+LOBBY_SHARD = 0 # Worker que guarda el lobby combinado y atiende al menú
+LOBBY_COMMANDS = ("LIST_GAMES", "SUBSCRIBE_GAMES")
+HANDOFF_RECV_BYTES = 65536 # Mayor que cualquier mensaje entre workers (el inicial más lo pendiente del lector)
+PEER_WAIT_SECONDS = 10 # Espera al arrancar hasta que todos los workers pueden recibir conexiones
+REMOVED_GAMES_REMEMBERED = 1024 # Partidas ya quitadas del lobby cuyo número se recuerda para descartar cambios atrasados
+# El reparto de conexiones entre varios sockets en el mismo puerto es de Linux; recv_fds es de Python 3.9+
+HAS_REUSEPORT = sys.platform.startswith("linux") and hasattr(socket, "SO_REUSEPORT") and hasattr(socket, "recv_fds")
+
+class ShardRouter:
+    """Reparto de partidas y conexiones entre workers. Con un solo proceso (count == 1) no hace nada."""
+
+    def __init__(self):
+        self.index = 0
+        self.count = 1
+        self.socket_dir = None
+        self._sock = None # Socket Unix de datagramas propio: recibe de los demás y envía hacia ellos
+        self._lobby_pending = {} # game_id -> (número, entrada) por enviar al worker 0; solo el último cambio
+        self._lobby_pending_changed = threading.Condition()
+        self._lobby_sequences = {} # En el worker 0: game_id -> número del último cambio aplicado
+        self._removed_lobby_sequences = collections.OrderedDict() # Lo mismo para las partidas ya quitadas
+
+    @property
+    def enabled(self):
+        return self.count > 1
+
+    @property
+    def is_lobby_registry(self):
+        return self.index == LOBBY_SHARD
+
+    def configure(self, index, count, socket_dir):
+        if not 0 <= index < count:
+            raise ValueError(f"Worker {index} fuera de rango para {count} workers")
+        self.index, self.count, self.socket_dir = index, count, socket_dir
+
+    def socket_path(self, index):
+        return os.path.join(self.socket_dir, f"shard-{index}.sock")
+
+    def game_id(self, sequence):
+        """Id global de la partida número `sequence` (desde 1) creada por este worker."""
+        return (sequence - 1) * self.count + self.index + 1
+
+    def owner_of(self, game_id):
+        return (game_id - 1) % self.count
+
+    def route(self, initial_msg):
+        """Worker que debe atender la conexión según su mensaje inicial, o None si es este mismo."""
+        if self.count == 1:
+            return None
+        if initial_msg.startswith(LOBBY_COMMANDS):
+            target = LOBBY_SHARD
+        elif initial_msg.startswith("JOIN_GAME"):
+            parts = initial_msg.split()
+            try:
+                target = self.owner_of(int(parts[1]))
+            except (IndexError, ValueError):
+                return None # Mensaje inválido: lo rechaza register_player aquí mismo
+        else:
+            return None # CREATE_GAME (la partida será de este worker), STATS, PROFILE...
+        return None if target == self.index else target
+
+    def start(self, on_connection, on_lobby_entry):
+        """
+        Abre el socket Unix de este worker y un hilo que recibe de los demás:
+          on_connection(sock, initial_msg, buffered) por cada conexión pasada a este worker
+          on_lobby_entry(game_id, entry o None) por cada cambio del lobby de otro worker (solo en el worker 0)
+        Las funciones corren en ese hilo; el motor asyncio las pasa al bucle de eventos. Retorna cuando
+        todos los workers abrieron su socket, para no pasar una conexión a uno que todavía no escucha.
+        """
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.socket_path(self.index))
+        threading.Thread(target=self._receive_loop, args=(on_connection, on_lobby_entry),
+                         daemon=True, name="shard-receiver").start()
+        if not self.is_lobby_registry:
+            threading.Thread(target=self._lobby_send_loop, daemon=True, name="shard-lobby-sender").start()
+        deadline = time.monotonic() + PEER_WAIT_SECONDS
+        while not all(os.path.exists(self.socket_path(i)) for i in range(self.count)):
+            if time.monotonic() > deadline:
+                log.warning("No todos los workers abrieron su socket en %ss; se sigue igual.", PEER_WAIT_SECONDS)
+                break
+            time.sleep(0.05)
+
+    def hand_off(self, target, fd, initial_msg, buffered=b""):
+        """
+        Pasa la conexión del descriptor fd al worker target. El llamador cierra después su copia del
+        socket (sin shutdown: la conexión sigue abierta en el otro proceso). Lanza OSError si el otro
+        worker no está.
+        """
+        payload = b"CONN " + initial_msg.encode() + b"\n" + buffered
+        # socket.send_fds ignora la dirección (hasta Python 3.12), por eso sendmsg directo
+        self._sock.sendmsg([payload], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", [fd]))],
+                           0, self.socket_path(target))
+
+    def forward_lobby_entry(self, game_id, sequence, entry):
+        """
+        Publica en el lobby combinado (worker 0) el cambio número `sequence` de una partida de este
+        worker. No bloquea: lo deja para el hilo que envía, que de cada partida manda solo el último.
+        """
+        with self._lobby_pending_changed:
+            pending = self._lobby_pending.get(game_id)
+            if pending is None or pending[0] < sequence:
+                self._lobby_pending[game_id] = (sequence, entry)
+                self._lobby_pending_changed.notify()
+
+    def _lobby_send_loop(self):
+        while True:
+            with self._lobby_pending_changed:
+                while not self._lobby_pending:
+                    self._lobby_pending_changed.wait()
+                pending, self._lobby_pending = self._lobby_pending, {}
+            sock = self._sock
+            if sock is None:
+                return # Socket cerrado al terminar
+            for game_id, (sequence, entry) in pending.items():
+                payload = f"LOBBY {game_id} {sequence}" if entry is None else f"LOBBY {game_id} {sequence} {entry}"
+                try:
+                    sock.sendto(payload.encode(), self.socket_path(LOBBY_SHARD))
+                except OSError as e:
+                    log.warning("No se pudo publicar la partida %s en el lobby del worker %s: %s", game_id, LOBBY_SHARD, e)
+
+    def _is_new_lobby_change(self, game_id, sequence, entry):
+        """En el worker 0 (solo desde el hilo receptor): False si ya se aplicó un cambio más nuevo de la partida."""
+        last = self._lobby_sequences.get(game_id) or self._removed_lobby_sequences.get(game_id)
+        if last is not None and sequence <= last:
+            return False
+        if entry is None:
+            self._lobby_sequences.pop(game_id, None)
+            self._removed_lobby_sequences[game_id] = sequence
+            if len(self._removed_lobby_sequences) > REMOVED_GAMES_REMEMBERED:
+                self._removed_lobby_sequences.popitem(last=False)
+        else:
+            self._lobby_sequences[game_id] = sequence
+        return True
+
+    def _receive_loop(self, on_connection, on_lobby_entry):
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(self._sock, HANDOFF_RECV_BYTES, 1)
+            except OSError:
+                return # Socket cerrado al terminar
+            kind, _, body = data.partition(b" ")
+            try:
+                if kind == b"CONN" and fds:
+                    initial_line, _, buffered = body.partition(b"\n")
+                    on_connection(socket.socket(fileno=fds[0]), initial_line.decode("utf-8", errors="replace"), buffered)
+                    continue
+                for fd in fds:
+                    os.close(fd)
+                if kind == b"LOBBY":
+                    game_id, sequence, entry = (body.decode("utf-8", errors="replace").split(" ", 2) + [""])[:3]
+                    game_id, sequence, entry = int(game_id), int(sequence), entry or None
+                    if self._is_new_lobby_change(game_id, sequence, entry):
+                        on_lobby_entry(game_id, entry)
+                else:
+                    log.warning("Mensaje desconocido entre workers: %r", data[:64])
+            except Exception as e:
+                log.exception("Error procesando un mensaje de otro worker: %s", e)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+router = ShardRouter()
+
+def run_workers(count, argv, script):
+    """
+    Proceso principal de --workers N: lanza N copias de `script` con los mismos argumentos más su número
+    de worker, les reenvía SIGUSR1 (perfilado) y termina todas si una termina. Retorna el código de salida.
+    """
+    socket_dir = tempfile.mkdtemp(prefix="batalla-shards-")
+    workers = [subprocess.Popen([sys.executable, script, *argv, "--shard-index", str(i), "--shard-dir", socket_dir])
+               for i in range(count)]
+    log.info("Iniciados %s workers (pids %s).", count, ", ".join(str(worker.pid) for worker in workers))
+
+    def forward_signal(signum, frame):
+        for worker in workers:
+            if worker.poll() is None:
+                worker.send_signal(signum)
+
+    def stop_on_signal(signum, frame):
+        raise KeyboardInterrupt
+
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, forward_signal)
+    signal.signal(signal.SIGTERM, stop_on_signal)
+    exit_code = 0
+    try:
+        while True:
+            finished = [worker for worker in workers if worker.poll() is not None]
+            if finished:
+                # Las partidas de un worker caído no pueden seguir en otro: se detiene todo y el
+                # supervisor del sistema (systemd...) vuelve a arrancar el servidor completo.
+                exit_code = finished[0].returncode
+                log.error("El worker %s terminó (código %s); deteniendo los demás.",
+                          workers.index(finished[0]), exit_code)
+                break
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        log.info("Deteniendo los workers...")
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+        for worker in workers:
+            try:
+                worker.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+    return exit_code
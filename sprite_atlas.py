@@ -0,0 +1,132 @@
+# sprite_atlas.py
+# Caché en disco de las imágenes de barcos ya escaladas y rotadas para un CELL_SIZE: todos los sprites
+# H/V en un solo atlas RGBA con su índice, en assets/ships_<cell_size>.atlas. El cliente la carga al
+# arrancar en lugar de decodificar, escalar y rotar los cinco PNG; si falta o los PNG cambiaron, la
+# vuelve a generar.
+# Formato: ATLAS_MAGIC + longitud del índice (uint32) + índice JSON + píxeles RGBA comprimidos con zlib.
+#
+# Paso de build: python sprite_atlas.py
+import json
+import os
+import struct
+import zlib
+
+import pygame
+
+import logs
+
+log = logs.get_logger("client.sprites")
+
+ATLAS_MAGIC = b"BNATLAS1"
+ASSETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+def atlas_path(cell_size):
+    return os.path.join(ASSETS_PATH, f"ships_{cell_size}.atlas")
+
+def source_signature(ship_files):
+    """Tamaño y fecha de cada PNG de origen: si alguno cambia, la caché queda desactualizada."""
+    signature = {}
+    for name, filename in sorted(ship_files.items()):
+        path = os.path.join(ASSETS_PATH, filename)
+        if os.path.exists(path):
+            st = os.stat(path)
+            signature[name] = [st.st_size, st.st_mtime_ns]
+    return signature
+
+def scale_ship_images(ship_files, ships_config, cell_size):
+    """Carga cada PNG y lo escala a (tamaño x 1) y (1 x tamaño) casillas. Retorna {nombre: {"H": sup, "V": sup}}."""
+    has_display = pygame.display.get_surface() is not None # convert_alpha necesita una ventana
+    sprites = {}
+    for name, size in ships_config:
+        filename = ship_files.get(name)
+        path = os.path.join(ASSETS_PATH, filename) if filename else None
+        if not path or not os.path.exists(path):
+            continue
+        img_original = pygame.image.load(path)
+        if has_display:
+            img_original = img_original.convert_alpha()
+        img_h = pygame.transform.scale(img_original, (size * cell_size, cell_size))
+        img_v = pygame.transform.scale(pygame.transform.rotate(img_original, 90), (cell_size, size * cell_size))
+        sprites[name] = {"H": img_h, "V": img_v}
+    return sprites
+
+def build_atlas(sprites):
+    """Empaqueta los sprites: los H apilados a la izquierda, los V uno al lado del otro a la derecha."""
+    h_width = max((s["H"].get_width() for s in sprites.values()), default=0)
+    h_height = sum(s["H"].get_height() for s in sprites.values())
+    v_width = sum(s["V"].get_width() for s in sprites.values())
+    v_height = max((s["V"].get_height() for s in sprites.values()), default=0)
+    atlas = pygame.Surface((max(1, h_width + v_width), max(1, h_height, v_height)), pygame.SRCALPHA)
+    rects = {}
+    y, x = 0, h_width
+    for name, sprite in sprites.items():
+        atlas.blit(sprite["H"], (0, y))
+        atlas.blit(sprite["V"], (x, 0))
+        rects[name] = {"H": [0, y, *sprite["H"].get_size()], "V": [x, 0, *sprite["V"].get_size()]}
+        y += sprite["H"].get_height()
+        x += sprite["V"].get_width()
+    return atlas, rects
+
+def save_atlas(path, atlas, index):
+    index_bytes = json.dumps(index).encode()
+    pixels = zlib.compress(pygame.image.tobytes(atlas, "RGBA"))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(ATLAS_MAGIC + struct.pack("!I", len(index_bytes)) + index_bytes + pixels)
+    os.replace(tmp_path, path) # Nunca dejar un atlas a medio escribir
+
+def load_atlas(path):
+    """Retorna (índice, superficie del atlas) o None si el archivo no existe o no es un atlas válido."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(ATLAS_MAGIC):
+            return None
+        offset = len(ATLAS_MAGIC)
+        (index_len,) = struct.unpack_from("!I", data, offset)
+        offset += 4
+        index = json.loads(data[offset:offset + index_len])
+        pixels = zlib.decompress(data[offset + index_len:])
+        return index, pygame.image.frombytes(pixels, tuple(index["size"]), "RGBA")
+    except (OSError, ValueError, struct.error, zlib.error, KeyError):
+        return None
+
+def build_and_save(ship_files, ships_config, cell_size):
+    sprites = scale_ship_images(ship_files, ships_config, cell_size)
+    atlas, rects = build_atlas(sprites)
+    index = {"cell_size": cell_size, "sources": source_signature(ship_files), "size": list(atlas.get_size()), "sprites": rects}
+    try:
+        save_atlas(atlas_path(cell_size), atlas, index)
+    except OSError as e:
+        log.warning("No se pudo guardar la caché de sprites: %s", e)
+    return sprites
+
+def load_ship_sprites(ship_files, ships_config, cell_size):
+    """
+    Sprites H/V de cada barco para cell_size, desde la caché si está al día; si no, se generan desde
+    los PNG y se reescribe la caché. Retorna {nombre: {"H": sup, "V": sup}} solo con los barcos que tienen imagen.
+    """
+    loaded = load_atlas(atlas_path(cell_size))
+    if loaded is not None:
+        index, atlas = loaded
+        if index.get("cell_size") == cell_size and index.get("sources") == source_signature(ship_files):
+            if pygame.display.get_surface() is not None:
+                atlas = atlas.convert_alpha()
+            return {name: {orientation: atlas.subsurface(pygame.Rect(rect)) for orientation, rect in rects.items()}
+                    for name, rects in index["sprites"].items()}
+    return build_and_save(ship_files, ships_config, cell_size)
+
+def main():
+    import argparse
+    from board import SHIPS_CONFIG
+    from client import CELL_SIZE, SHIP_IMAGE_FILES
+
+    parser = argparse.ArgumentParser(description="Genera la caché de sprites de barcos del cliente")
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE)
+    args = parser.parse_args()
+    sprites = build_and_save(SHIP_IMAGE_FILES, SHIPS_CONFIG, args.cell_size)
+    path = atlas_path(args.cell_size)
+    print(f"{len(sprites)} barcos -> {path} ({os.path.getsize(path)} bytes)")
+
+if __name__ == "__main__":
+    main()